@@ -0,0 +1,25 @@
+import click
+from src.config import ARCHIVE_HOT_DAYS, ARCHIVE_DIR
+
+
+@click.command()
+@click.option("--hot-days", default=ARCHIVE_HOT_DAYS, show_default=True,
+              help="Days of dated rows kept in SQLite; older ones move to the archive.")
+@click.option("--vacuum/--no-vacuum", default=True, show_default=True,
+              help="Return freed pages to the filesystem afterwards (incremental vacuum).")
+@click.option("--enable-incremental-vacuum", is_flag=True,
+              help="First switch the database to auto_vacuum=INCREMENTAL (one-off full VACUUM).")
+def main(hot_days, vacuum, enable_incremental_vacuum):
+    """Move rows older than the hot window into the day-partitioned Parquet archive."""
+    from src.archive import archive_old_rows
+    if enable_incremental_vacuum:
+        from src.db import enable_incremental_vacuum as enable
+        click.echo("Switched to incremental vacuum" if enable() else "Incremental vacuum already enabled")
+    result = archive_old_rows(hot_days, vacuum=vacuum)
+    click.echo(f"Archived {result['rows']} rows into {result['partitions']} day partitions under {ARCHIVE_DIR} "
+               f"(cutoff {result['cutoff']}); pruned {result['clusters_pruned']} clusters, "
+               f"freed {result['pages_freed']} pages")
+
+
+if __name__ == "__main__":
+    main()
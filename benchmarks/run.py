@@ -0,0 +1,290 @@
+"""Time and memory-profile every pipeline stage on a synthetic workload.
+
+    python -m benchmarks.run --records 100000 --compare benchmarks/results/<earlier>.json
+
+Runs against a throwaway database and reports directory, never ``data/``.
+"""
+import os, sys, json, time, tempfile, platform, subprocess, statistics, tracemalloc, datetime
+from typing import Dict, Any, Callable, Optional
+
+import click
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+# a stage this much slower than in the --compare run is flagged
+REGRESSION_RATIO = 1.2
+# endpoints whose peak memory is tracked, as (path, query string)
+MEMORY_ENDPOINTS = {
+    "GET /trends": ("/trends", "limit=100"),
+    "GET /trends/timeseries": ("/trends/timeseries", "bucket=hour"),
+    "GET /export": ("/export", "format=ndjson"),
+}
+
+
+def _measure(fn: Callable[[], Any], n: Optional[int], memory: bool) -> Dict[str, Any]:
+    if memory:
+        tracemalloc.start()
+    t0 = time.perf_counter()
+    try:
+        out = fn()
+        seconds = time.perf_counter() - t0
+        peak = tracemalloc.get_traced_memory()[1] if memory else None
+    finally:
+        if memory:
+            tracemalloc.stop()
+    result = {"seconds": round(seconds, 4)}
+    if peak is not None:
+        result["peak_mb"] = round(peak / 2**20, 2)
+    if n:
+        result["records"] = n
+        result["per_sec"] = round(n / seconds, 1) if seconds else None
+    if isinstance(out, dict):
+        result["detail"] = out
+    return result
+
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def bench_stages(records: int, seed: int, memory: bool) -> Dict[str, Any]:
+    from samples.workload import generate_workload
+    from src.batch import RecordBatch
+    from src.pipeline import filter_marketing, add_sentiment, categorize, generate_report
+    from src.db import bulk_upsert, query_last_days
+
+    stages, state = {}, {}
+
+    def run(name, fn, n=None):
+        stages[name] = _measure(fn, n, memory)
+        click.echo(f"  {name:<16} {stages[name]['seconds']:>9.3f}s"
+                   + (f"  {stages[name]['peak_mb']:>8.1f} MB" if memory else ""))
+
+    run("generate", lambda: state.update(raw=list(generate_workload(records, seed=seed))), records)
+    # same stage order as pipeline.enrich: one columnar batch, updated in place
+    run("normalize", lambda: state.update(rows=RecordBatch.from_records(state.pop("raw"))), records)
+    run("filter_marketing", lambda: filter_marketing(state["rows"]) and None, records)
+    n = len(state["rows"])
+    run("categorize", lambda: categorize(state["rows"]) and None, n)
+    state["rows"].release_text(keep_combined=True)
+    run("add_sentiment", lambda: add_sentiment(state["rows"]) and None, n)
+    state["rows"].release_text()
+    run("upsert", lambda: bulk_upsert(state["rows"]), n)
+    run("upsert_unchanged", lambda: bulk_upsert(state["rows"]), n)
+    run("query_last_days", lambda: {"rows": len(query_last_days(7))})
+    report_dir = os.environ["REPORTS_DIR"]
+    run("generate_report", lambda: generate_report(7, out_html=os.path.join(report_dir, "bench.html")) and None)
+    run("report_cached", lambda: generate_report(7, out_html=os.path.join(report_dir, "bench.html")) and None)
+    return stages
+
+
+def bench_ingest(records: int, seed: int) -> Dict[str, Any]:
+    """Enrich + write fresh posts in STREAM_CHUNK_SIZE chunks, as ``run_ingest`` does, and report
+    how many texts sentiment scoring took from the cache, scored inline or sent to the process pool."""
+    from samples.workload import generate_workload
+    from src.config import STREAM_CHUNK_SIZE
+    from src.pipeline import enrich, build_keyword_list, _chunks
+    from src.db import bulk_upsert
+    from src import metrics
+
+    keys = build_keyword_list()
+    # another seed than bench_stages, so the sentiment cache doesn't already hold these texts
+    pages = [list(generate_workload(records, seed=seed + 1))]
+
+    def ingest():
+        for chunk in _chunks(pages, STREAM_CHUNK_SIZE):
+            bulk_upsert(enrich(chunk, keys))
+
+    with metrics.profile() as prof:
+        result = _measure(ingest, records, memory=False)
+    result["sentiment_texts"] = (prof.as_dict() if prof else {}).get("sentiment_texts", {})
+    click.echo(f"  {'chunked ingest':<16} {result['seconds']:>9.3f}s  sentiment {result['sentiment_texts']}")
+    return result
+
+
+def _asgi_get(app, path: str, query: str) -> int:
+    """One GET straight through the ASGI app; returns the body size.
+
+    The body is counted as it streams and then dropped (TestClient would
+    buffer all of it), so a traced peak is the server's own.
+    """
+    import asyncio
+
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+             "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query.encode(),
+             "root_path": "", "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 0),
+             "server": ("bench", 80)}
+    size, requested = 0, False
+
+    async def run():
+        done = asyncio.Event()
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            # streaming responses listen for a disconnect; only send one once the body is complete
+            await done.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            nonlocal size
+            if message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+                if not message.get("more_body"):
+                    done.set()
+
+        await app(scope, receive, send)
+
+    asyncio.run(run())
+    return size
+
+
+def bench_api(repeat: int, memory: bool = False) -> Dict[str, Any]:
+    try:
+        from fastapi.testclient import TestClient
+    except ImportError as e:
+        return {"skipped": f"{type(e).__name__}: {e}"}
+    from src.server import app
+
+    client = TestClient(app)
+    calls = {
+        "GET /trends": lambda: client.get("/trends", params={"limit": 100}),
+        "GET /trends/summary": lambda: client.get("/trends/summary"),
+        "GET /trends/bursts": lambda: client.get("/trends/bursts"),
+        "GET /trends/timeseries": lambda: client.get("/trends/timeseries", params={"bucket": "hour"}),
+        "POST /report": lambda: client.post("/report", json={"days": 7, "format": "html"}),
+        "GET /export": lambda: client.get("/export", params={"format": "ndjson"}),
+    }
+    out = {}
+    for name, call in calls.items():
+        times = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            resp = call()
+            times.append(time.perf_counter() - t0)
+        out[name] = {"status": resp.status_code, "bytes": len(resp.content),
+                     "median_s": round(statistics.median(times), 4), "max_s": round(max(times), 4)}
+        click.echo(f"  {name:<22} {out[name]['median_s']:>8.4f}s median  ({resp.status_code})")
+    if memory:
+        from src import timeseries
+        # once more, traced; after the timed calls, so lazy imports and warm-up don't count
+        for name, (path, query) in MEMORY_ENDPOINTS.items():
+            timeseries._cache.clear()  # an aggregation, not a cache hit
+            out[name]["peak_mb"] = _measure(lambda: _asgi_get(app, path, query), None, True)["peak_mb"]
+            click.echo(f"  {name:<22} {out[name]['peak_mb']:>8.2f} MB peak")
+    return out
+
+
+def bench_extract(records: int, latency: float, rate_limit: Optional[int], window: float) -> Dict[str, Any]:
+    from benchmarks.stub_servers import StubAPI, stub_pagers
+    from src.scheduler import get_scheduler
+    from src.sources import stream_pages
+
+    apis = {name: StubAPI(name, records=records, latency=latency, rate_limit=rate_limit, window=window)
+            for name in ("x", "reddit", "gtrends")}
+    try:
+        urls = {name: api.start() for name, api in apis.items()}
+        status = {}
+        t0 = time.perf_counter()
+        fetched = sum(len(page) for _, page in stream_pages(stub_pagers(urls, refresh=True), status=status))
+        seconds = time.perf_counter() - t0
+    finally:
+        for api in apis.values():
+            api.stop()
+    out = {"seconds": round(seconds, 4), "records": fetched, "per_sec": round(fetched / seconds, 1),
+           "sources": status, "scheduler": get_scheduler().stats(),
+           "server_stats": {name: api.stats for name, api in apis.items()}}
+    click.echo(f"  {'stub sources':<16} {seconds:>9.3f}s  {fetched} records")
+    return out
+
+
+def compare(current: Dict[str, Any], previous: Dict[str, Any]) -> Dict[str, Any]:
+    """Per-stage time ratios (current / previous); ratios above REGRESSION_RATIO are regressions."""
+    out = {}
+    for name, cur in current["stages"].items():
+        old = previous.get("stages", {}).get(name)
+        if old and old.get("seconds"):
+            ratio = round(cur["seconds"] / old["seconds"], 3)
+            out[name] = {"ratio": ratio, "regression": ratio > REGRESSION_RATIO}
+    return out
+
+
+@click.command()
+@click.option("--records", default=20000, show_default=True, help="Synthetic posts per run.")
+@click.option("--seed", default=42, show_default=True)
+@click.option("--memory/--no-memory", default=True, show_default=True,
+              help="Track peak Python allocations per stage and for /trends, /trends/timeseries and "
+                   "/export (tracemalloc; slows stages down).")
+@click.option("--api-repeat", default=5, show_default=True, help="Requests per API endpoint.")
+@click.option("--stub-records", default=2000, show_default=True, help="Posts served by each stand-in API.")
+@click.option("--stub-latency", default=0.02, show_default=True, help="Seconds per stand-in API request.")
+@click.option("--stub-rate-limit", default=None, type=int, help="Requests per window before a 429.")
+@click.option("--stub-window", default=2.0, show_default=True, help="Rate-limit window in seconds.")
+@click.option("--sentiment-workers", default=None, type=int,
+              help="Sentiment process-pool size (default: SENTIMENT_WORKERS, else one per CPU).")
+@click.option("--startup/--no-startup", default=True, show_default=True,
+              help="Also measure cold import time of the entry points (benchmarks/startup.py).")
+@click.option("--out", default=None, help="Result file (default: benchmarks/results/bench-<time>.json).")
+@click.option("--compare", "compare_to", default=None, type=click.Path(exists=True),
+              help="Earlier result file to diff stage timings against.")
+def main(records, seed, memory, api_repeat, stub_records, stub_latency, stub_rate_limit, stub_window,
+         sentiment_workers, startup, out, compare_to):
+    tmp = tempfile.mkdtemp(prefix="trend-bench-")
+    # before any src import: config reads these at import time
+    os.environ.update(DB_PATH=os.path.join(tmp, "bench.sqlite3"), REPORTS_DIR=os.path.join(tmp, "reports"),
+                      SENTIMENT_CACHE_PATH=os.path.join(tmp, "sentiment.sqlite3"),
+                      RESPONSE_CACHE_PATH=os.path.join(tmp, "responses.sqlite3"), ARCHIVE_DIR=os.path.join(tmp, "archive"),
+                      MOCK_MODE="false")
+    # the stand-ins are local: client-side buckets at the live APIs' rates would only time themselves
+    # (--stub-rate-limit still sends 429s through the scheduler's retries)
+    for name in ("X", "REDDIT", "GTRENDS"):
+        os.environ.setdefault(f"{name}_RATE_PER_MIN", "60000")
+    if sentiment_workers is not None:
+        os.environ["SENTIMENT_WORKERS"] = str(sentiment_workers)
+    os.makedirs(os.environ["REPORTS_DIR"], exist_ok=True)
+
+    result = {"meta": {"records": records, "seed": seed, "memory": memory, "git": _git_rev(),
+                       "python": platform.python_version(), "machine": platform.machine(),
+                       "cpus": os.cpu_count(), "started_at": datetime.datetime.utcnow().isoformat() + "Z"}}
+    click.echo(f"pipeline stages ({records} records, workdir {tmp})")
+    result["stages"] = bench_stages(records, seed, memory)
+    click.echo(f"chunked ingest ({records} records)")
+    result["ingest"] = bench_ingest(records, seed)
+    click.echo("API endpoints")
+    cwd = os.getcwd()
+    os.chdir(tmp)  # POST /report writes under ./reports
+    try:
+        result["api"] = bench_api(api_repeat, memory)
+    finally:
+        os.chdir(cwd)
+    click.echo("extraction from stand-in APIs")
+    result["extract"] = bench_extract(stub_records, stub_latency, stub_rate_limit, stub_window)
+    if startup:
+        from benchmarks.startup import measure_startup
+        click.echo("cold start")
+        result["startup"] = measure_startup(repeat=3)
+        for module, r in result["startup"].items():
+            click.echo(f"  {module:<16} {r['median_s']:>9.3f}s  {r['max_rss_mb']:>8.1f} MB")
+
+    if compare_to:
+        with open(compare_to, "r", encoding="utf-8") as f:
+            result["compare"] = compare(result, json.load(f))
+        for name, c in result["compare"].items():
+            click.echo(f"  {name:<16} x{c['ratio']:.2f}{'  REGRESSION' if c['regression'] else ''}")
+
+    out = out or os.path.join(RESULTS_DIR, f"bench-{datetime.datetime.utcnow():%Y%m%dT%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, default=str)
+    click.echo(f"results written to {out}")
+    if any(c["regression"] for c in result.get("compare", {}).values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Cold-start cost of the API server and CLI entry points, each in a fresh interpreter.
+
+    python -m benchmarks.startup --repeat 5
+"""
+import os, sys, json, statistics, subprocess
+from typing import Dict, Any, List
+
+import click
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENTRY_POINTS = ["src.server", "src.pipeline", "run_pipeline", "export_trends"]
+# libraries that should only load on the paths that use them
+HEAVY = ["pandas", "numpy", "matplotlib", "jinja2", "reportlab", "pyarrow", "nltk", "dotenv", "yaml"]
+
+_PROBE = """
+import json, resource, sys, time
+t0 = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - t0
+print(json.dumps({{"seconds": seconds,
+                  "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                  "heavy_loaded": [m for m in {heavy!r} if m in sys.modules],
+                  "modules": len(sys.modules)}}))
+"""
+
+
+def _probe(module: str) -> Dict[str, Any]:
+    out = subprocess.run([sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY)],
+                         capture_output=True, text=True, cwd=ROOT, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def _slowest_imports(module: str, top: int) -> List[Dict[str, Any]]:
+    """Largest cumulative times from ``python -X importtime``, in milliseconds."""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                         capture_output=True, text=True, cwd=ROOT, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append({"module": name.strip(), "cumulative_ms": int(cumulative_us) / 1000})
+    return sorted(rows, key=lambda r: -r["cumulative_ms"])[:top]
+
+
+def measure_startup(repeat: int = 5, modules: List[str] = None, top: int = 10) -> Dict[str, Any]:
+    """Median import time and peak RSS per entry point, with the heavy libraries each one pulled in."""
+    results = {}
+    for module in modules or ENTRY_POINTS:
+        runs = [_probe(module) for _ in range(repeat)]
+        results[module] = {
+            "median_s": round(statistics.median(r["seconds"] for r in runs), 4),
+            "min_s": round(min(r["seconds"] for r in runs), 4),
+            "max_rss_mb": round(statistics.median(r["max_rss_mb"] for r in runs), 1),
+            "modules": runs[-1]["modules"],
+            "heavy_loaded": runs[-1]["heavy_loaded"],
+            "slowest_imports": _slowest_imports(module, top),
+        }
+    return results
+
+
+@click.command()
+@click.option("--repeat", default=5, show_default=True, help="Fresh interpreters per entry point.")
+@click.option("--out", default=None, help="Also write the results to this JSON file.")
+def main(repeat, out):
+    results = measure_startup(repeat)
+    for module, r in results.items():
+        click.echo(f"{module:<14} {r['median_s']:>7.3f}s  {r['max_rss_mb']:>6.1f} MB  "
+                   f"heavy: {', '.join(r['heavy_loaded']) or '-'}")
+    if out:
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+import json, time, threading, datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from types import SimpleNamespace
+from typing import Dict, Any, List, Optional, Iterator, Callable
+from urllib.parse import urlparse, parse_qs
+
+from samples.workload import generate_workload
+
+Page = List[Dict[str, Any]]
+
+
+class StubAPI:
+    """Local stand-in for one source API (``"x"``, ``"reddit"`` or ``"gtrends"``).
+
+    Serves ``records`` seeded workload posts in the source's own JSON shape
+    and paging scheme, sleeps ``latency`` seconds per request, and allows
+    ``rate_limit`` requests per ``window`` seconds before answering 429 with
+    the source's rate-limit headers. ``stats`` counts requests and throttles.
+    """
+
+    def __init__(self, kind: str, records: int = 1000, page_size: int = 100, latency: float = 0.05,
+                 rate_limit: Optional[int] = None, window: float = 15.0, seed: int = 7):
+        if kind not in ("x", "reddit", "gtrends"):
+            raise ValueError(f"unknown source: {kind}")
+        self.kind, self.page_size, self.latency = kind, page_size, latency
+        self.rate_limit, self.window = rate_limit, window
+        self.posts = list(generate_workload(records, seed=seed))
+        self.stats = {"requests": 0, "throttled": 0}
+        self._lock = threading.Lock()
+        self._window_start, self._used = time.monotonic(), 0
+        self._server = None
+
+    # -- rate limiting --
+
+    def _take(self) -> Dict[str, str]:
+        """Count one request; returns the rate-limit headers, with ``status`` 429 when over quota."""
+        with self._lock:
+            self.stats["requests"] += 1
+            now = time.monotonic()
+            if now - self._window_start >= self.window:
+                self._window_start, self._used = now, 0
+            reset = self._window_start + self.window - now
+            limited = self.rate_limit is not None and self._used >= self.rate_limit
+            if limited:
+                self.stats["throttled"] += 1
+            else:
+                self._used += 1
+            remaining = max(0, (self.rate_limit or 0) - self._used)
+        if self.rate_limit is None:
+            headers = {}
+        elif self.kind == "x":
+            headers = {"x-rate-limit-limit": str(self.rate_limit), "x-rate-limit-remaining": str(remaining),
+                       "x-rate-limit-reset": str(int(time.time() + reset) + 1)}
+        elif self.kind == "reddit":
+            headers = {"x-ratelimit-used": str(self._used), "x-ratelimit-remaining": str(remaining),
+                       "x-ratelimit-reset": str(int(reset) + 1)}
+        else:
+            headers = {"retry-after": str(int(reset) + 1)} if limited else {}
+        if limited:
+            headers["status"] = "429"
+        return headers
+
+    # -- payloads --
+
+    def _page(self, offset: int) -> Page:
+        return self.posts[offset:offset + self.page_size]
+
+    def _x(self, qs: Dict[str, str]) -> Dict[str, Any]:
+        offset = int(qs.get("next_token") or 0)
+        page = self._page(offset)
+        nxt = offset + len(page)
+        return {
+            "data": [{"id": str(10**15 + offset + i), "text": p["text"], "created_at": p["created_at"],
+                      "author_id": p["author"], "lang": "en",
+                      "public_metrics": {"like_count": p["engagement"], "retweet_count": 0, "reply_count": 0}}
+                     for i, p in enumerate(page)],
+            "includes": {"users": [{"id": p["author"], "username": p["author"]} for p in page]},
+            "meta": {"result_count": len(page), **({"next_token": str(nxt)} if nxt < len(self.posts) else {})},
+        }
+
+    def _reddit(self, sub: str, qs: Dict[str, str]) -> Dict[str, Any]:
+        # "after" is the fullname of the last post seen, t3_<sub><offset>
+        after = qs.get("after")
+        offset = int(after[len("t3_") + len(sub):]) + 1 if after else 0
+        page = self._page(offset)
+        nxt = offset + len(page)
+        children = []
+        for i, p in enumerate(page):
+            created = datetime.datetime.fromisoformat(p["created_at"]) if p["created_at"] else datetime.datetime.utcnow()
+            children.append({"kind": "t3", "data": {
+                "id": f"{sub}{offset + i}", "title": p["title"], "selftext": p["text"],
+                "created_utc": created.replace(tzinfo=datetime.timezone.utc).timestamp(),
+                "score": p["engagement"], "num_comments": p["engagement"] // 4, "author": p["author"],
+                "permalink": f"/r/{sub}/comments/{offset + i}/"}})
+        return {"kind": "Listing", "data": {"children": children,
+                                            "after": f"t3_{sub}{nxt - 1}" if nxt < len(self.posts) else None}}
+
+    def _gtrends(self) -> Dict[str, Any]:
+        return {"default": {"trendingSearchesDays": [{"trendingSearches": [
+            {"title": {"query": p["title"][:40]}} for p in self._page(0)[:20]]}]}}
+
+    def _gtrends_interest(self, qs: Dict[str, str]) -> Dict[str, Any]:
+        # one point per keyword: engagement of the served posts whose title mentions it, scaled to 0-100
+        keywords = [k for k in (qs.get("keywords") or "").split(",") if k]
+        totals = [sum(p["engagement"] for p in self.posts if k.lower() in p["title"].lower()) for k in keywords]
+        top = max(totals, default=0) or 1
+        return {"default": {"timelineData": [{"value": [round(100 * t / top) for t in totals], "isPartial": False}]}}
+
+    def handle(self, path: str, qs: Dict[str, str]):
+        """``(status, headers, body)`` for one request."""
+        time.sleep(self.latency)
+        headers = self._take()
+        status = int(headers.pop("status", 200))
+        if status == 429:
+            return status, headers, {"title": "Too Many Requests"}
+        parts = path.strip("/").split("/")
+        if self.kind == "x" and path == "/2/tweets/search/recent":
+            return 200, headers, self._x(qs)
+        if self.kind == "reddit" and len(parts) == 3 and parts[0] == "r" and parts[2] == "search.json":
+            return 200, headers, self._reddit(parts[1], qs)
+        if self.kind == "gtrends" and path == "/trends/api/dailytrends":
+            return 200, headers, self._gtrends()
+        if self.kind == "gtrends" and path == "/trends/api/widgetdata/multiline":
+            return 200, headers, self._gtrends_interest(qs)
+        return 404, headers, {"error": "not found"}
+
+    # -- server lifecycle --
+
+    def start(self) -> str:
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                status, headers, body = api.handle(url.path, {k: v[-1] for k, v in parse_qs(url.query).items()})
+                payload = json.dumps(body).encode("utf-8")
+                if api.kind == "gtrends" and status == 200:
+                    payload = b")]}',\n" + payload  # Google's XSSI prefix, as pytrends sees it
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self._server.serve_forever, name=f"stub-{self.kind}", daemon=True).start()
+        return self.url
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "StubAPI":
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def _get(url: str, params: Dict[str, Any]) -> Any:
+    """GET JSON; a 429 is raised as ``requests.HTTPError``, with headers, for the scheduler to handle."""
+    import requests
+
+    resp = requests.get(url, params=params, timeout=30)
+    resp.raise_for_status()
+    return json.loads(resp.content[resp.content.index(b"{"):])
+
+
+class StubXClient:
+    """``tweepy.Client`` stand-in for ``iter_x_pages``: ``search_recent_tweets`` against a ``StubAPI("x")``."""
+
+    def __init__(self, url: str):
+        self.url = url
+
+    def search_recent_tweets(self, query: str, max_results: int = 10, next_token: str = None, **kwargs):
+        params = {"query": query, "max_results": max_results, **({"next_token": next_token} if next_token else {})}
+        body = _get(f"{self.url}/2/tweets/search/recent", params)
+        tweets = [SimpleNamespace(id=int(t["id"]), text=t["text"], author_id=t["author_id"], lang=t["lang"],
+                                  created_at=datetime.datetime.fromisoformat(t["created_at"]) if t["created_at"] else None,
+                                  public_metrics=t["public_metrics"])
+                  for t in body.get("data", [])]
+        users = [SimpleNamespace(**u) for u in body.get("includes", {}).get("users", [])]
+        return SimpleNamespace(data=tweets, includes={"users": users}, meta=body["meta"])
+
+
+class StubRedditClient:
+    """``praw.Reddit`` stand-in for ``iter_reddit_pages``: ``subreddit(name).search(...)`` against a ``StubAPI("reddit")``."""
+
+    def __init__(self, url: str):
+        self.url = url
+
+    def subreddit(self, name: str) -> SimpleNamespace:
+        return SimpleNamespace(search=lambda q, **kwargs: self._search(name, q, **kwargs))
+
+    def _search(self, sub: str, q: str, sort: str = "new", time_filter: str = "week", limit: int = 100,
+                params: Dict[str, str] = None) -> List[SimpleNamespace]:
+        body = _get(f"{self.url}/r/{sub}/search.json",
+                    {"q": q, "sort": sort, "t": time_filter, "limit": limit, **(params or {})})
+        return [SimpleNamespace(fullname=f"t3_{c['data']['id']}", **c["data"]) for c in body["data"]["children"]]
+
+
+class StubTrendReq:
+    """``pytrends`` ``TrendReq`` stand-in for ``iter_google_trends_pages``, against a ``StubAPI("gtrends")``."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self._keywords: List[str] = []
+
+    def trending_searches(self, pn: str = "united_states"):
+        import pandas as pd
+
+        body = _get(f"{self.url}/trends/api/dailytrends", {"pn": pn})
+        return pd.DataFrame({0: [s["title"]["query"] for day in body["default"]["trendingSearchesDays"]
+                                 for s in day["trendingSearches"]]})
+
+    def build_payload(self, kw_list: List[str], timeframe: str = "today 5-y", geo: str = "", **kwargs):
+        self._keywords = list(kw_list)
+
+    def interest_over_time(self):
+        import pandas as pd
+
+        body = _get(f"{self.url}/trends/api/widgetdata/multiline", {"keywords": ",".join(self._keywords)})
+        points = body["default"]["timelineData"]
+        return pd.DataFrame({**{k: [p["value"][i] for p in points] for i, k in enumerate(self._keywords)},
+                             "isPartial": [p["isPartial"] for p in points]})
+
+
+def stub_pagers(urls: Dict[str, str], keywords: List[str] = ("marketing",), days: int = 7,
+                refresh: bool = False) -> Dict[str, Callable[[], Iterator[Page]]]:
+    """``source_pagers`` for running ``StubAPI`` servers: the real ``src.sources`` fetchers, given stub clients.
+
+    Only ``urls`` keys (``x``, ``reddit``, ``gtrends``) get a pager. Query
+    sharding, the shared scheduler (rate limits, 429 retries, response
+    cache) and record parsing all run as against the live APIs; feed the
+    pagers through ``stream_pages``. ``refresh`` skips response cache
+    lookups, so every page is fetched from the stand-ins.
+    """
+    from src.sources import iter_x_pages, iter_reddit_pages, iter_google_trends_pages
+
+    keywords = list(keywords)
+    pagers = {
+        "x": lambda: iter_x_pages(keywords, days=days, refresh=refresh, client=StubXClient(urls["x"])),
+        "reddit": lambda: iter_reddit_pages(keywords, days=days, refresh=refresh,
+                                            reddit=StubRedditClient(urls["reddit"])),
+        "gtrends": lambda: iter_google_trends_pages(keywords, pytrends=StubTrendReq(urls["gtrends"]), refresh=refresh),
+    }
+    return {name: pagers[name] for name in urls}
+
+
+def serve(**config: Dict[str, Any]):
+    """Run stand-ins until interrupted, e.g. ``serve(x={"latency": 0.2, "rate_limit": 50})``."""
+    apis = {name: StubAPI(name, **opts) for name, opts in config.items()}
+    for name, api in apis.items():
+        print(f"{name}: {api.start()}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for api in apis.values():
+            api.stop()
+
+
+if __name__ == "__main__":
+    serve(x={}, reddit={}, gtrends={})
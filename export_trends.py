@@ -0,0 +1,27 @@
+import click
+from src.export import export_to_file, FORMATS
+
+
+@click.command()
+@click.argument("path")
+@click.option("--format", "fmt", type=click.Choice(list(FORMATS)), default=None,
+              help="Output format; defaults to the file extension.")
+@click.option("--columns", default=None, help="Comma-separated columns (default: all).")
+@click.option("--category", default=None)
+@click.option("--platform", default=None)
+@click.option("--since", default=None, help="ISO date/time, inclusive.")
+@click.option("--until", default=None, help="ISO date/time, exclusive.")
+@click.option("--min-engagement", type=int, default=None)
+def main(path, fmt, columns, category, platform, since, until, min_engagement):
+    """Export stored trends to PATH (.ndjson, .csv or .parquet), streaming from the DB."""
+    cols = [c.strip() for c in columns.split(",") if c.strip()] if columns else None
+    try:
+        result = export_to_file(path, fmt, columns=cols, since=since, until=until, category=category,
+                                platform=platform, min_engagement=min_engagement)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+    click.echo(f"Wrote {result['bytes']} bytes of {result['format']} to {result['path']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 
 import os
 from src.pipeline import init_db, ingest_and_store, generate_report
+from src.sentiment import ensure_lexicon
 
 def main():
     # Use MOCK mode if not set
@@ -10,6 +11,9 @@ def main():
     print("Initializing DB...")
     init_db()
 
+    if not ensure_lexicon(download=True):
+        print("VADER lexicon unavailable; sentiment will default to 0.0")
+
     print("Ingesting (this may use mock data) ...")
     n = ingest_and_store(days=7)
     print(f"Inserted/updated {n} records into the DB.")
@@ -0,0 +1,99 @@
+import random, datetime, string
+from typing import List, Dict, Any, Iterator, Optional
+
+from src.config import load_keywords
+
+FILLER = ("the a our this new why how we you your for with from about after before more less best worst "
+          "just really update thread results launch test data team brand budget week month quarter growth "
+          "users customers traffic teams strategy campaign numbers insight lesson mistake tip guide case study "
+          "today tomorrow finally again still every never always quick deep dive breakdown").split()
+
+PLATFORMS = [("x", 0.55), ("reddit", 0.4), ("gtrends", 0.05)]
+
+
+def _keywords() -> List[str]:
+    cats = load_keywords().get("categories", {}) or {}
+    return [str(k) for kws in cats.values() for k in (kws or [])]
+
+
+def _sentence(rng: random.Random, words: int, keywords: List[str], density: float) -> str:
+    out = []
+    for _ in range(words):
+        out.append(rng.choice(keywords) if rng.random() < density else rng.choice(FILLER))
+    return " ".join(out)
+
+
+def _edit(rng: random.Random, text: str) -> str:
+    """A near-copy: retweet prefix, a dropped or swapped word, changed punctuation."""
+    words = text.split()
+    if len(words) > 3 and rng.random() < 0.5:
+        words.pop(rng.randrange(len(words)))
+    if len(words) > 3 and rng.random() < 0.3:
+        i = rng.randrange(len(words) - 1)
+        words[i], words[i + 1] = words[i + 1], words[i]
+    out = " ".join(words)
+    if rng.random() < 0.3:
+        out = "RT " + out
+    return out + rng.choice(["", "!", "!!", " 🔥", "?"])
+
+
+def generate_workload(n: int, seed: int = 42, days: int = 7, duplicate_rate: float = 0.15,
+                      keyword_density: float = 0.08, mean_words: int = 30, skew_rate: float = 0.02,
+                      now: Optional[datetime.datetime] = None) -> Iterator[Dict[str, Any]]:
+    """Yield ``n`` raw source records, reproducibly for a given ``seed``.
+
+    Texts have log-normally distributed lengths around ``mean_words`` words,
+    and each word is a configured keyword with probability
+    ``keyword_density`` (so some posts match nothing and get filtered out).
+    About ``duplicate_rate`` of the posts are edited copies of an earlier
+    one. Timestamps lean towards the recent end of the ``days`` window;
+    ``skew_rate`` of them are off by up to a day either way, as with a bad
+    client clock, and Google Trends rows are undated. Records are generated
+    lazily, so millions can be streamed without holding them.
+    """
+    rng = random.Random(seed)
+    keywords = _keywords() or ["marketing"]
+    now = now or datetime.datetime.utcnow()
+    span = days * 86400
+    recent: List[str] = []
+    platforms, weights = zip(*PLATFORMS)
+    for i in range(n):
+        platform = rng.choices(platforms, weights)[0]
+        if recent and rng.random() < duplicate_rate:
+            text = _edit(rng, rng.choice(recent))
+        else:
+            words = max(3, min(600, int(rng.lognormvariate(0, 0.8) * mean_words)))
+            text = _sentence(rng, words, keywords, keyword_density)
+            if len(recent) < 5000:
+                recent.append(text)
+            else:
+                recent[rng.randrange(len(recent))] = text
+        created = now - datetime.timedelta(seconds=min(span, rng.expovariate(3.0 / span)))
+        if rng.random() < skew_rate:
+            created += datetime.timedelta(seconds=rng.uniform(-86400, 86400))
+        engagement = int(rng.paretovariate(1.2) * 3)
+        rid = "".join(rng.choices(string.ascii_lowercase + string.digits, k=10))
+        yield {
+            "id": f"wl-{platform}-{i}-{rid}",
+            "platform": platform,
+            "created_at": None if platform == "gtrends" else created.isoformat(),
+            "title": text[:120],
+            "text": text,
+            "author": f"user{rng.randrange(max(1, n // 20))}",
+            "url": f"https://example.com/{platform}/{rid}",
+            "lang": "en",
+            "engagement": engagement,
+            "raw_metrics": {"like_count": engagement, "reply_count": rng.randrange(0, 1 + engagement // 4)},
+        }
+
+
+def generate_batches(n: int, batch_size: int = 1000, **kwargs: Any) -> Iterator[List[Dict[str, Any]]]:
+    """``generate_workload`` in lists of ``batch_size`` records."""
+    batch = []
+    for rec in generate_workload(n, **kwargs):
+        batch.append(rec)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,476 @@
+import os, uuid, sqlite3
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+
+from src.config import ARCHIVE_DIR, ARCHIVE_HOT_DAYS, ARCHIVE_COMPRESSION
+from src.db import QUERY_COLUMNS, reader, write, bump_change_counter, days_ago, incremental_vacuum_enabled
+from src.export import arrow_schema
+from src import metrics
+
+# kept per archived row: every selectable column, plus the near-duplicate cluster
+ARCHIVE_COLUMNS = QUERY_COLUMNS + ["cluster_id"]
+# columns the shared WHERE clauses, orderings and cluster grouping refer to
+_BASE_COLUMNS = ["id", "created_at", "category", "platform", "engagement", "cluster_id"]
+# rows per Parquet row group; files are sorted by created_at, so time filters skip whole groups
+ROW_GROUP_SIZE = 10000
+# ids looked up in ``trends`` per query
+_LOOKUP_CHUNK = 500
+
+# partition file -> (min, max) created_at from its footer; files are never modified, only replaced
+_bounds_cache: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+
+
+def _partition_dir(day: str) -> str:
+    return os.path.join(ARCHIVE_DIR, f"day={day}")
+
+
+def _parts(day: str) -> List[str]:
+    path = _partition_dir(day)
+    if not os.path.isdir(path):
+        return []
+    return sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith(".parquet") and not f.startswith("."))
+
+
+def partitions() -> List[str]:
+    """Archived days (``YYYY-MM-DD``), oldest first."""
+    if not os.path.isdir(ARCHIVE_DIR):
+        return []
+    return sorted(name[len("day="):] for name in os.listdir(ARCHIVE_DIR)
+                  if name.startswith("day=") and _parts(name[len("day="):]))
+
+
+def _bounds(path: str) -> Tuple[Optional[str], Optional[str]]:
+    """``(min, max)`` created_at in a partition file, read from the row group statistics (None if missing)."""
+    bounds = _bounds_cache.get(path)
+    if bounds is None:
+        import pyarrow.parquet as pq
+
+        meta = pq.read_metadata(path, memory_map=True)
+        col = meta.schema.names.index("created_at")
+        stats = [meta.row_group(i).column(col).statistics for i in range(meta.num_row_groups)]
+        if stats and all(s is not None and s.has_min_max for s in stats):
+            bounds = (min(s.min for s in stats), max(s.max for s in stats))
+        else:
+            bounds = (None, None)
+        _bounds_cache[path] = bounds
+    return bounds
+
+
+def _files(since: str = None, until: str = None) -> List[str]:
+    """Partition files that can hold rows in ``[since, until)``.
+
+    Days are picked by name, then each file by the created_at range in its
+    footer, so the day the hot window starts in only counts if rows before
+    the archive cutoff fall in the range.
+    """
+    if not os.path.isdir(ARCHIVE_DIR):
+        return []
+    files = []
+    for name in sorted(os.listdir(ARCHIVE_DIR)):
+        day = name[len("day="):]
+        if (not name.startswith("day=") or (since is not None and day < since[:10])
+                or (until is not None and day > until[:10])):
+            continue
+        for path in _parts(day):
+            lo, hi = _bounds(path)
+            if (since is None or hi is None or hi >= since) and (until is None or lo is None or lo < until):
+                files.append(path)
+    return files
+
+
+def covers(since: str = None, until: str = None) -> bool:
+    """Whether any archived row can fall in ``[since, until)``; a directory listing plus cached footers."""
+    return bool(_files(since, until))
+
+
+def _dataset(files: List[str]):
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    from pyarrow import fs
+
+    # partition keys stay strings ("day=2024-05-01"), and pages are memory-mapped, not copied in
+    return ds.dataset(files, format="parquet", filesystem=fs.LocalFileSystem(use_mmap=True),
+                      partitioning=ds.partitioning(pa.schema([("day", pa.string())]), flavor="hive"),
+                      partition_base_dir=ARCHIVE_DIR)
+
+
+def _filter(since=None, until=None, category=None, platform=None, min_engagement=None):
+    import pyarrow.dataset as ds
+
+    # the day bounds prune whole partitions before any file is opened
+    expr = ds.scalar(True)
+    if since is not None:
+        expr &= (ds.field("day") >= since[:10]) & (ds.field("created_at") >= since)
+    if until is not None:
+        expr &= (ds.field("day") <= until[:10]) & (ds.field("created_at") < until)
+    if category is not None:
+        expr &= ds.field("category") == category
+    if platform is not None:
+        expr &= ds.field("platform") == platform
+    if min_engagement is not None:
+        expr &= ds.field("engagement") >= int(min_engagement)
+    return expr
+
+
+def _check(columns: List[str]) -> List[str]:
+    bad = [c for c in columns if c not in ARCHIVE_COLUMNS]
+    if bad:
+        raise ValueError(f"unknown columns: {', '.join(bad)}")
+    return list(columns)
+
+
+def scan(columns: List[str] = None, since: str = None, until: str = None, category: str = None,
+         platform: str = None, min_engagement: int = None) -> "pa.Table":
+    """Archived rows matching the ``query_trends``-style filters, as an Arrow table of ``columns``."""
+    columns = _check(columns or ARCHIVE_COLUMNS)
+    files = _files(since, until)
+    if not files:
+        return arrow_schema(columns).empty_table()
+    return _dataset(files).to_table(columns=columns, filter=_filter(since, until, category, platform, min_engagement))
+
+
+def lookup(ids_by_day: Dict[str, List[str]]) -> Dict[str, Dict[str, Any]]:
+    """Archived copies of ids, keyed by id; only the partitions of the given days are opened."""
+    import pyarrow.dataset as ds
+
+    files = [p for day in ids_by_day for p in _parts(day)]
+    if not files:
+        return {}
+    ids = [i for day_ids in ids_by_day.values() for i in day_ids]
+    table = _dataset(files).to_table(columns=ARCHIVE_COLUMNS, filter=ds.field("id").isin(ids))
+    return {row["id"]: row for row in table.to_pylist()}
+
+
+def _hot_ids(con: sqlite3.Connection, ids: List[str]) -> set:
+    hot = set()
+    for i in range(0, len(ids), _LOOKUP_CHUNK):
+        chunk = ids[i:i + _LOOKUP_CHUNK]
+        hot.update(r[0] for r in con.execute(f"SELECT id FROM trends WHERE id IN ({','.join('?' * len(chunk))})",
+                                             chunk))
+    return hot
+
+
+def top(columns: List[str], key: str, limit: int, since: str = None, until: str = None, category: str = None,
+        platform: str = None, min_engagement: int = None, after: Tuple[Any, str] = None,
+        where: "ds.Expression" = None) -> "pa.Table":
+    """The first ``limit`` archived rows by ``key`` descending (ties by id), as an Arrow table of ``columns``.
+
+    The filters, the ``(key, id)`` keyset position ``after`` and any extra
+    ``where`` expression are pushed into the scan, and only the best
+    ``limit`` rows are kept as batches stream by, so memory stays O(limit)
+    however many archived rows match. Rows that are (again) in ``trends``
+    are left out; only ids that make the running top are looked up there.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+
+    columns = list(dict.fromkeys(_check(list(columns)) + _check([key, "id"])))
+    files = _files(since, until)
+    if not files or limit <= 0:
+        return arrow_schema(columns).empty_table()
+    expr = _filter(since, until, category, platform, min_engagement)
+    if after is not None:
+        expr &= (ds.field(key) < after[0]) | ((ds.field(key) == after[0]) & (ds.field("id") < after[1]))
+    if where is not None:
+        expr &= where
+    order = [(key, "descending"), ("id", "descending")]
+    best, checked, hot = arrow_schema(columns).empty_table(), set(), set()
+    with reader() as con:
+        for batch in _dataset(files).scanner(columns=columns, filter=expr).to_batches():
+            if not batch.num_rows:
+                continue
+            candidates = pa.concat_tables([best, pa.Table.from_batches([batch]).cast(best.schema)])
+            while True:
+                if hot:
+                    candidates = candidates.filter(pc.invert(pc.is_in(candidates["id"],
+                                                                      value_set=pa.array(list(hot)))))
+                picked = candidates.take(pc.select_k_unstable(candidates, k=limit, sort_keys=order))
+                new = [i for i in picked["id"].to_pylist() if i not in checked]
+                checked.update(new)
+                found = _hot_ids(con, new)
+                hot |= found
+                if not found:
+                    break
+            best = picked
+    return best.take(pc.sort_indices(best, sort_keys=order))
+
+
+def text_match(words: List[str], prefix: bool = False) -> "ds.Expression":
+    """Scan filter: title or text contains every word, case-insensitively; the last one as a prefix if ``prefix``.
+
+    The archive's stand-in for an FTS5 match of plain search text. Words
+    are matched on word boundaries, and punctuation inside a word matches
+    any separator, as FTS5's tokenizer splits there too.
+    """
+    import re
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+
+    expr = ds.scalar(True)
+    for i, word in enumerate(words):
+        tokens = re.findall(r"\w+", word)
+        if not tokens:
+            continue
+        pattern = r"\b" + r"\W+".join(re.escape(t) for t in tokens) + ("" if prefix and i == len(words) - 1 else r"\b")
+        expr &= (pc.match_substring_regex(ds.field("title"), pattern=pattern, ignore_case=True)
+                 | pc.match_substring_regex(ds.field("text"), pattern=pattern, ignore_case=True))
+    return expr
+
+
+def _rehot(con: sqlite3.Connection, files: List[str], since: str = None) -> List[str]:
+    """Ids in ``trends`` dated inside the archived range of ``files``: rows archived, then ingested again.
+
+    Everything hot from before the archive cutoff is such a row, so this
+    is a short range read on the created_at index.
+    """
+    bounds = [_bounds(p) for p in files]
+    lo = min((b[0] for b in bounds if b[0] is not None), default="")
+    hi = max((b[1] for b in bounds if b[1] is not None), default="\uffff")
+    if any(b[0] is None for b in bounds):
+        lo, hi = "", "\uffff"
+    if since is not None:
+        lo = max(lo, since)
+    return [r[0] for r in con.execute("SELECT id FROM trends WHERE created_at >= ? AND created_at <= ?", (lo, hi))]
+
+
+def current(columns: List[str], since: str = None, until: str = None, category: str = None,
+            platform: str = None, min_engagement: int = None, clusters: List[str] = None) -> "pa.Table":
+    """Like ``scan``, without the rows that are (again) in ``trends``: the archive's share of a query.
+
+    ``clusters`` limits it to rows whose cluster key (``cluster_id``, else
+    the row id) is one of those given.
+    """
+    import pyarrow.dataset as ds
+
+    columns = _check(list(columns))
+    files = _files(since, until)
+    if not files:
+        return arrow_schema(columns).empty_table()
+    expr = _filter(since, until, category, platform, min_engagement)
+    with reader() as con:
+        hot = _rehot(con, files, since)
+    if hot:
+        expr &= ~ds.field("id").isin(hot)
+    if clusters is not None:
+        expr &= ds.field("cluster_id").isin(clusters) | (ds.field("cluster_id").is_null()
+                                                          & ds.field("id").isin(clusters))
+    return _dataset(files).to_table(columns=columns, filter=expr)
+
+
+def _bucket_labels(created_at: "pa.ChunkedArray", bucket: str) -> "pa.ChunkedArray":
+    """Arrow twin of ``db.TIMESERIES_BUCKETS``: the bucket label of each ISO timestamp, null if unparseable."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    day = pc.utf8_slice_codeunits(created_at, 0, 10)
+    date = pc.cast(pc.strptime(day, format="%Y-%m-%d", unit="s", error_is_null=True), pa.date32())
+    if bucket == "week":
+        # days since the epoch, minus the weekday (Monday = 0)
+        date = pc.cast(pc.subtract(pc.cast(date, pa.int32()), pc.cast(pc.day_of_week(date), pa.int32())),
+                       pa.date32())
+    label = pc.cast(date, pa.string())
+    if bucket == "hour":
+        # a bare date is midnight, as in strftime
+        hour = pc.if_else(pc.greater_equal(pc.utf8_length(created_at), 13),
+                          pc.utf8_slice_codeunits(created_at, 11, 13), "00")
+        label = pc.binary_join_element_wise(label, hour, "T")
+        label = pc.binary_join_element_wise(label, ":00:00", "")
+    return label
+
+
+def timeseries(bucket: str, col: str, since: str = None, until: str = None, category: str = None,
+               platform: str = None) -> List[tuple]:
+    """Per (time ``bucket``, ``col``) group of the archived rows in ``[since, until)``:
+    ``(bucket, key, count, engagement_sum, sentiment_sum, sentiment_count)``.
+
+    Grouped by Arrow over the three columns it needs, so only one tuple per
+    group reaches Python; ``db.query_timeseries`` adds the hot groups.
+    """
+    import pyarrow.compute as pc
+
+    table = current(["created_at", col, "engagement", "sentiment_compound"], since, until, category, platform)
+    if not table.num_rows:
+        return []
+    table = table.append_column("bucket", _bucket_labels(table["created_at"], bucket))
+    table = table.filter(pc.is_valid(table["bucket"]))
+    groups = table.group_by(["bucket", col]).aggregate([
+        ("created_at", "count"), ("engagement", "sum"), ("sentiment_compound", "sum"),
+        ("sentiment_compound", "count")])
+    return list(zip(*(groups[c].to_pylist() for c in (
+        "bucket", col, "created_at_count", "engagement_sum", "sentiment_compound_sum", "sentiment_compound_count"))))
+
+
+def clusters(since: str = None) -> "pa.Table":
+    """Archived rows since ``since`` per near-duplicate cluster (``cluster_id``, else the row id):
+    an Arrow table of ``key``, ``posts`` and ``engagement`` (their sum)."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    table = current(["id", "cluster_id", "engagement"], since=since)
+    table = pa.table({"key": pc.coalesce(table["cluster_id"], table["id"]),
+                      "engagement": pc.fill_null(table["engagement"], 0)})
+    groups = table.group_by("key").aggregate([("engagement", "sum"),
+                                              ("engagement", "count", pc.CountOptions(mode="all"))])
+    return pa.table({"key": groups["key"], "posts": groups["engagement_count"],
+                     "engagement": groups["engagement_sum"]})
+
+
+def cluster_leads(columns: List[str], keys: List[str], since: str = None) -> Dict[str, Dict[str, Any]]:
+    """The most engaging archived row (ties by id) since ``since`` of each cluster in ``keys``, by key."""
+    import pyarrow.compute as pc
+
+    cols = list(dict.fromkeys(_check(list(columns)) + ["id", "cluster_id", "engagement"]))
+    table = current(cols, since=since, clusters=keys)
+    table = table.append_column("_key", pc.coalesce(table["cluster_id"], table["id"]))
+    table = table.sort_by([("engagement", "descending"), ("id", "descending")])
+    leads = {}
+    for row in table.to_pylist():
+        leads.setdefault(row.pop("_key"), row)
+    return leads
+
+
+def new_topics(since: str, known: List[str]) -> int:
+    """Clusters (``cluster_id``, else the row id) among archived rows since ``since`` that are not in ``known``."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    table = current(["id", "cluster_id"], since=since)
+    keys = pc.unique(pc.coalesce(table["cluster_id"], table["id"]))
+    return len(keys) - (pc.sum(pc.is_in(keys, value_set=pa.array(known, pa.string()))).as_py() or 0)
+
+
+def attach(con: sqlite3.Connection, columns: List[str], since: str = None, until: str = None,
+           category: str = None, platform: str = None, min_engagement: int = None) -> str:
+    """Create the temp view ``history`` on ``con``: ``trends`` plus the matching archived rows.
+
+    Only ``columns`` (and those the shared filters and orderings use) are
+    read, from the partitions ``[since, until)`` touches. A row that is in
+    both tiers is taken from ``trends``. Returns the view name.
+    """
+    cols = list(dict.fromkeys(_check(list(columns)) + _BASE_COLUMNS))
+    table = scan(cols, since, until, category, platform, min_engagement)
+    con.execute("DROP VIEW IF EXISTS temp.history")
+    con.execute("DROP TABLE IF EXISTS temp.archived")
+    con.execute(f"CREATE TEMP TABLE archived ({', '.join(cols)})")
+    insert = f"INSERT INTO temp.archived VALUES ({', '.join('?' * len(cols))})"
+    for batch in table.to_batches():
+        con.executemany(insert, zip(*(col.to_pylist() for col in batch.columns)))
+    con.execute(f"""
+    CREATE TEMP VIEW history AS
+    SELECT {', '.join(cols)} FROM main.trends
+    UNION ALL
+    SELECT {', '.join(cols)} FROM temp.archived WHERE id NOT IN (SELECT id FROM main.trends)
+    """)
+    con.commit()
+    return "history"
+
+
+def iter_batches(columns: List[str], batch_size: int = 1000, since: str = None, until: str = None,
+                 category: str = None, platform: str = None, min_engagement: int = None) -> Iterator[List[tuple]]:
+    """Archived rows as tuples, ``batch_size`` at a time, streamed off the Arrow scanner.
+
+    Rows that are also (again) in ``trends`` are left out, so following
+    ``db.iter_trends`` over the hot table with this yields each id once.
+    """
+    columns = _check(columns)
+    files = _files(since, until)
+    if not files:
+        return
+    scanner = _dataset(files).scanner(columns=list(dict.fromkeys(columns + ["id"])), batch_size=batch_size,
+                                 filter=_filter(since, until, category, platform, min_engagement))
+    with reader() as con:
+        for batch in scanner.to_batches():
+            if not batch.num_rows:
+                continue
+            ids = batch.column("id").to_pylist()
+            hot = _hot_ids(con, ids)
+            rows = zip(*(batch.column(c).to_pylist() for c in columns))
+            yield [row for row, rid in zip(rows, ids) if rid not in hot]
+
+
+def _write_partition(day: str, table: "pa.Table") -> str:
+    """Merge ``table`` into the day's partition as one new file; rows with the same id are replaced."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    old = _parts(day)
+    if old:
+        prev = pa.concat_tables([pq.read_table(p, memory_map=True, columns=table.column_names).cast(table.schema)
+                                 for p in old])
+        keep = prev.filter(pc.invert(pc.is_in(prev["id"], value_set=table["id"])))
+        table = pa.concat_tables([keep, table])
+    table = table.sort_by([("created_at", "ascending"), ("id", "ascending")])
+    path = _partition_dir(day)
+    os.makedirs(path, exist_ok=True)
+    name = f"part-{uuid.uuid4().hex}.parquet"
+    # written under a dot-name, which dataset scans skip, then renamed into place
+    tmp = os.path.join(path, "." + name)
+    pq.write_table(table, tmp, compression=ARCHIVE_COMPRESSION, row_group_size=ROW_GROUP_SIZE)
+    os.replace(tmp, os.path.join(path, name))
+    for p in old:
+        os.remove(p)
+        _bounds_cache.pop(p, None)
+    return os.path.join(path, name)
+
+
+def _move_day(con: sqlite3.Connection, day: str, cutoff: str) -> int:
+    """Writer job: copy the day's rows before ``cutoff`` into its partition, then delete them from ``trends``."""
+    import pyarrow as pa
+
+    schema = arrow_schema(ARCHIVE_COLUMNS)
+    # every string with the day as prefix sorts in [day, day + U+FFFF)
+    window = "created_at >= ? AND created_at < ? AND created_at < ?"
+    params = (day, day + "\uffff", cutoff)
+    rows = con.execute(f"SELECT {', '.join(ARCHIVE_COLUMNS)} FROM trends WHERE {window}", params).fetchall()
+    if rows:
+        table = pa.Table.from_arrays([pa.array([r[i] for r in rows], type=schema.field(i).type)
+                                      for i in range(len(ARCHIVE_COLUMNS))], schema=schema)
+        _write_partition(day, table)
+        con.execute(f"DELETE FROM trends WHERE {window}", params)
+        bump_change_counter(con)
+    return len(rows)
+
+
+def _prune_clusters(con: sqlite3.Connection, cutoff: str) -> int:
+    stale = """SELECT cluster_id FROM trend_clusters c WHERE last_seen < ?
+               AND NOT EXISTS (SELECT 1 FROM trends t WHERE t.cluster_id = c.cluster_id)"""
+    con.execute(f"DELETE FROM lsh_bands WHERE cluster_id IN ({stale})", (cutoff,))
+    return con.execute(f"DELETE FROM trend_clusters WHERE cluster_id IN ({stale})", (cutoff,)).rowcount
+
+
+def _vacuum(con: sqlite3.Connection) -> int:
+    before = con.execute("PRAGMA freelist_count").fetchone()[0]
+    if incremental_vacuum_enabled(con):
+        # stepped to completion by executescript; a plain execute frees a single page
+        con.executescript("PRAGMA incremental_vacuum")
+    con.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    return before - con.execute("PRAGMA freelist_count").fetchone()[0]
+
+
+def archive_old_rows(hot_days: int = ARCHIVE_HOT_DAYS, vacuum: bool = True) -> Dict[str, Any]:
+    """Move dated rows older than ``hot_days`` out of SQLite into the Parquet archive.
+
+    Each day is written (merged into its partition) and deleted from
+    ``trends`` in one job on the database writer thread, so a concurrent
+    ingest can't update a row in between. Undated rows stay hot.
+    ``trend_rollups`` and ``trend_buckets`` keep their history, so summaries
+    still cover archived days. Near-duplicate clusters last seen before the
+    cutoff, with no hot member left, are dropped from the LSH index. Finally
+    the freed pages are returned to the filesystem with an incremental vacuum.
+    """
+    cutoff = days_ago(hot_days)
+    result = {"cutoff": cutoff, "rows": 0, "partitions": 0, "clusters_pruned": 0, "pages_freed": 0}
+    with reader() as con:
+        days = [d for (d,) in con.execute("SELECT DISTINCT substr(created_at, 1, 10) FROM trends "
+                                          "WHERE created_at < ? ORDER BY 1", (cutoff,))]
+    for day in days:
+        moved = write(lambda con, day=day: _move_day(con, day, cutoff))
+        result["rows"] += moved
+        result["partitions"] += bool(moved)
+    metrics.inc("archive_rows", result["rows"])
+
+    result["clusters_pruned"] = write(lambda con: _prune_clusters(con, cutoff))
+    if vacuum:
+        result["pages_freed"] = write(_vacuum, atomic=False)
+    return result
@@ -0,0 +1,117 @@
+import json, hashlib
+from sys import intern
+from array import array
+from typing import List, Dict, Any, Iterable, Iterator, Sequence
+
+from src.db import COLUMNS
+
+
+def record_id(r: Dict[str, Any]) -> str:
+    """The record's id, or a stable hash of platform + title + created_at when the source gave none."""
+    rid = r.get("id")
+    if not rid:
+        raw = (r.get("platform","") + (r.get("title") or "") + (r.get("created_at") or ""))
+        rid = hashlib.md5(raw.encode()).hexdigest()
+    return rid
+
+
+class RecordBatch:
+    """One chunk of records held column-wise, as the enrichment stages see them.
+
+    Every ``db.COLUMNS`` column is a list (or an ``array`` for engagement,
+    sentiment and the relevance flag) indexed by row. Title, text and
+    ``raw_metrics`` are kept as the source sent them; ``rows`` applies the
+    storage truncation and JSON encoding, so dropped rows never pay for it.
+    ``combined`` (``title + " " + text``, for sentiment) and ``lowered`` (its
+    lowercased form, for keyword scans) are each built once, on first use,
+    for the rows still in the batch; ``release_text`` drops them. Stages
+    update the columns in place and ``take`` drops rows from all of them at
+    once; dicts only exist at the edges (``from_records`` / ``to_records``).
+    """
+
+    __slots__ = tuple(COLUMNS) + ("_combined", "_lowered")
+
+    def __init__(self):
+        for c in COLUMNS:
+            setattr(self, c, [])
+        self.engagement = array("q")
+        self.marketing_relevant = bytearray()
+        self.sentiment_compound = array("d")
+        self._combined = self._lowered = None
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]]) -> "RecordBatch":
+        """Columns from raw source records, normalized the way ``pipeline.normalize_record`` does."""
+        records = records if isinstance(records, list) else list(records)
+        b = cls()
+        b.id = [r.get("id") or record_id(r) for r in records]
+        for c in ("created_at", "author", "url", "category", "matched_keyword"):
+            setattr(b, c, [r.get(c) for r in records])
+        b.title = [r.get("title") or "" for r in records]
+        b.text = [r.get("text") or "" for r in records]
+        # platform, lang, category and keyword repeat on every row: share one object per value
+        b.platform = [intern(p) if p.__class__ is str else p for p in (r.get("platform") for r in records)]
+        b.lang = [intern(r.get("lang") or "en") for r in records]
+        b.category = [intern(c) if c.__class__ is str else c for c in b.category]
+        b.matched_keyword = [intern(k) if k.__class__ is str else k for k in b.matched_keyword]
+        b.engagement = array("q", [int(r.get("engagement") or 0) for r in records])
+        b.raw_metrics = [r.get("raw_metrics") or {} for r in records]
+        b.marketing_relevant = bytearray(1 if r.get("marketing_relevant") else 0 for r in records)
+        b.sentiment_compound = array("d", [float(r.get("sentiment_compound") or 0.0) for r in records])
+        return b
+
+    def __len__(self) -> int:
+        return len(self.id)
+
+    @property
+    def combined(self) -> List[str]:
+        if self._combined is None:
+            self._combined = [title + " " + text for title, text in zip(self.title, self.text)]
+        return self._combined
+
+    @property
+    def lowered(self) -> List[str]:
+        if self._lowered is None:
+            if self._combined is not None:
+                self._lowered = [t.lower() for t in self._combined]
+            else:
+                self._lowered = [(title + " " + text).lower() for title, text in zip(self.title, self.text)]
+        return self._lowered
+
+    def release_text(self, keep_combined: bool = False):
+        """Drop the ``lowered`` (and unless ``keep_combined``, ``combined``) cache once no stage needs it."""
+        self._lowered = None
+        if not keep_combined:
+            self._combined = None
+
+    def take(self, indices: Sequence[int]) -> "RecordBatch":
+        """Keep only the rows at ``indices`` (in that order), in place; returns the batch."""
+        for c in self.__slots__:
+            col = getattr(self, c)
+            if col is None:
+                continue
+            picked = [col[i] for i in indices]
+            if isinstance(col, array):
+                picked = array(col.typecode, picked)
+            elif isinstance(col, bytearray):
+                picked = bytearray(picked)
+            setattr(self, c, picked)
+        return self
+
+    def rows(self) -> Iterator[tuple]:
+        """Rows as tuples in ``db.COLUMNS`` order, ready for ``bulk_upsert``."""
+        cols = [getattr(self, c) for c in COLUMNS]
+        cols[COLUMNS.index("title")] = [t[:400] for t in self.title]
+        cols[COLUMNS.index("text")] = [t[:4000] for t in self.text]
+        cols[COLUMNS.index("raw_metrics")] = [json.dumps(m, sort_keys=True) for m in self.raw_metrics]
+        return zip(*cols)
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """Normalized record dicts, as ``pipeline.normalize_record`` returns them."""
+        out = []
+        for row in self.rows():
+            r = dict(zip(COLUMNS, row))
+            r["raw_metrics"] = json.loads(r["raw_metrics"])
+            r["marketing_relevant"] = bool(r["marketing_relevant"])
+            out.append(r)
+        return out
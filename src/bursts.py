@@ -0,0 +1,83 @@
+import datetime, threading
+from typing import List, Dict, Any, Optional, Tuple
+
+from src.config import BURST_LOOKBACK_HOURS, BURST_ALPHA, BURST_MIN_COUNT, BURST_Z_THRESHOLD
+from src.db import load_buckets, change_counter
+
+_cache: Dict[tuple, List[Dict[str, Any]]] = {}
+_cache_lock = threading.Lock()
+_CACHE_ENTRIES = 32
+
+
+def hour_grid(hours: int, now: Optional[datetime.datetime] = None) -> List[str]:
+    """The last ``hours`` bucket labels (``YYYY-MM-DDTHH``), oldest first, ending with the current hour."""
+    now = (now or datetime.datetime.utcnow()).replace(minute=0, second=0, microsecond=0)
+    return [(now - datetime.timedelta(hours=h)).strftime("%Y-%m-%dT%H") for h in range(hours - 1, -1, -1)]
+
+
+def ewma_scores(x: "np.ndarray", alpha: float = BURST_ALPHA) -> Tuple["np.ndarray", "np.ndarray"]:
+    """Score the last column of ``x`` (keys x buckets) against an EWMA of the earlier ones.
+
+    Returns ``(z, baseline)`` per row. The mean and variance recurrences run
+    over buckets with every key updated at once, so the cost is one vector
+    op per bucket however many keys there are. The spread is floored at the
+    Poisson level (``sqrt(mean)``, at least 1) so that a key going from
+    nothing to a handful of posts does not score infinitely high.
+    """
+    import numpy as np
+    mean = np.zeros(x.shape[0])
+    var = np.zeros(x.shape[0])
+    for t in range(x.shape[1] - 1):
+        diff = x[:, t] - mean
+        mean += alpha * diff
+        var = (1 - alpha) * (var + alpha * diff * diff)
+    z = (x[:, -1] - mean) / np.sqrt(np.maximum(var, np.maximum(mean, 1.0)))
+    return z, mean
+
+
+def _score(by: str, hours: int, alpha: float, now: datetime.datetime) -> List[Dict[str, Any]]:
+    import numpy as np
+    grid = hour_grid(hours, now)
+    rows = load_buckets(by, grid[0])
+    if not rows:
+        return []
+    col = {h: i for i, h in enumerate(grid)}
+    rows = [r for r in rows if r[0] in col]
+    keys, ki = np.unique(np.array([r[1] for r in rows], dtype=object), return_inverse=True)
+    hi = np.fromiter((col[r[0]] for r in rows), dtype=np.int64, count=len(rows))
+    counts = np.zeros((len(keys), len(grid)))
+    engagement = np.zeros((len(keys), len(grid)))
+    counts[ki, hi] = [r[2] for r in rows]
+    engagement[ki, hi] = [r[3] for r in rows]
+
+    z, baseline = ewma_scores(counts, alpha)
+    ez, _ = ewma_scores(engagement, alpha)
+    order = np.argsort(-z, kind="stable")
+    return [{by: keys[i], "hour": grid[-1], "count": int(counts[i, -1]), "baseline": round(float(baseline[i]), 3),
+             "z": round(float(z[i]), 3), "engagement": int(engagement[i, -1]), "engagement_z": round(float(ez[i]), 3)}
+            for i in order]
+
+
+def detect_bursts(by: str = "keyword", hours: int = BURST_LOOKBACK_HOURS, alpha: float = BURST_ALPHA,
+                  min_count: int = BURST_MIN_COUNT, threshold: float = BURST_Z_THRESHOLD,
+                  limit: int = 20, now: Optional[datetime.datetime] = None) -> List[Dict[str, Any]]:
+    """Keywords (or categories) whose post count this hour is far above their recent trend.
+
+    Reads the hourly ``trend_buckets`` that every ingest updates in place,
+    limited to the last ``hours``, so the cost does not grow with history.
+    A key is rising when its current-hour ``count`` is at least
+    ``min_count`` and its EWMA z-score at least ``threshold``; results are
+    ordered by z-score. Scores are cached until the next write or hour.
+    """
+    now = now or datetime.datetime.utcnow()
+    key = (by, int(hours), float(alpha), change_counter(), now.strftime("%Y-%m-%dT%H"))
+    with _cache_lock:
+        scored = _cache.get(key)
+    if scored is None:
+        scored = _score(by, max(2, int(hours)), alpha, now)
+        with _cache_lock:
+            if len(_cache) >= _CACHE_ENTRIES:
+                _cache.clear()
+            _cache[key] = scored
+    rising = [r for r in scored if r["count"] >= min_count and r["z"] >= threshold]
+    return rising[:limit] if limit is not None else rising
@@ -1,14 +1,18 @@
 import os
-from dotenv import load_dotenv
-import yaml
-
-load_dotenv()
 
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+
+# python-dotenv is only imported when there is a .env to load (cwd first, then the project root)
+for _env in (os.path.join(os.getcwd(), ".env"), os.path.join(BASE_DIR, ".env")):
+    if os.path.isfile(_env):
+        from dotenv import load_dotenv
+        load_dotenv(_env)
+        break
+
 DATA_DIR = os.path.join(BASE_DIR, "data")
-REPORTS_DIR = os.path.join(BASE_DIR, "reports")
+REPORTS_DIR = os.getenv("REPORTS_DIR", os.path.join(BASE_DIR, "reports"))
 KEYWORDS_PATH = os.path.join(BASE_DIR, "config", "keywords.yaml")
-DB_PATH = os.path.join(DATA_DIR, "db.sqlite3")
+DB_PATH = os.getenv("DB_PATH", os.path.join(DATA_DIR, "db.sqlite3"))
 
 # envs
 X_BEARER_TOKEN = os.getenv("X_BEARER_TOKEN")
@@ -18,8 +22,100 @@ REDDIT_USER_AGENT = os.getenv("REDDIT_USER_AGENT", "trend-extractor/1.0 by yourn
 GEO = os.getenv("GEO", "IN")
 MOCK_MODE = os.getenv("MOCK_MODE", "true").lower() == "true"
 
+# sentiment scoring: 0 workers = one per CPU
+SENTIMENT_WORKERS = int(os.getenv("SENTIMENT_WORKERS", "0"))
+SENTIMENT_BATCH_SIZE = int(os.getenv("SENTIMENT_BATCH_SIZE", "500"))
+SENTIMENT_CACHE_PATH = os.getenv("SENTIMENT_CACHE_PATH", os.path.join(DATA_DIR, "sentiment_cache.sqlite3"))
+
+# streaming ingest: pages buffered between fetchers and the pipeline,
+# and records enriched + written per chunk
+STREAM_QUEUE_PAGES = int(os.getenv("STREAM_QUEUE_PAGES", "8"))
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", "1000"))
+# uncached texts in one scoring call from which sentiment goes to the process
+# pool; ingest scores one chunk per call, so this must stay below the chunk size
+SENTIMENT_PARALLEL_MIN = int(os.getenv("SENTIMENT_PARALLEL_MIN", str(max(1, STREAM_CHUNK_SIZE // 2))))
+
+# incremental ingest: minimum gap between Google Trends pulls for the same query
+GTRENDS_REFRESH_MINUTES = float(os.getenv("GTRENDS_REFRESH_MINUTES", "60"))
+
+# background ingest jobs: concurrent runs, and finished jobs kept for polling
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+JOB_HISTORY = int(os.getenv("JOB_HISTORY", "100"))
+
+# burst detection: hourly buckets looked back over, EWMA smoothing, and the
+# minimum latest-hour count and z-score for a key to be reported as rising
+BURST_LOOKBACK_HOURS = int(os.getenv("BURST_LOOKBACK_HOURS", "168"))
+BURST_ALPHA = float(os.getenv("BURST_ALPHA", "0.1"))
+BURST_MIN_COUNT = int(os.getenv("BURST_MIN_COUNT", "3"))
+BURST_Z_THRESHOLD = float(os.getenv("BURST_Z_THRESHOLD", "3.0"))
+
+# source API scheduling: (requests per minute, burst) per source, the longest a
+# 429 may make us wait before the source gives up for this run, and retries
+SOURCE_RATES = {
+    "x": (float(os.getenv("X_RATE_PER_MIN", "30")), float(os.getenv("X_RATE_BURST", "5"))),
+    "reddit": (float(os.getenv("REDDIT_RATE_PER_MIN", "60")), float(os.getenv("REDDIT_RATE_BURST", "10"))),
+    "gtrends": (float(os.getenv("GTRENDS_RATE_PER_MIN", "6")), float(os.getenv("GTRENDS_RATE_BURST", "2"))),
+}
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "30"))
+RATE_LIMIT_RETRIES = int(os.getenv("RATE_LIMIT_RETRIES", "3"))
+# on-disk cache of source responses; repeated requests inside the TTL cost no API calls
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", os.path.join(DATA_DIR, "response_cache.sqlite3"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "900"))
+
+# query planning: keywords are packed into shards that fit each source's query
+# limits, and up to *_SHARD_WORKERS shards per source are searched at once
+X_QUERY_MAX_LEN = int(os.getenv("X_QUERY_MAX_LEN", "512"))
+REDDIT_QUERY_MAX_LEN = int(os.getenv("REDDIT_QUERY_MAX_LEN", "512"))
+GTRENDS_PAYLOAD_TERMS = 5  # pytrends build_payload rejects more
+SHARD_WORKERS = {
+    "x": int(os.getenv("X_SHARD_WORKERS", "4")),
+    "reddit": int(os.getenv("REDDIT_SHARD_WORKERS", "8")),
+    "gtrends": int(os.getenv("GTRENDS_SHARD_WORKERS", "2")),
+}
+
+# tiered storage: dated rows older than ARCHIVE_HOT_DAYS move out of SQLite into
+# day-partitioned Parquet under ARCHIVE_DIR (archive_trends.py, or after every
+# successful ingest with ARCHIVE_AFTER_INGEST)
+ARCHIVE_DIR = os.path.abspath(os.getenv("ARCHIVE_DIR", os.path.join(DATA_DIR, "archive")))
+ARCHIVE_HOT_DAYS = int(os.getenv("ARCHIVE_HOT_DAYS", "30"))
+ARCHIVE_AFTER_INGEST = os.getenv("ARCHIVE_AFTER_INGEST", "false").lower() == "true"
+ARCHIVE_COMPRESSION = os.getenv("ARCHIVE_COMPRESSION", "zstd")
+
+# database access: one writer thread group-commits queued writes (a transaction
+# takes up to DB_GROUP_COMMIT_JOBS jobs or DB_GROUP_COMMIT_MS of work, waiting at
+# most DB_GROUP_COMMIT_WAIT_MS for more; DB_WRITE_QUEUE jobs may wait before
+# writers block), and up to DB_READ_POOL_SIZE idle read-only connections are kept
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "8"))
+DB_GROUP_COMMIT_JOBS = int(os.getenv("DB_GROUP_COMMIT_JOBS", "32"))
+DB_GROUP_COMMIT_MS = float(os.getenv("DB_GROUP_COMMIT_MS", "250"))
+DB_GROUP_COMMIT_WAIT_MS = float(os.getenv("DB_GROUP_COMMIT_WAIT_MS", "0"))
+DB_WRITE_QUEUE = int(os.getenv("DB_WRITE_QUEUE", "64"))
+
+# in-process metrics for /metrics and per-run profiles; off makes every probe a no-op
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+# per-source deadlines (seconds) for concurrent extraction
+SOURCE_TIMEOUTS = {
+    "x": float(os.getenv("X_TIMEOUT", "60")),
+    "reddit": float(os.getenv("REDDIT_TIMEOUT", "60")),
+    "gtrends": float(os.getenv("GTRENDS_TIMEOUT", "30")),
+}
+
+DEFAULT_SUBREDDITS = ["marketing","SEO","socialmedia","advertising","content_marketing","PPC","bigseo"]
+
+
+def load_subreddits():
+    """REDDIT_SUBREDDITS (comma-separated), else ``subreddits`` in keywords.yaml, else the defaults."""
+    env = os.getenv("REDDIT_SUBREDDITS")
+    if env:
+        return [s.strip() for s in env.split(",") if s.strip()]
+    subs = (load_keywords() or {}).get("subreddits")
+    return [str(s) for s in subs] if subs else list(DEFAULT_SUBREDDITS)
+
+
 def load_keywords():
     try:
+        import yaml
         with open(KEYWORDS_PATH, "r", encoding="utf-8") as f:
             return yaml.safe_load(f)
     except Exception:
@@ -0,0 +1,1044 @@
+import os, re, json, sqlite3, hashlib, datetime, threading, base64, time, atexit, contextlib
+from typing import List, Dict, Any, Tuple, Iterator, Callable
+from urllib.parse import quote
+
+from src.config import (DB_PATH, DB_READ_POOL_SIZE, DB_GROUP_COMMIT_JOBS, DB_GROUP_COMMIT_MS,
+                        DB_GROUP_COMMIT_WAIT_MS, DB_WRITE_QUEUE)
+from src.dbpool import ReadPool, Writer
+from src import metrics
+
+# base table; later columns and indexes are added through MIGRATIONS
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trends (
+    id TEXT PRIMARY KEY,
+    platform TEXT,
+    created_at TEXT,
+    title TEXT,
+    text TEXT,
+    author TEXT,
+    url TEXT,
+    lang TEXT,
+    engagement INTEGER,
+    raw_metrics TEXT,
+    marketing_relevant INTEGER,
+    category TEXT,
+    matched_keyword TEXT,
+    sentiment_compound REAL,
+    inserted_at TEXT DEFAULT (datetime('now'))
+);
+"""
+
+# rows per executemany/transaction in the bulk write path
+WRITE_CHUNK_SIZE = 500
+
+COLUMNS = ["id", "platform", "created_at", "title", "text", "author", "url", "lang",
+           "engagement", "raw_metrics", "marketing_relevant", "category",
+           "matched_keyword", "sentiment_compound"]
+
+_UPSERT_SQL = f"""
+INSERT INTO trends ({", ".join(COLUMNS)}, content_hash, cluster_id)
+VALUES ({", ".join("?" * (len(COLUMNS) + 2))})
+ON CONFLICT(id) DO UPDATE SET
+    {", ".join(f"{c}=excluded.{c}" for c in COLUMNS[1:])},
+    content_hash=excluded.content_hash, cluster_id=excluded.cluster_id
+WHERE trends.content_hash IS NOT excluded.content_hash
+"""
+
+_ROLLUP_SQL = """
+INSERT INTO trend_rollups (day, category, platform, count, engagement_sum, sentiment_sum, sentiment_count)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(day, category, platform) DO UPDATE SET
+    count=count+excluded.count,
+    engagement_sum=engagement_sum+excluded.engagement_sum,
+    sentiment_sum=sentiment_sum+excluded.sentiment_sum,
+    sentiment_count=sentiment_count+excluded.sentiment_count
+"""
+
+_BUCKET_SQL = """
+INSERT INTO trend_buckets (dim, hour, key, count, engagement_sum)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT(dim, hour, key) DO UPDATE SET
+    count=count+excluded.count,
+    engagement_sum=engagement_sum+excluded.engagement_sum
+"""
+
+# dimensions kept in trend_buckets -> COLUMNS index of the key
+BUCKET_DIMS = {"keyword": 12, "category": 11}
+
+_schema_ready = set()
+_schema_lock = threading.Lock()
+# per (database path, process): the writer thread and the idle read-only connections
+_writers: Dict[Tuple[str, int], Writer] = {}
+_readers: Dict[Tuple[str, int], ReadPool] = {}
+_access_lock = threading.Lock()
+
+
+def connect(path: str = None, **kwargs) -> sqlite3.Connection:
+    """Open a read-write connection with the pragmas every writer should use.
+
+    Inside the app only the writer thread (``write``) holds one; readers use ``reader``.
+    """
+    con = sqlite3.connect(path or DB_PATH, timeout=30, **kwargs)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    con.execute("PRAGMA temp_store=MEMORY")
+    con.execute("PRAGMA cache_size=-20000")
+    return con
+
+
+def connect_readonly(path: str = None) -> sqlite3.Connection:
+    """Open a read-only connection; it may be handed between threads, used by one at a time."""
+    uri = "file:" + quote(os.path.abspath(path or DB_PATH)) + "?mode=ro"
+    con = sqlite3.connect(uri, uri=True, timeout=30, check_same_thread=False)
+    con.execute("PRAGMA temp_store=MEMORY")
+    con.execute("PRAGMA cache_size=-20000")
+    return con
+
+
+def writer() -> Writer:
+    """This process's writer thread for DB_PATH, started on first use."""
+    key = (DB_PATH, os.getpid())
+    with _access_lock:
+        if key not in _writers:
+            os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+            _writers[key] = Writer(connect, DB_GROUP_COMMIT_JOBS, DB_GROUP_COMMIT_MS / 1000.0,
+                                   DB_GROUP_COMMIT_WAIT_MS / 1000.0, DB_WRITE_QUEUE)
+        return _writers[key]
+
+
+def write(fn: Callable[[sqlite3.Connection], Any], atomic: bool = True) -> Any:
+    """Run ``fn(con)`` on the writer thread; returns its result once it is committed.
+
+    Concurrent writes queue up and are group-committed (``dbpool.Writer``),
+    so callers never see ``database is locked``. ``fn`` must leave
+    transaction control to the writer; with ``atomic=False`` it runs alone,
+    outside a transaction.
+    """
+    ensure_db()
+    return writer().call(fn, atomic)
+
+
+@contextlib.contextmanager
+def reader() -> Iterator[sqlite3.Connection]:
+    """A pooled read-only connection for the ``with`` block."""
+    ensure_db()
+    key = (DB_PATH, os.getpid())
+    with _access_lock:
+        pool = _readers.get(key)
+        if pool is None:
+            pool = _readers[key] = ReadPool(connect_readonly, DB_READ_POOL_SIZE)
+    with pool.connection() as con:
+        yield con
+
+
+@atexit.register
+def close_connections():
+    """Let the writers finish their queued jobs, then close every connection this process holds."""
+    with _access_lock:
+        writers, readers = list(_writers.values()), list(_readers.values())
+        _writers.clear()
+        _readers.clear()
+    for pool in readers:
+        pool.close()
+    for w in writers:
+        w.close()
+
+
+def _add_content_hash(con: sqlite3.Connection):
+    cols = {row[1] for row in con.execute("PRAGMA table_info(trends)")}
+    if "content_hash" not in cols:
+        con.execute("ALTER TABLE trends ADD COLUMN content_hash TEXT")
+
+
+def _add_clusters(con: sqlite3.Connection):
+    cols = {row[1] for row in con.execute("PRAGMA table_info(trends)")}
+    if "cluster_id" not in cols:
+        con.execute("ALTER TABLE trends ADD COLUMN cluster_id TEXT")
+    con.executescript("""
+    CREATE TABLE IF NOT EXISTS trend_clusters (
+        cluster_id TEXT PRIMARY KEY,
+        title TEXT,
+        signature BLOB NOT NULL,
+        size INTEGER NOT NULL DEFAULT 0,
+        engagement_sum INTEGER NOT NULL DEFAULT 0,
+        first_seen TEXT,
+        last_seen TEXT
+    );
+    CREATE TABLE IF NOT EXISTS lsh_bands (
+        band INTEGER NOT NULL,
+        hash INTEGER NOT NULL,
+        cluster_id TEXT NOT NULL,
+        PRIMARY KEY (band, hash)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_trends_cluster ON trends(cluster_id);
+    """)
+    from src import dedupe
+    # cluster what is already stored, oldest rows first, in write-sized batches
+    last = 0
+    while True:
+        batch = con.execute("SELECT rowid, id, title, text, created_at, engagement FROM trends "
+                            "WHERE rowid > ? AND cluster_id IS NULL ORDER BY rowid LIMIT ?",
+                            (last, WRITE_CHUNK_SIZE)).fetchall()
+        if not batch:
+            break
+        last = batch[-1][0]
+        cids = dedupe.assign_clusters(con, [(rid, dedupe.story_text(title, text), created, eng)
+                                            for _, rid, title, text, created, eng in batch])
+        con.executemany("UPDATE trends SET cluster_id = ? WHERE id = ?",
+                        [(cid, b[1]) for cid, b in zip(cids, batch)])
+
+
+# the upsert's SET list names title and text on every update, so "UPDATE OF" alone would
+# re-index rows whose engagement was all that changed
+_FTS_UPDATE_TRIGGER = """
+CREATE TRIGGER IF NOT EXISTS trends_fts_au AFTER UPDATE OF title, text ON trends
+WHEN old.title IS NOT new.title OR old.text IS NOT new.text BEGIN
+    INSERT INTO trends_fts(trends_fts, rowid, title, text) VALUES ('delete', old.rowid, old.title, old.text);
+    INSERT INTO trends_fts(rowid, title, text) VALUES (new.rowid, new.title, new.text);
+END;
+"""
+
+_FTS_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS trends_fts USING fts5(
+    title, text, content='trends', content_rowid='rowid', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS trends_fts_ai AFTER INSERT ON trends BEGIN
+    INSERT INTO trends_fts(rowid, title, text) VALUES (new.rowid, new.title, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS trends_fts_ad AFTER DELETE ON trends BEGIN
+    INSERT INTO trends_fts(trends_fts, rowid, title, text) VALUES ('delete', old.rowid, old.title, old.text);
+END;
+%s
+INSERT INTO trends_fts(trends_fts) VALUES ('rebuild');
+""" % _FTS_UPDATE_TRIGGER
+
+
+def _add_fts(con: sqlite3.Connection):
+    # external-content index over trends.rowid, kept in sync by triggers on every write path.
+    # A full VACUUM may renumber trends' rowids; run rebuild_search_index() after one.
+    try:
+        con.executescript(_FTS_SQL)
+    except sqlite3.OperationalError as e:
+        if "fts5" not in str(e):
+            raise
+
+
+def _fts_update_when(con: sqlite3.Connection):
+    if fts_available(con):
+        con.executescript("DROP TRIGGER IF EXISTS trends_fts_au;" + _FTS_UPDATE_TRIGGER)
+
+
+def fts_available(con: sqlite3.Connection) -> bool:
+    return con.execute("SELECT 1 FROM sqlite_master WHERE name = 'trends_fts'").fetchone() is not None
+
+
+def rebuild_search_index():
+    write(lambda con: con.execute("INSERT INTO trends_fts(trends_fts) VALUES ('rebuild')"))
+
+
+def incremental_vacuum_enabled(con: sqlite3.Connection) -> bool:
+    return con.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+
+def _incremental_vacuum(con: sqlite3.Connection) -> bool:
+    # auto_vacuum only changes with a full VACUUM, which may renumber rowids: rebuild the FTS index after
+    if incremental_vacuum_enabled(con):
+        return False
+    con.commit()
+    con.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    con.execute("VACUUM")
+    if fts_available(con):
+        con.execute("INSERT INTO trends_fts(trends_fts) VALUES ('rebuild')")
+    con.commit()
+    return True
+
+
+def enable_incremental_vacuum() -> bool:
+    """Switch the database to ``auto_vacuum=INCREMENTAL`` so archiving can hand freed pages back.
+
+    Takes one full VACUUM (the whole file is rewritten, writes wait meanwhile),
+    so it is only run on request (``archive_trends.py --enable-incremental-vacuum``).
+    Returns False when the database already was incremental.
+    """
+    return write(_incremental_vacuum, atomic=False)
+
+
+# (version, step) pairs applied in order; PRAGMA user_version records the last one.
+# A step is either an SQL script or a callable taking the connection.
+MIGRATIONS = [
+    (1, SCHEMA),
+    (2, _add_content_hash),
+    (3, """
+    CREATE INDEX IF NOT EXISTS idx_trends_created_at ON trends(created_at);
+    CREATE INDEX IF NOT EXISTS idx_trends_category_engagement ON trends(category, engagement);
+    CREATE INDEX IF NOT EXISTS idx_trends_platform ON trends(platform);
+    CREATE INDEX IF NOT EXISTS idx_trends_engagement ON trends(engagement);
+    """),
+    (4, """
+    CREATE TABLE IF NOT EXISTS ingest_cursors (
+        source TEXT NOT NULL,
+        query_key TEXT NOT NULL,
+        cursor TEXT NOT NULL,
+        updated_at TEXT DEFAULT (datetime('now')),
+        PRIMARY KEY (source, query_key)
+    );
+    """),
+    (5, """
+    CREATE TABLE IF NOT EXISTS trend_rollups (
+        day TEXT NOT NULL,
+        category TEXT NOT NULL,
+        platform TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        engagement_sum INTEGER NOT NULL DEFAULT 0,
+        sentiment_sum REAL NOT NULL DEFAULT 0,
+        sentiment_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, category, platform)
+    );
+    INSERT OR REPLACE INTO trend_rollups
+    SELECT COALESCE(substr(created_at, 1, 10), ''), COALESCE(category, ''), COALESCE(platform, ''),
+           COUNT(*), COALESCE(SUM(engagement), 0), COALESCE(SUM(sentiment_compound), 0), COUNT(sentiment_compound)
+    FROM trends GROUP BY 1, 2, 3;
+    """),
+    (6, """
+    CREATE TABLE IF NOT EXISTS db_state (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+    INSERT OR IGNORE INTO db_state (key, value) VALUES ('change_counter', 0);
+    """),
+    # (..., engagement, id) so keyset pages on ORDER BY engagement DESC, id DESC walk an index
+    (7, """
+    DROP INDEX IF EXISTS idx_trends_engagement;
+    DROP INDEX IF EXISTS idx_trends_category_engagement;
+    DROP INDEX IF EXISTS idx_trends_platform;
+    CREATE INDEX IF NOT EXISTS idx_trends_engagement_id ON trends(engagement, id);
+    CREATE INDEX IF NOT EXISTS idx_trends_category_engagement ON trends(category, engagement, id);
+    CREATE INDEX IF NOT EXISTS idx_trends_platform_engagement ON trends(platform, engagement, id);
+    """),
+    # hourly counts per matched keyword / category, for burst detection; undated rows are left out
+    (8, """
+    CREATE TABLE IF NOT EXISTS trend_buckets (
+        dim TEXT NOT NULL,
+        hour TEXT NOT NULL,
+        key TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        engagement_sum INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (dim, hour, key)
+    );
+    INSERT OR REPLACE INTO trend_buckets
+    SELECT 'keyword', substr(created_at, 1, 13), matched_keyword, COUNT(*), COALESCE(SUM(engagement), 0)
+    FROM trends WHERE created_at IS NOT NULL AND matched_keyword IS NOT NULL GROUP BY 2, 3;
+    INSERT OR REPLACE INTO trend_buckets
+    SELECT 'category', substr(created_at, 1, 13), category, COUNT(*), COALESCE(SUM(engagement), 0)
+    FROM trends WHERE created_at IS NOT NULL AND category IS NOT NULL GROUP BY 2, 3;
+    """),
+    # near-duplicate clusters (MinHash signatures + LSH band index), see src/dedupe.py
+    (9, _add_clusters),
+    # full-text index over title/text; skipped on SQLite builds without FTS5
+    (10, _add_fts),
+    # formerly switched every database to auto_vacuum=INCREMENTAL; the full VACUUM that takes
+    # is now opt-in (enable_incremental_vacuum)
+    (11, ""),
+    # covers query_timeseries: a time range is aggregated from the index alone, never the wide rows
+    (12, """
+    CREATE INDEX IF NOT EXISTS idx_trends_created_series
+    ON trends(created_at, category, platform, matched_keyword, engagement, sentiment_compound);
+    """),
+    # re-index on update only when title or text really changed
+    (13, _fts_update_when),
+]
+
+
+def migrate(con: sqlite3.Connection) -> int:
+    """Apply pending migrations; returns the resulting schema version."""
+    current = con.execute("PRAGMA user_version").fetchone()[0]
+    for version, step in MIGRATIONS:
+        if version <= current:
+            continue
+        if callable(step):
+            step(con)
+        else:
+            con.executescript(step)
+        con.execute(f"PRAGMA user_version = {int(version)}")
+        con.commit()
+        current = version
+    return current
+
+
+def init_db():
+    # migrations commit (and VACUUM) themselves, so they run outside the writer's transactions
+    writer().call(migrate, atomic=False)
+    with _schema_lock:
+        _schema_ready.add(DB_PATH)
+
+
+def ensure_db():
+    """Run ``init_db`` once per process and database path."""
+    if DB_PATH not in _schema_ready:
+        init_db()
+
+
+def bump_change_counter(con: sqlite3.Connection):
+    """Mark the data as changed; call inside the writing transaction."""
+    con.execute("UPDATE db_state SET value = value + 1 WHERE key = 'change_counter'")
+
+
+def change_counter() -> int:
+    """Monotonic counter bumped by every write that changed stored rows.
+
+    Caches key on it to know whether anything was ingested since they were filled.
+    """
+    with reader() as con:
+        row = con.execute("SELECT value FROM db_state WHERE key = 'change_counter'").fetchone()
+    return int(row[0]) if row else 0
+
+
+def _row(r: Dict[str, Any]) -> tuple:
+    return (
+        r["id"], r["platform"], r["created_at"], r["title"], r["text"], r["author"], r["url"],
+        r["lang"], int(r["engagement"]), json.dumps(r.get("raw_metrics") or {}, sort_keys=True),
+        1 if r.get("marketing_relevant") else 0,
+        r.get("category"), r.get("matched_keyword"), float(r.get("sentiment_compound") or 0.0),
+    )
+
+
+def content_hash(row: tuple) -> str:
+    return hashlib.sha1(json.dumps(row, separators=(",", ":")).encode("utf-8", "surrogatepass")).hexdigest()
+
+
+def _rollup_key(created_at, category, platform) -> tuple:
+    return ((created_at or "")[:10], category or "", platform or "")
+
+
+def _add_delta(deltas: Dict[tuple, list], key: tuple, engagement, sentiment, sign: int):
+    d = deltas.setdefault(key, [0, 0, 0.0, 0])
+    d[0] += sign
+    d[1] += sign * int(engagement or 0)
+    if sentiment is not None:
+        d[2] += sign * float(sentiment)
+        d[3] += sign
+
+
+def _add_bucket_deltas(buckets: Dict[tuple, list], created_at, keys: Dict[str, Any], engagement, sign: int):
+    if not created_at:
+        return
+    hour = created_at[:13]
+    for dim, key in keys.items():
+        if key:
+            b = buckets.setdefault((dim, hour, key), [0, 0])
+            b[0] += sign
+            b[1] += sign * int(engagement or 0)
+
+
+def _archived(chunk: List[tuple], stored: Dict[str, tuple]) -> Dict[str, tuple]:
+    """Stored-row tuples (as read in ``_upsert_chunk``) for chunk ids found only in the Parquet archive.
+
+    Only the partitions of the days those rows are dated on are read, so
+    new posts, newer than any archived day, cost a directory check.
+    """
+    by_day = {}
+    for row in chunk:
+        if row[0] not in stored and row[2]:
+            by_day.setdefault(row[2][:10], []).append(row[0])
+    if not by_day:
+        return {}
+    from src import archive
+    return {rid: (content_hash(tuple(r[c] for c in COLUMNS)), r["created_at"], r["category"], r["platform"],
+                  r["engagement"], r["sentiment_compound"], r["matched_keyword"], r["cluster_id"])
+            for rid, r in archive.lookup(by_day).items()}
+
+
+def _upsert_chunk(con: sqlite3.Connection, chunk: List[tuple]) -> Dict[str, int]:
+    """Write one chunk of hashed rows on the writer connection; returns its outcome counts."""
+    from src import dedupe
+    counts = {"inserted": 0, "updated": 0, "skipped": 0}
+    t0 = time.perf_counter()
+    marks = ",".join("?" * len(chunk))
+    # the stored rows are read inside the writer's transaction, so no other write can slip in between
+    stored = {row[0]: row[1:] for row in con.execute(
+        f"SELECT id, content_hash, created_at, category, platform, engagement, sentiment_compound, "
+        f"matched_keyword, cluster_id FROM trends WHERE id IN ({marks})", [row[0] for row in chunk])}
+    # archived rows still count in the rollups and buckets: an unchanged one is skipped, a changed one
+    # moves its counts like any update and comes back into trends
+    stored.update(_archived(chunk, stored))
+    changed, deltas, buckets, unclustered, cluster_deltas = [], {}, {}, [], {}
+    for row in chunk:
+        old = stored.get(row[0])
+        if old is None:
+            counts["inserted"] += 1
+        elif old[0] != row[-1]:
+            counts["updated"] += 1
+            _add_delta(deltas, _rollup_key(old[1], old[2], old[3]), old[4], old[5], -1)
+            _add_bucket_deltas(buckets, old[1], {"keyword": old[6], "category": old[2]}, old[4], -1)
+        else:
+            counts["skipped"] += 1
+            continue
+        # row layout follows COLUMNS: created_at=2, platform=1, engagement=8, category=11, sentiment=13
+        _add_delta(deltas, _rollup_key(row[2], row[11], row[1]), row[8], row[13], 1)
+        _add_bucket_deltas(buckets, row[2], {dim: row[i] for dim, i in BUCKET_DIMS.items()}, row[8], 1)
+        if old is not None and old[7]:
+            cluster_deltas[old[7]] = cluster_deltas.get(old[7], 0) + row[8] - int(old[4] or 0)
+            changed.append(row + (old[7],))
+        else:
+            unclustered.append(len(changed))
+            changed.append(row)
+    if changed:
+        cids = dedupe.assign_clusters(con, [
+            (changed[j][0], dedupe.story_text(changed[j][3], changed[j][4]), changed[j][2], changed[j][8])
+            for j in unclustered])
+        for j, cid in zip(unclustered, cids):
+            changed[j] += (cid,)
+        dedupe.adjust_engagement(con, cluster_deltas)
+        con.executemany(_UPSERT_SQL, changed)
+        con.executemany(_ROLLUP_SQL, [k + tuple(v) for k, v in deltas.items() if any(v)])
+        con.execute("DELETE FROM trend_rollups WHERE count <= 0")
+        con.executemany(_BUCKET_SQL, [k + tuple(v) for k, v in buckets.items() if any(v)])
+        # only buckets that lost rows can have emptied; delete those by key
+        con.executemany("DELETE FROM trend_buckets WHERE dim = ? AND hour = ? AND key = ? AND count <= 0",
+                        [k for k, v in buckets.items() if v[0] < 0])
+        bump_change_counter(con)
+    metrics.observe("db_write_seconds", time.perf_counter() - t0)
+    for outcome, n in counts.items():
+        if n:
+            metrics.inc("db_rows", n, outcome=outcome)
+    return counts
+
+
+def bulk_upsert(records: List[Dict[str, Any]], chunk_size: int = WRITE_CHUNK_SIZE) -> Dict[str, int]:
+    """Insert or update normalized records (dicts, or a ``batch.RecordBatch``), ``chunk_size`` rows per write job.
+
+    Rows whose content hash matches the stored one, or their copy in the
+    Parquet archive, are not rewritten.
+    ``trend_rollups`` is adjusted in the same transaction: an updated row
+    is taken out of its old (day, category, platform) bucket and added to
+    its new one; ``trend_buckets`` (hourly, per keyword and category) is
+    kept the same way. New rows are assigned a near-duplicate cluster
+    (``dedupe.assign_clusters``); updated rows keep theirs. The chunks are
+    queued to the writer thread together, so they share group commits with
+    each other and with concurrent ingests; if one fails the others still
+    land and its error is raised. Returns ``{"inserted", "updated", "skipped"}`` counts.
+    """
+    counts = {"inserted": 0, "updated": 0, "skipped": 0}
+    if not records:
+        return counts
+    ensure_db()
+    # later duplicates of the same id win, as they would with row-by-row upserts
+    rows = {}
+    for row in (records.rows() if hasattr(records, "rows") else map(_row, records)):
+        rows[row[0]] = row + (content_hash(row),)
+    counts["skipped"] += len(records) - len(rows)
+    rows = list(rows.values())
+
+    w = writer()
+    futures = [w.submit(lambda con, chunk=rows[i:i+chunk_size]: _upsert_chunk(con, chunk))
+               for i in range(0, len(rows), chunk_size)]
+    error = None
+    for future in futures:
+        try:
+            chunk_counts = future.result()
+        except BaseException as e:
+            error = error or e
+            continue
+        for outcome, n in chunk_counts.items():
+            counts[outcome] += n
+    if error is not None:
+        raise error
+    return counts
+
+
+def upsert_records(records: List[Dict[str, Any]]) -> int:
+    counts = bulk_upsert(records)
+    return sum(counts.values())
+
+
+def query_key(keywords: List[str]) -> str:
+    """Stable key for a keyword set, so cursors follow the query they belong to."""
+    norm = sorted({k.strip().lower() for k in keywords if k})
+    return hashlib.sha1(json.dumps(norm).encode("utf-8")).hexdigest()[:16]
+
+
+def load_cursors(key: str) -> Dict[str, Dict[str, Any]]:
+    """Per-source high-water marks stored for ``key``."""
+    with reader() as con:
+        rows = con.execute("SELECT source, cursor FROM ingest_cursors WHERE query_key = ?", (key,)).fetchall()
+    return {source: json.loads(cursor) for source, cursor in rows}
+
+
+def save_cursor(source: str, key: str, cursor: Dict[str, Any]):
+    write(lambda con: con.execute("""
+    INSERT INTO ingest_cursors (source, query_key, cursor) VALUES (?, ?, ?)
+    ON CONFLICT(source, query_key) DO UPDATE SET cursor=excluded.cursor, updated_at=datetime('now')
+    """, (source, key, json.dumps(cursor, sort_keys=True))))
+
+
+# columns API consumers may select; text/raw_metrics are only loaded on request
+QUERY_COLUMNS = COLUMNS + ["inserted_at"]
+TREND_COLUMNS = ['platform','title','category','engagement','sentiment_compound','created_at','url']
+_ORDERINGS = {
+    "engagement": "engagement DESC, id DESC",
+    "created_at": "created_at DESC, id DESC",
+    "sentiment": "sentiment_compound DESC, id DESC",
+}
+
+
+def _where(since=None, until=None, category=None, platform=None, min_engagement=None,
+           include_undated: bool = True):
+    clauses, params = [], []
+    if since is not None:
+        clauses.append("(created_at IS NULL OR created_at >= ?)" if include_undated else "created_at >= ?")
+        params.append(since)
+    if until is not None:
+        clauses.append("created_at < ?")
+        params.append(until)
+    if category is not None:
+        clauses.append("category = ?")
+        params.append(category)
+    if platform is not None:
+        clauses.append("platform = ?")
+        params.append(platform)
+    if min_engagement is not None:
+        clauses.append("engagement >= ?")
+        params.append(int(min_engagement))
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def _source(con: sqlite3.Connection, columns: List[str], since: str = None, until: str = None,
+            category: str = None, platform: str = None, min_engagement: int = None) -> str:
+    """Relation to read trend rows from: ``trends``, or when ``[since, until)`` reaches days moved
+    to the Parquet archive, a temp view over both tiers (``archive.attach``).
+
+    Copying every archived row in range into SQLite is the fallback for
+    reads that need all of them anyway (``query_trends`` without a limit);
+    aggregates and top-k reads merge Arrow-side results instead.
+    """
+    from src import archive
+    if not archive.covers(since, until):
+        return "trends"
+    return archive.attach(con, columns, since, until, category, platform, min_engagement)
+
+
+def encode_page_cursor(row: Dict[str, Any]) -> str:
+    """Opaque keyset cursor pointing just past ``row`` in engagement order."""
+    raw = json.dumps([int(row["engagement"] or 0), row["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_page_cursor(token: str) -> Tuple[int, str]:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        engagement, rid = json.loads(raw)
+        return int(engagement), str(rid)
+    except Exception:
+        raise ValueError("invalid cursor")
+
+
+def query_trends(columns: List[str] = None, since: str = None, until: str = None,
+                 category: str = None, platform: str = None, min_engagement: int = None,
+                 order_by: str = "engagement", limit: int = None,
+                 include_undated: bool = True, after: Tuple[int, str] = None) -> List[Dict[str, Any]]:
+    """Select trend rows with projection, filters, ordering and LIMIT done in SQLite.
+
+    ``since``/``until`` are ISO timestamps; undated rows (Google Trends) match
+    any ``since`` unless ``include_undated`` is False. ``after`` is an
+    ``(engagement, id)`` keyset position (see ``decode_page_cursor``): only rows
+    after it in engagement order are returned, so deep pages cost the same as
+    the first one. With a ``limit``, archived days in the window are not
+    attached: the best ``limit`` archived rows come from the Parquet scan
+    (``archive.top``) and are merged with the hot page.
+    """
+    columns = columns or TREND_COLUMNS
+    bad = [c for c in columns if c not in QUERY_COLUMNS]
+    if bad:
+        raise ValueError(f"unknown columns: {', '.join(bad)}")
+    if order_by not in _ORDERINGS:
+        raise ValueError(f"unknown ordering: {order_by}")
+    where, params = _where(since, until, category, platform, min_engagement, include_undated)
+    if after is not None:
+        if order_by != "engagement":
+            raise ValueError("keyset pagination is only supported in engagement order")
+        where += (" AND " if where else " WHERE ") + "(engagement, id) < (?, ?)"
+        params.extend(after)
+    from src import archive
+    merge = limit is not None and archive.covers(since, until)
+    key = _ORDERINGS[order_by].split()[0]
+    # merging needs each row's ordering key and id; they are dropped again afterwards
+    select = list(dict.fromkeys(columns + [key, "id"])) if merge else columns
+    with reader() as con:
+        source = "trends" if merge else _source(con, columns, since, until, category, platform, min_engagement)
+        sql = f"SELECT {', '.join(select)} FROM {source}{where} ORDER BY {_ORDERINGS[order_by]}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        rows = [dict(zip(select, row)) for row in con.execute(sql, params)]
+    if not merge:
+        return rows
+    old = archive.top(select, key, int(limit), since, until, category, platform, min_engagement, after)
+    rows += [dict(zip(select, row)) for row in zip(*(old[c].to_pylist() for c in select))]
+    # DESC order as in SQLite: NULLs last, ties by id
+    rows.sort(key=lambda r: (r[key] is not None, r[key], r["id"]), reverse=True)
+    return [{c: r[c] for c in columns} for r in rows[:int(limit)]]
+
+
+def _fts_query(q: str) -> str:
+    """Plain search text as an FTS5 query: every word must appear, as a prefix for the last one."""
+    terms = ['"%s"' % t.replace('"', '""') for t in q.split() if t.strip('"')]
+    if terms and not q.endswith(" "):
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+def _snippet(text: str, words: List[str], prefix: bool, size: int = 16) -> str:
+    """Up to ``size`` words of ``text`` around the first match, matches in ``<b>``; like FTS5's ``snippet()``."""
+    terms = [re.sub(r"\W+", "", w.lower()) for w in words]
+
+    def hit(token: str) -> bool:
+        token = re.sub(r"\W+", "", token.lower())
+        return any(t and (token == t or (prefix and i == len(terms) - 1 and token.startswith(t)))
+                   for i, t in enumerate(terms))
+
+    tokens = (text or "").split()
+    first = next((i for i, t in enumerate(tokens) if hit(t)), 0)
+    start = max(0, min(first - size // 4, len(tokens) - size))
+    shown = [f"<b>{t}</b>" if hit(t) else t for t in tokens[start:start + size]]
+    return ("…" if start else "") + " ".join(shown) + ("…" if start + size < len(tokens) else "")
+
+
+def search_trends(q: str, limit: int = 20, columns: List[str] = None, since: str = None, until: str = None,
+                  category: str = None, platform: str = None, min_engagement: int = None,
+                  raw: bool = False) -> List[Dict[str, Any]]:
+    """Rows whose title or text match ``q``, best BM25 match first.
+
+    ``q`` is plain text (all words must occur, the last one as a prefix)
+    unless ``raw``, in which case it is passed to FTS5 as query syntax.
+    Each row gains ``score`` (higher is better; titles weigh double) and a
+    ``snippet`` with matches wrapped in ``<b>``. Filters are those of
+    ``query_trends``; undated rows always match ``since``. When the hot
+    matches don't fill ``limit`` and the window reaches archived days,
+    plain-text matches from the Parquet archive follow, most engaging
+    first, with ``score`` None. FTS5 syntax has no archive equivalent, so
+    raw queries search hot rows only (``search_scope``).
+    """
+    columns = columns or TREND_COLUMNS + ["id"]
+    bad = [c for c in columns if c not in QUERY_COLUMNS]
+    if bad:
+        raise ValueError(f"unknown columns: {', '.join(bad)}")
+    match = q if raw else _fts_query(q)
+    if not match.strip():
+        raise ValueError("empty search query")
+    where, params = _where(since, until, category, platform, min_engagement)
+    where = where.replace(" WHERE ", " AND ", 1)
+    with reader() as con:
+        if not fts_available(con):
+            raise RuntimeError("full-text search needs SQLite with FTS5")
+        try:
+            cur = con.execute(f"""
+            SELECT {', '.join('t.' + c for c in columns)}, -bm25(trends_fts, 2.0, 1.0),
+                   snippet(trends_fts, -1, '<b>', '</b>', '…', 16)
+            FROM trends_fts JOIN trends t ON t.rowid = trends_fts.rowid
+            WHERE trends_fts MATCH ?{where}
+            ORDER BY bm25(trends_fts, 2.0, 1.0) LIMIT ?
+            """, [match] + params + [int(limit)])
+            rows = [dict(zip(columns + ["score", "snippet"], row)) for row in cur]
+        except sqlite3.OperationalError as e:
+            raise ValueError(f"invalid search query: {e}")
+    from src import archive
+    if raw or len(rows) >= int(limit) or not archive.covers(since, until):
+        return rows
+    words = [w for w in q.split() if w.strip('"')]
+    prefix = not q.endswith(" ")
+    select = list(dict.fromkeys(columns + ["title", "text"]))
+    old = archive.top(select, "engagement", int(limit) - len(rows), since, until, category, platform,
+                      min_engagement, where=archive.text_match(words, prefix))
+    for row in old.to_pylist():
+        snippet = _snippet(row["text"], words, prefix)
+        if "<b>" not in snippet:
+            snippet = _snippet(row["title"], words, prefix)
+        rows.append({**{c: row[c] for c in columns}, "score": None, "snippet": snippet})
+    return rows
+
+
+def search_scope(since: str = None, until: str = None, raw: bool = False) -> str:
+    """What ``search_trends`` covers for the window: ``"all"`` rows, or only ``"hot"`` ones
+    (raw FTS5 syntax, when ``[since, until)`` reaches archived days)."""
+    from src import archive
+    return "hot" if raw and archive.covers(since, until) else "all"
+
+
+def iter_trends(columns: List[str] = None, since: str = None, until: str = None,
+                category: str = None, platform: str = None, min_engagement: int = None,
+                include_undated: bool = True, batch_size: int = 1000) -> Iterator[List[tuple]]:
+    """Yield matching rows as tuples, ``batch_size`` at a time, straight off a cursor.
+
+    Rows come in storage order; nothing beyond one batch is held in memory.
+    The connection may be advanced from different threads (e.g. a streaming
+    response), one at a time. Archived rows in the window follow the hot
+    ones, streamed from the Parquet archive.
+    """
+    columns = columns or QUERY_COLUMNS
+    bad = [c for c in columns if c not in QUERY_COLUMNS]
+    if bad:
+        raise ValueError(f"unknown columns: {', '.join(bad)}")
+    where, params = _where(since, until, category, platform, min_engagement, include_undated)
+    with reader() as con:
+        cur = con.execute(f"SELECT {', '.join(columns)} FROM trends{where}", params)
+        try:
+            while True:
+                batch = cur.fetchmany(batch_size)
+                if not batch:
+                    break
+                yield batch
+        finally:
+            # an abandoned statement would keep its read snapshot open on the pooled connection
+            cur.close()
+    from src import archive
+    yield from archive.iter_batches(columns, batch_size, since=since, until=until, category=category,
+                                    platform=platform, min_engagement=min_engagement)
+
+
+def days_ago(days: int) -> str:
+    return (datetime.datetime.utcnow() - datetime.timedelta(days=days)).isoformat()
+
+
+def window_start(days: int) -> str:
+    """Start of a "last ``days``" summary window: the UTC date ``days`` ago (``YYYY-MM-DD``).
+
+    ``trend_rollups`` only know whole days, so readers shown next to them
+    use this boundary too; as a string it sorts before every timestamp of
+    that day.
+    """
+    return days_ago(days)[:10]
+
+
+_ROLLUP_GROUPS = {"category", "platform", "day"}
+
+
+def rollup_summary(days: int = 7, by: str = "category") -> List[Dict[str, Any]]:
+    """Counts, engagement and average sentiment per ``by`` over the last ``days``.
+
+    Reads ``trend_rollups`` only, so the cost depends on the number of
+    (day, category, platform) buckets, not on raw rows. Undated rows
+    (Google Trends) count towards every window, as in ``query_last_days``.
+    """
+    if by not in _ROLLUP_GROUPS:
+        raise ValueError(f"unknown grouping: {by}")
+    with reader() as con:
+        cur = con.execute(f"""
+        SELECT {by}, SUM(count), SUM(engagement_sum),
+               CASE WHEN SUM(sentiment_count) > 0 THEN SUM(sentiment_sum) / SUM(sentiment_count) END
+        FROM trend_rollups
+        WHERE day = '' OR day >= ?
+        GROUP BY {by} ORDER BY SUM(count) DESC
+        """, (window_start(days),))
+        return [{by: key or None, "count": n, "engagement": eng, "avg_sentiment": avg}
+                for key, n, eng, avg in cur]
+
+
+# bucket -> strftime/date expression over created_at; labels sort in time order
+TIMESERIES_BUCKETS = {
+    "hour": "strftime('%Y-%m-%dT%H:00:00', created_at)",
+    "day": "date(created_at)",
+    "week": "date(created_at, 'weekday 0', '-6 days')",  # the Monday starting the week
+}
+TIMESERIES_GROUPS = {"category": "category", "platform": "platform", "keyword": "matched_keyword"}
+
+
+def query_timeseries(bucket: str = "day", by: str = "category", since: str = None, until: str = None,
+                     category: str = None, platform: str = None) -> List[Dict[str, Any]]:
+    """Counts, engagement sums and average sentiment per time ``bucket`` and ``by`` key, in ``[since, until)``.
+
+    Hot rows are bucketed and aggregated in SQLite over the ``created_at``-first
+    covering index; archived days in the window are grouped by Arrow
+    (``archive.timeseries``). Only one row per group from each tier reaches
+    Python, where they are added up. Undated rows (Google Trends) have no
+    bucket and are left out. Rows come ordered by bucket, then by count
+    (highest first).
+    """
+    if bucket not in TIMESERIES_BUCKETS:
+        raise ValueError(f"unknown bucket: {bucket}")
+    if by not in TIMESERIES_GROUPS:
+        raise ValueError(f"unknown grouping: {by}")
+    col = TIMESERIES_GROUPS[by]
+    where, params = _where(since, until, category, platform, include_undated=False)
+    where += (" AND " if where else " WHERE ") + "created_at IS NOT NULL"
+    with reader() as con:
+        groups = con.execute(f"""
+        SELECT {TIMESERIES_BUCKETS[bucket]} AS bucket, {col}, COUNT(*), COALESCE(SUM(engagement), 0),
+               SUM(sentiment_compound), COUNT(sentiment_compound)
+        FROM trends{where}
+        GROUP BY 1, 2 HAVING bucket IS NOT NULL
+        """, params).fetchall()
+    from src import archive
+    if archive.covers(since, until):
+        groups += archive.timeseries(bucket, col, since, until, category, platform)
+    totals: Dict[tuple, list] = {}
+    for b, key, n, eng, s_sum, s_count in groups:
+        t = totals.setdefault((b, key), [0, 0, 0.0, 0])
+        t[0] += n
+        t[1] += eng or 0
+        t[2] += s_sum or 0.0
+        t[3] += s_count
+    # ORDER BY bucket, count DESC, key (NULL first)
+    order = sorted(totals.items(), key=lambda kv: (kv[0][0], -kv[1][0], kv[0][1] is not None, kv[0][1] or ""))
+    return [{"bucket": b, by: key, "count": n, "engagement": eng, "avg_sentiment": s_sum / s_count if s_count else None}
+            for (b, key), (n, eng, s_sum, s_count) in order]
+
+
+def load_buckets(dim: str, since_hour: str) -> List[Tuple[str, str, int, int]]:
+    """``(hour, key, count, engagement_sum)`` rows of ``trend_buckets`` from ``since_hour`` on."""
+    if dim not in BUCKET_DIMS:
+        raise ValueError(f"unknown dimension: {dim}")
+    with reader() as con:
+        return con.execute("SELECT hour, key, count, engagement_sum FROM trend_buckets "
+                           "WHERE dim = ? AND hour >= ?", (dim, since_hour)).fetchall()
+
+
+def count_unique_topics(days: int = 7) -> int:
+    """Distinct stories (near-duplicate clusters) among rows of the last ``days``, whole days as in
+    ``rollup_summary`` (``window_start``)."""
+    from src import archive
+    since = window_start(days)
+    where = " FROM trends WHERE created_at IS NULL OR created_at >= ?"
+    with reader() as con:
+        if not archive.covers(since):
+            return con.execute(f"SELECT COUNT(DISTINCT COALESCE(cluster_id, id)){where}", (since,)).fetchone()[0]
+        hot = [k for (k,) in con.execute(f"SELECT DISTINCT COALESCE(cluster_id, id){where}", (since,))]
+    # archived clusters are made distinct by Arrow; only those not among the hot ones add to the count
+    return len(hot) + archive.new_topics(since, hot)
+
+
+def _in_clusters(n: int) -> str:
+    """Condition matching rows of ``n`` cluster keys; bind the keys twice."""
+    marks = ",".join("?" * n)
+    return f"(cluster_id IN ({marks}) OR (cluster_id IS NULL AND id IN ({marks})))"
+
+
+def _cluster_totals(con: sqlite3.Connection, since: str = None, limit: int = None,
+                    keys: List[str] = None) -> Dict[str, Tuple[int, int]]:
+    """``key -> (posts, engagement)`` of hot clusters since ``since``: the ``limit`` largest, or those in ``keys``."""
+    where, params = _where(since=since)
+    select = "SELECT COALESCE(cluster_id, id) AS k, COUNT(*), COALESCE(SUM(engagement), 0) FROM trends"
+    if keys is None:
+        cur = con.execute(f"{select}{where} GROUP BY k ORDER BY 3 DESC LIMIT ?", params + [int(limit)])
+        return {k: (n, eng) for k, n, eng in cur}
+    totals = {}
+    where += " AND " if where else " WHERE "
+    for i in range(0, len(keys), 500):
+        chunk = keys[i:i + 500]
+        cur = con.execute(f"{select}{where}{_in_clusters(len(chunk))} GROUP BY k", params + chunk + chunk)
+        totals.update((k, (n, eng)) for k, n, eng in cur)
+    return totals
+
+
+def _top_clusters(con: sqlite3.Connection, since: str, limit: int) -> Dict[str, Tuple[int, int]]:
+    """The ``limit`` clusters with the most engagement over both tiers, as ``key -> (posts, engagement)``.
+
+    Each tier's ``k`` largest clusters are the candidates, and their sums
+    are completed from the other tier. A cluster in neither list has at
+    most the two ``k``-th sums added up, so once the ``limit``-th candidate
+    reaches that the ranking is settled; otherwise ``k`` grows. Archived
+    sums come from one Arrow ``group_by`` (``archive.clusters``).
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    from src import archive
+
+    if limit <= 0:
+        return {}
+    old = archive.clusters(since)
+    k = limit
+    while True:
+        hot_top = _cluster_totals(con, since, limit=k)
+        old_top = old.take(pc.select_k_unstable(old, k=min(k, old.num_rows), sort_keys=[("engagement", "descending")]))
+        candidates = list(dict.fromkeys(list(hot_top) + old_top["key"].to_pylist()))
+        hot = dict(hot_top, **_cluster_totals(con, since, keys=[c for c in candidates if c not in hot_top]))
+        picked = old.filter(pc.is_in(old["key"], value_set=pa.array(candidates, pa.string())))
+        archived = {c: (n, eng) for c, n, eng in zip(*(picked[f].to_pylist() for f in ("key", "posts", "engagement")))}
+        totals = {c: tuple(map(sum, zip(hot.get(c, (0, 0)), archived.get(c, (0, 0))))) for c in candidates}
+        ranked = sorted(totals.items(), key=lambda kv: kv[1][1], reverse=True)[:limit]
+        exhausted = len(hot_top) < k and old_top.num_rows < k
+        bound = ((min(eng for _, eng in hot_top.values()) if len(hot_top) == k else 0)
+                 + (pc.min(old_top["engagement"]).as_py() if old_top.num_rows == k else 0))
+        # an unseen cluster can at best tie with the last one picked
+        if exhausted or (len(ranked) == limit and ranked[-1][1][1] >= bound):
+            return dict(ranked)
+        k *= 4
+
+
+def top_stories(since: str = None, limit: int = 20, columns: List[str] = None) -> List[Dict[str, Any]]:
+    """One row per near-duplicate cluster, ranked by the cluster's engagement since ``since``.
+
+    Each row is the cluster's most engaging post with ``posts`` (cluster
+    members in the window) and ``cluster_engagement`` (their summed
+    engagement) added, so reworded copies of a story fill one slot. When
+    the window reaches archived days, clusters are ranked over both tiers
+    (``_top_clusters``) and only the winners' rows are read.
+    """
+    columns = columns or TREND_COLUMNS
+    bad = [c for c in columns if c not in QUERY_COLUMNS]
+    if bad:
+        raise ValueError(f"unknown columns: {', '.join(bad)}")
+    from src import archive
+    where, params = _where(since=since)
+    with reader() as con:
+        if not archive.covers(since):
+            cur = con.execute(f"""
+            SELECT {', '.join(columns)}, posts, cluster_engagement FROM (
+                SELECT *, ROW_NUMBER() OVER w AS rn, COUNT(*) OVER c AS posts,
+                       SUM(engagement) OVER c AS cluster_engagement
+                FROM trends{where}
+                WINDOW c AS (PARTITION BY COALESCE(cluster_id, id)),
+                       w AS (PARTITION BY COALESCE(cluster_id, id) ORDER BY engagement DESC, id DESC)
+            ) WHERE rn = 1 ORDER BY cluster_engagement DESC, engagement DESC LIMIT ?
+            """, params + [int(limit)])
+            return [dict(zip(columns + ["posts", "cluster_engagement"], row)) for row in cur]
+        ranked = _top_clusters(con, since, int(limit))
+        keys = list(ranked)
+        select = list(dict.fromkeys(columns + ["id", "engagement"]))
+        cur = con.execute(f"""
+        SELECT {', '.join(select)}, k FROM (
+            SELECT *, COALESCE(cluster_id, id) AS k,
+                   ROW_NUMBER() OVER (PARTITION BY COALESCE(cluster_id, id) ORDER BY engagement DESC, id DESC) AS rn
+            FROM trends{where}{" AND " if where else " WHERE "}{_in_clusters(len(keys))}
+        ) WHERE rn = 1
+        """, params + keys + keys)
+        hot_leads = {row[-1]: dict(zip(select, row)) for row in cur}
+    old_leads = archive.cluster_leads(select, keys, since)
+    rows = []
+    for key, (posts, engagement) in ranked.items():
+        lead = max((r for r in (hot_leads.get(key), old_leads.get(key)) if r),
+                   key=lambda r: (r["engagement"] or 0, r["id"]))
+        rows.append((engagement, lead["engagement"] or 0,
+                     {**{c: lead[c] for c in columns}, "posts": posts, "cluster_engagement": engagement}))
+    rows.sort(key=lambda r: r[:2], reverse=True)
+    return [row for *_, row in rows]
+
+
+def query_last_days(days: int=7, columns: List[str] = None, limit: int = None) -> "pd.DataFrame":
+    """Rows from the last ``days`` by engagement; all columns unless ``columns`` is given.
+
+    Archived days in the window come from the Parquet scan as Arrow columns
+    (only the best ``limit`` with a limit, via ``archive.top``) and are
+    concatenated with the hot rows as frames, not row by row.
+    """
+    if columns and any(c not in QUERY_COLUMNS for c in columns):
+        raise ValueError("unknown columns requested")
+    params = [days_ago(days)]
+    import pandas as pd
+    from src import archive
+    merge = archive.covers(params[0])
+    # archived rows only have the selectable columns; merging orders by engagement
+    select = columns or QUERY_COLUMNS if merge else columns
+    fetch = list(dict.fromkeys(select + ["engagement"])) if merge else select
+    sql = (f"SELECT {', '.join(fetch) if fetch else '*'} FROM trends "
+           "WHERE created_at IS NULL OR created_at >= ? ORDER BY engagement DESC")
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(int(limit))
+    with reader() as con:
+        df = pd.read_sql_query(sql, con, params=params)
+    if not merge:
+        return df
+    if limit is not None:
+        old = archive.top(fetch, "engagement", int(limit), since=params[0]).select(fetch)
+    else:
+        old = archive.current(fetch, since=params[0])
+    df = pd.concat([df, old.to_pandas()], ignore_index=True)
+    df = df.sort_values("engagement", ascending=False, kind="stable", ignore_index=True)[select]
+    return df.head(int(limit)) if limit is not None else df
@@ -0,0 +1,199 @@
+import time, queue, sqlite3, threading, contextlib, contextvars
+from concurrent.futures import Future
+from typing import Any, Callable, Iterator, List, Optional
+
+from src import metrics
+
+
+class ReadPool:
+    """Read-only connections, each used by one caller at a time and kept open for the next one.
+
+    Readers never wait on each other or on the writer (WAL), so the pool
+    doesn't cap concurrency: a caller finding no idle connection opens one,
+    and at most ``size`` idle ones are kept.
+    """
+
+    def __init__(self, opener: Callable[[], sqlite3.Connection], size: int):
+        self.opener, self.size = opener, max(0, size)
+        self._idle: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            con = self._idle.pop() if self._idle else None
+        if con is None:
+            con = self.opener()
+        changes = con.total_changes
+        try:
+            yield con
+        finally:
+            try:
+                self._release(con, changes)
+            except sqlite3.Error:
+                con.close()
+
+    def _release(self, con: sqlite3.Connection, changes: int):
+        if con.in_transaction:
+            con.rollback()
+        # a read-only connection only changes its temp schema (archive.attach); don't hand rows on
+        if con.total_changes != changes:
+            for name, kind in con.execute("SELECT name, type FROM temp.sqlite_master "
+                                          "WHERE type IN ('view', 'table') ORDER BY type = 'table'").fetchall():
+                con.execute(f'DROP {kind.upper()} IF EXISTS temp."{name}"')
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(con)
+                return
+        con.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for con in idle:
+            con.close()
+
+
+# queued by ``Writer.close`` behind the pending jobs
+_STOP = object()
+
+
+class _Job:
+    __slots__ = ("fn", "atomic", "ctx", "future")
+
+    def __init__(self, fn: Callable[[sqlite3.Connection], Any], atomic: bool):
+        # run in the submitter's context, so its metrics profile sees what the job records
+        self.fn, self.atomic, self.ctx, self.future = fn, atomic, contextvars.copy_context(), Future()
+
+
+class Writer:
+    """The one thread that writes to the database.
+
+    Callers queue jobs (callables taking the writer's connection) and wait
+    on a ``Future``. Atomic jobs are group-committed: the writer opens one
+    ``BEGIN IMMEDIATE`` transaction, runs the first queued job and keeps
+    taking jobs that are already waiting (or arrive within ``max_wait``
+    seconds), each under its own savepoint, until ``max_group`` jobs or
+    ``max_time`` seconds have run; then it commits once and resolves their
+    futures. A job that raises is
+    rolled back to its savepoint and only its future fails. Jobs must not
+    begin, commit or roll back themselves; non-atomic jobs (``atomic=False``)
+    run alone, outside any transaction, for statements like VACUUM. A job
+    that writes from inside another job runs inline, in the same transaction.
+    """
+
+    def __init__(self, opener: Callable[[], sqlite3.Connection], max_group: int = 32, max_time: float = 0.25,
+                 max_wait: float = 0.0, max_queue: int = 0, name: str = "db-writer"):
+        self.opener, self.max_group, self.max_time = opener, max(1, max_group), max_time
+        self.max_wait = max(0.0, max_wait)
+        self._queue: "queue.Queue" = queue.Queue(max(0, max_queue))
+        self._con: Optional[sqlite3.Connection] = None
+        self._ready = Future()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+        self._ready.result()  # surfaces errors opening the connection
+
+    def submit(self, fn: Callable[[sqlite3.Connection], Any], atomic: bool = True) -> Future:
+        job = _Job(fn, atomic)
+        if threading.current_thread() is self._thread:
+            self._execute(job)
+        elif not self._thread.is_alive():
+            raise RuntimeError("database writer is closed")
+        else:
+            self._queue.put(job)
+        return job.future
+
+    def call(self, fn: Callable[[sqlite3.Connection], Any], atomic: bool = True) -> Any:
+        """Run ``fn(con)`` on the writer thread; returns its result once committed."""
+        return self.submit(fn, atomic).result()
+
+    def close(self, timeout: float = None):
+        """Finish the queued jobs, then stop the thread and close its connection."""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def _execute(self, job: _Job) -> bool:
+        try:
+            job.future.set_result(job.ctx.run(job.fn, self._con))
+            return True
+        except BaseException as e:
+            job.future.set_exception(e)
+            return False
+
+    def _run(self):
+        try:
+            self._con = self.opener()
+        except BaseException as e:
+            self._ready.set_exception(e)
+            return
+        self._ready.set_result(None)
+        try:
+            job = None
+            while True:
+                job = job or self._queue.get()
+                if job is _STOP:
+                    break
+                if not job.atomic:
+                    self._execute(job)
+                    if self._con.in_transaction:
+                        self._con.rollback()
+                    job = None
+                else:
+                    job = self._group(job)
+        finally:
+            self._con.close()
+
+    def _group(self, job: _Job):
+        """Run ``job`` and the atomic jobs queued behind it in one transaction.
+
+        Returns the queue entry taken but not run (a non-atomic job, or the
+        stop marker), or None.
+        """
+        con, done, nxt, ran = self._con, [], None, 0
+        t0 = time.perf_counter()
+        deadline = time.monotonic() + self.max_wait
+        try:
+            con.execute("BEGIN IMMEDIATE")
+        except BaseException as e:
+            job.future.set_exception(e)
+            return None
+        while True:
+            ran += 1
+            con.execute("SAVEPOINT job")
+            try:
+                value = job.ctx.run(job.fn, con)
+            except BaseException as e:
+                if not con.in_transaction:
+                    # the error ended the whole transaction (disk full, I/O): every job in it is lost
+                    for j, _ in done + [(job, None)]:
+                        j.future.set_exception(e)
+                    return None
+                con.execute("ROLLBACK TO job")
+                con.execute("RELEASE job")
+                job.future.set_exception(e)
+            else:
+                con.execute("RELEASE job")
+                done.append((job, value))
+            if ran >= self.max_group or time.perf_counter() - t0 >= self.max_time:
+                break
+            try:
+                wait = deadline - time.monotonic()
+                nxt = self._queue.get(timeout=wait) if wait > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if nxt is _STOP or not nxt.atomic:
+                break
+            job, nxt = nxt, None
+        try:
+            con.commit()
+        except BaseException as e:
+            con.rollback()
+            for j, _ in done:
+                j.future.set_exception(e)
+            return nxt
+        metrics.observe("db_commit_seconds", time.perf_counter() - t0)
+        metrics.inc("db_commit_jobs", len(done))
+        for j, value in done:
+            j.future.set_result(value)
+        return nxt
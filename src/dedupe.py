@@ -0,0 +1,132 @@
+import sqlite3, hashlib, zlib
+from collections import Counter
+from typing import List, Dict, Tuple, Optional, Iterable
+
+import numpy as np
+
+from src.keywords import tokenize
+
+# 64 hash functions in 16 bands of 4: pairs with Jaccard similarity around
+# 0.5 and up share a band with high probability, unrelated titles rarely do
+NUM_PERM = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERM // BANDS
+SHINGLE_SIZE = 5
+# estimated Jaccard similarity to a cluster's first post needed to join it
+MATCH_THRESHOLD = 0.5
+
+_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+# fixed seed on the legacy generator: signatures are stored, so the permutations must never change
+_rng = np.random.RandomState(1)
+_A = _rng.randint(1, (1 << 32) - 1, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.randint(0, (1 << 32) - 1, size=NUM_PERM, dtype=np.uint64)
+
+
+def shingles(text: str) -> set:
+    """Character ``SHINGLE_SIZE``-grams of the lowercased, punctuation-free text."""
+    norm = " ".join(tokenize(text or ""))
+    if len(norm) <= SHINGLE_SIZE:
+        return {norm} if norm else set()
+    return {norm[i:i + SHINGLE_SIZE] for i in range(len(norm) - SHINGLE_SIZE + 1)}
+
+
+def signature(text: str) -> np.ndarray:
+    """MinHash signature (``NUM_PERM`` uint32 values) of ``text``'s shingles."""
+    sh = shingles(text)
+    if not sh:
+        return np.full(NUM_PERM, _MAX_HASH, dtype=np.uint32)
+    h = np.fromiter((zlib.crc32(s.encode("utf-8", "surrogatepass")) for s in sh), dtype=np.uint64, count=len(sh))
+    # (a*h + b) mod p per permutation, all shingles at once; uint64 overflow is part of the hash
+    with np.errstate(over="ignore"):
+        phv = ((np.outer(_A, h) + _B[:, None]) % _PRIME) & _MAX_HASH
+    return phv.min(axis=1).astype(np.uint32)
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+
+def band_keys(sig: np.ndarray) -> List[Tuple[int, int]]:
+    """``(band, hash)`` LSH keys of a signature, as stored in ``lsh_bands``."""
+    return [(b, int.from_bytes(hashlib.blake2b(sig[b * ROWS_PER_BAND:(b + 1) * ROWS_PER_BAND].tobytes(),
+                                              digest_size=8).digest(), "big", signed=True))
+            for b in range(BANDS)]
+
+
+def story_text(title: Optional[str], text: Optional[str]) -> str:
+    return title or (text or "")[:400]
+
+
+def assign_clusters(con: sqlite3.Connection,
+                    items: Iterable[Tuple[str, str, Optional[str], int]]) -> List[str]:
+    """Cluster ids for ``(id, text, created_at, engagement)`` items not yet in any cluster.
+
+    Call inside the writing transaction. Candidate clusters are found
+    through the LSH band index (one indexed lookup per band, whatever the
+    history size) and confirmed against the cluster's first signature; an
+    item without a match founds a new cluster named after its own id.
+    ``trend_clusters`` sizes, engagement sums and seen dates are updated,
+    as are the band keys, so later near-copies of any member match.
+    """
+    items = list(items)
+    if not items:
+        return []
+    sigs = [signature(text) for _, text, _, _ in items]
+    keys = [band_keys(s) for s in sigs]
+    known: Dict[Tuple[int, int], str] = {}
+    for band in range(BANDS):
+        hashes = list({k[band][1] for k in keys})
+        for i in range(0, len(hashes), 500):
+            part = hashes[i:i + 500]
+            for h, cid in con.execute(f"SELECT hash, cluster_id FROM lsh_bands WHERE band = ? "
+                                      f"AND hash IN ({','.join('?' * len(part))})", [band] + part):
+                known[(band, h)] = cid
+    candidates = list(set(known.values()))
+    reps: Dict[str, np.ndarray] = {}
+    for i in range(0, len(candidates), 500):
+        part = candidates[i:i + 500]
+        for cid, blob in con.execute(f"SELECT cluster_id, signature FROM trend_clusters "
+                                     f"WHERE cluster_id IN ({','.join('?' * len(part))})", part):
+            reps[cid] = np.frombuffer(blob, dtype=np.uint32)
+
+    out, new_clusters, members, new_keys = [], [], {}, []
+    for (rid, text, created_at, engagement), sig, ks in zip(items, sigs, keys):
+        cid = None
+        for cand, _ in Counter(known[k] for k in ks if k in known).most_common():
+            if cand in reps and similarity(sig, reps[cand]) >= MATCH_THRESHOLD:
+                cid = cand
+                break
+        if cid is None:
+            cid = rid
+            reps[cid] = sig
+            new_clusters.append((cid, text[:400], sig.tobytes()))
+        for k in ks:
+            if k not in known:
+                known[k] = cid
+                new_keys.append(k + (cid,))
+        m = members.setdefault(cid, [0, 0, None, None])
+        m[0] += 1
+        m[1] += int(engagement or 0)
+        if created_at:
+            m[2] = min(m[2] or created_at, created_at)
+            m[3] = max(m[3] or created_at, created_at)
+        out.append(cid)
+
+    con.executemany("INSERT OR IGNORE INTO trend_clusters (cluster_id, title, signature) VALUES (?, ?, ?)",
+                    new_clusters)
+    con.executemany("INSERT OR IGNORE INTO lsh_bands (band, hash, cluster_id) VALUES (?, ?, ?)", new_keys)
+    con.executemany("""
+    UPDATE trend_clusters SET size = size + ?, engagement_sum = engagement_sum + ?,
+        first_seen = COALESCE(MIN(first_seen, ?), first_seen, ?),
+        last_seen = COALESCE(MAX(last_seen, ?), last_seen, ?)
+    WHERE cluster_id = ?
+    """, [(n, eng, first, first, last, last, cid) for cid, (n, eng, first, last) in members.items()])
+    return out
+
+
+def adjust_engagement(con: sqlite3.Connection, deltas: Dict[str, int]):
+    """Apply engagement changes of already-clustered rows to their clusters' sums."""
+    con.executemany("UPDATE trend_clusters SET engagement_sum = engagement_sum + ? WHERE cluster_id = ?",
+                    [(d, cid) for cid, d in deltas.items() if d])
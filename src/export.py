@@ -0,0 +1,137 @@
+import io, csv, json
+from typing import List, Dict, Any, Iterator, Optional
+
+from src.db import QUERY_COLUMNS, iter_trends
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# rows fetched from the cursor per chunk (and per Parquet row group)
+EXPORT_BATCH_SIZE = 5000
+
+# Arrow types for the Parquet schema; every other column is a string
+_INT_COLUMNS = {"engagement", "marketing_relevant"}
+_FLOAT_COLUMNS = {"sentiment_compound"}
+
+
+def _check(fmt: str, columns: Optional[List[str]]) -> List[str]:
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown format: {fmt} (use {', '.join(FORMATS)})")
+    columns = columns or QUERY_COLUMNS
+    bad = [c for c in columns if c not in QUERY_COLUMNS]
+    if bad:
+        raise ValueError(f"unknown columns: {', '.join(bad)}")
+    return list(columns)
+
+
+def _ndjson(batches: Iterator[List[tuple]], columns: List[str]) -> Iterator[bytes]:
+    metrics = columns.index("raw_metrics") if "raw_metrics" in columns else None
+    for batch in batches:
+        lines = []
+        for row in batch:
+            rec = dict(zip(columns, row))
+            if metrics is not None and row[metrics]:
+                rec["raw_metrics"] = json.loads(row[metrics])
+            lines.append(json.dumps(rec, ensure_ascii=False))
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def _csv(batches: Iterator[List[tuple]], columns: List[str]) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    for batch in batches:
+        writer.writerows(batch)
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+class _Spool(io.RawIOBase):
+    """Write-only sink that hands back whatever was written since the last drain."""
+
+    def __init__(self):
+        self._parts, self._pos = [], 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._parts.append(bytes(b))
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def drain(self) -> bytes:
+        out, self._parts = b"".join(self._parts), []
+        return out
+
+
+def arrow_schema(columns: List[str]) -> "pa.Schema":
+    import pyarrow as pa
+    return pa.schema([(c, pa.int64() if c in _INT_COLUMNS else pa.float64() if c in _FLOAT_COLUMNS
+                       else pa.string()) for c in columns])
+
+
+def _parquet(batches: Iterator[List[tuple]], columns: List[str]) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = arrow_schema(columns)
+    sink = _Spool()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        for batch in batches:
+            arrays = [pa.array([row[i] for row in batch], type=schema.field(i).type)
+                      for i in range(len(columns))]
+            # one row group per batch, flushed to the client before the next is read
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+_WRITERS = {"ndjson": _ndjson, "csv": _csv, "parquet": _parquet}
+
+
+def export_trends(fmt: str = "ndjson", columns: List[str] = None, batch_size: int = EXPORT_BATCH_SIZE,
+                  **filters: Any) -> Iterator[bytes]:
+    """Stream matching trend rows as encoded ``fmt`` chunks.
+
+    ``filters`` are those of ``db.iter_trends`` (``since``, ``until``,
+    ``category``, ``platform``, ``min_engagement``, ``include_undated``).
+    Rows are read ``batch_size`` at a time and each batch is encoded and
+    yielded before the next is fetched, so memory stays flat and the first
+    bytes go out as soon as the first batch is read. Format and columns are
+    checked here, before any chunk is produced; Parquet needs ``pyarrow``.
+    """
+    columns = _check(fmt, columns)
+    if fmt == "parquet":
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            raise ValueError("parquet export needs pyarrow installed")
+    batches = iter_trends(columns, batch_size=batch_size, **filters)
+    return _WRITERS[fmt](batches, columns)
+
+
+def export_to_file(path: str, fmt: str = None, **kwargs: Any) -> Dict[str, Any]:
+    """Write an export to ``path``; ``fmt`` defaults to the file extension."""
+    fmt = fmt or path.rsplit(".", 1)[-1].lower()
+    chunks = export_trends(fmt, **kwargs)
+    written = 0
+    with open(path, "wb") as f:
+        for chunk in chunks:
+            f.write(chunk)
+            written += len(chunk)
+    return {"path": path, "format": fmt, "bytes": written}
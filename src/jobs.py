@@ -0,0 +1,94 @@
+import uuid, datetime, threading, copy
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, Any, Optional, List, Tuple
+
+from src.config import INGEST_WORKERS, JOB_HISTORY
+
+_executor = None
+_lock = threading.Lock()
+_jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_futures: Dict[str, Future] = {}
+_active: Dict[Tuple, str] = {}  # job key -> id of the queued/running job
+
+
+def _now() -> str:
+    return datetime.datetime.utcnow().isoformat() + "Z"
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=max(1, INGEST_WORKERS), thread_name_prefix="ingest-job")
+    return _executor
+
+
+def _update(job_id: str, **fields):
+    with _lock:
+        _jobs[job_id].update(fields)
+
+
+def _prune():
+    finished = [jid for jid, j in _jobs.items() if j["status"] in ("succeeded", "failed")]
+    for jid in finished[:max(0, len(finished) - JOB_HISTORY)]:
+        _jobs.pop(jid, None)
+        _futures.pop(jid, None)
+
+
+def _run(job_id: str, key: Tuple, params: Dict[str, Any]):
+    from src.pipeline import run_ingest
+    _update(job_id, status="running", started_at=_now())
+    try:
+        result = run_ingest(on_progress=lambda p: _update(job_id, progress=p), **params)
+        _update(job_id, status="succeeded", result=result, timings=result.get("timings"))
+        return result
+    except Exception as e:
+        _update(job_id, status="failed", error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        with _lock:
+            _jobs[job_id]["finished_at"] = _now()
+            if _active.get(key) == job_id:
+                del _active[key]
+            _prune()
+
+
+def submit_ingest(days: int = 7, full: bool = False, profile: bool = False) -> Dict[str, Any]:
+    """Queue an ingest run and return its job record immediately.
+
+    If an identical run (same parameters) is already queued or running, that
+    job is returned instead of starting another one. With ``profile`` the
+    job's result includes the run's metrics profile.
+    """
+    params = {"days": int(days), "full": bool(full), "profile": bool(profile)}
+    key = ("ingest",) + tuple(sorted(params.items()))
+    with _lock:
+        existing = _active.get(key)
+        if existing:
+            job = copy.deepcopy(_jobs[existing])
+            job["deduplicated"] = True
+            return job
+        job_id = uuid.uuid4().hex
+        _jobs[job_id] = {"id": job_id, "kind": "ingest", "params": params, "status": "queued",
+                         "created_at": _now(), "started_at": None, "finished_at": None,
+                         "progress": None, "timings": None, "result": None, "error": None}
+        _active[key] = job_id
+        job = copy.deepcopy(_jobs[job_id])
+        _futures[job_id] = _get_executor().submit(_run, job_id, key, params)
+    return job
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    with _lock:
+        job = _jobs.get(job_id)
+        return copy.deepcopy(job) if job else None
+
+
+def list_jobs() -> List[Dict[str, Any]]:
+    with _lock:
+        return [copy.deepcopy(j) for j in reversed(_jobs.values())]
+
+
+def job_future(job_id: str) -> Optional[Future]:
+    """Future of a job, for callers that want to wait for it to finish."""
+    return _futures.get(job_id)
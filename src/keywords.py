@@ -0,0 +1,86 @@
+import os, re, threading
+from typing import Dict, List, Optional, Tuple, Iterable
+
+from src.config import KEYWORDS_PATH, load_keywords
+
+_TOKEN_RX = re.compile(r"\w+")
+_HIT = ""  # trie key for "a keyword ends here"; never produced by _TOKEN_RX
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RX.findall(text.lower())
+
+
+class KeywordIndex:
+    """Token trie over every configured keyword.
+
+    Keywords are matched on whole words (``"ai"`` does not match ``"email"``),
+    multi-word keywords match across any non-word separator, and a single pass
+    over a text yields both the first matched keyword and its category.
+    """
+
+    def __init__(self, categories: Dict[str, Iterable[str]]):
+        self.categories: List[Optional[str]] = list(categories)
+        self.keywords: List[str] = []
+        self._root: Dict[str, dict] = {}
+        seen = set()
+        for rank, (cat, kws) in enumerate(categories.items()):
+            for kw in kws or []:
+                kw = str(kw).strip().lower()
+                tokens = tokenize(kw)
+                if not tokens:
+                    continue
+                node = self._root
+                for tok in tokens:
+                    node = node.setdefault(tok, {})
+                # a keyword listed under several categories belongs to the first one
+                node.setdefault(_HIT, (kw, rank))
+                if kw not in seen:
+                    seen.add(kw)
+                    self.keywords.append(kw)
+
+    def scan(self, text: str, lowered: bool = False) -> Tuple[Optional[str], Optional[str]]:
+        """Return ``(matched_keyword, category)`` for ``text``.
+
+        ``matched_keyword`` is the leftmost (then longest) keyword in the text;
+        ``category`` is the first category, in config order, with any match.
+        Both are ``None`` when nothing matches. Pass ``lowered=True`` when
+        ``text`` is already lowercase to skip that copy.
+        """
+        tokens = _TOKEN_RX.findall(text if lowered else text.lower())
+        n = len(tokens)
+        root = self._root
+        keyword, kw_pos, best = None, -1, len(self.categories)
+        for i in range(n):
+            node = root.get(tokens[i])
+            j = i + 1
+            while node is not None:
+                hit = node.get(_HIT)
+                if hit is not None:
+                    if keyword is None or kw_pos == i:
+                        keyword, kw_pos = hit[0], i
+                    if hit[1] < best:
+                        best = hit[1]
+                node = node.get(tokens[j]) if j < n else None
+                j += 1
+            if best == 0:
+                break
+        category = self.categories[best] if best < len(self.categories) else None
+        return keyword, category
+
+
+_cache = {"mtime": None, "index": None}
+_lock = threading.Lock()
+
+
+def get_keyword_index() -> KeywordIndex:
+    """Shared index over ``config/keywords.yaml``, rebuilt when the file changes."""
+    try:
+        mtime = os.stat(KEYWORDS_PATH).st_mtime_ns
+    except OSError:
+        mtime = None
+    with _lock:
+        if _cache["index"] is None or _cache["mtime"] != mtime:
+            _cache["index"] = KeywordIndex(load_keywords().get("categories", {}) or {})
+            _cache["mtime"] = mtime
+        return _cache["index"]
@@ -0,0 +1,163 @@
+import time, threading, contextlib, contextvars
+from typing import Dict, Any, Tuple, Optional, Iterator
+
+from src.config import METRICS_ENABLED
+
+# name -> (type, help); only metrics listed here are exported
+METRICS = {
+    "source_pages": ("counter", "Pages received from a source."),
+    "source_records": ("counter", "Records received from a source."),
+    "source_bytes": ("counter", "Characters of title + text received from a source."),
+    "source_errors": ("counter", "Source runs that ended in an error or timeout."),
+    "source_skipped": ("counter", "Source runs skipped for missing credentials or client libraries."),
+    "source_cache": ("counter", "Source response cache lookups, by hit or miss."),
+    "source_throttled": ("counter", "HTTP 429s from a source, retried or given up on."),
+    "source_page_seconds": ("summary", "Time spent waiting for one page from a source."),
+    "stage_seconds": ("summary", "Time spent in one pipeline stage call."),
+    "stage_records": ("counter", "Records entering a pipeline stage."),
+    "sentiment_texts": ("counter", "Texts given a sentiment score, by cached, inline or process-pool scoring."),
+    "db_write_seconds": ("summary", "Time to write one chunk of bulk_upsert."),
+    "db_rows": ("counter", "Rows handled by bulk_upsert, by outcome."),
+    "db_commit_seconds": ("summary", "Time to run and commit one group of queued writes."),
+    "db_commit_jobs": ("counter", "Write jobs committed by the database writer thread."),
+    "ingest_runs": ("counter", "Finished ingest runs, by status."),
+    "archive_rows": ("counter", "Rows moved from SQLite into the Parquet archive."),
+    "report_render_seconds": ("summary", "Time to produce a report, by whether the cached one was reused."),
+}
+PREFIX = "trend_"
+
+Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+_lock = threading.Lock()
+_counters: Dict[Key, float] = {}
+_summaries: Dict[Key, list] = {}
+# per-run collector, set by ``profile()``; copied into worker threads with the context
+_profile: contextvars.ContextVar[Optional["Profile"]] = contextvars.ContextVar("metrics_profile", default=None)
+
+
+def _key(name: str, labels: Dict[str, Any]) -> Key:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Profile:
+    """Counters and timings recorded while one ``profile()`` block was active."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[Key, float] = {}
+        self.summaries: Dict[Key, list] = {}
+
+    def as_dict(self) -> Dict[str, Any]:
+        """``{metric: {"label=value,...": value}}``; timings as ``{"count", "seconds"}``."""
+        out: Dict[str, Any] = {}
+        with self._lock:
+            for (name, labels), v in self.counters.items():
+                out.setdefault(name, {})[_plain(labels)] = v
+            for (name, labels), (count, total) in self.summaries.items():
+                out.setdefault(name, {})[_plain(labels)] = {"count": count, "seconds": round(total, 4)}
+        return out
+
+
+def _plain(labels: Tuple[Tuple[str, str], ...]) -> str:
+    return ",".join(f"{k}={v}" for k, v in labels) or "total"
+
+
+def inc(name: str, value: float = 1, **labels: Any):
+    if not METRICS_ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+    prof = _profile.get()
+    if prof is not None:
+        with prof._lock:
+            prof.counters[key] = prof.counters.get(key, 0) + value
+
+
+def observe(name: str, seconds: float, **labels: Any):
+    if not METRICS_ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        s = _summaries.setdefault(key, [0, 0.0])
+        s[0] += 1
+        s[1] += seconds
+    prof = _profile.get()
+    if prof is not None:
+        with prof._lock:
+            s = prof.summaries.setdefault(key, [0, 0.0])
+            s[0] += 1
+            s[1] += seconds
+
+
+class _Timer:
+    __slots__ = ("name", "labels", "t0")
+
+    def __init__(self, name: str, labels: Dict[str, Any]):
+        self.name, self.labels = name, labels
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.t0, **self.labels)
+
+
+_NOOP = contextlib.nullcontext()
+
+
+def timer(name: str, **labels: Any):
+    """Context manager observing the block's wall time; a shared no-op when metrics are off."""
+    return _Timer(name, labels) if METRICS_ENABLED else _NOOP
+
+
+@contextlib.contextmanager
+def profile(enabled: bool = True) -> Iterator[Optional[Profile]]:
+    """Collect what this block (and threads started with its context) records into a ``Profile``."""
+    if not (enabled and METRICS_ENABLED):
+        yield None
+        return
+    prof = Profile()
+    token = _profile.set(prof)
+    try:
+        yield prof
+    finally:
+        _profile.reset(token)
+
+
+def _label_str(labels: Tuple[Tuple[str, str], ...]) -> str:
+    return ",".join('%s="%s"' % (k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+                    for k, v in labels)
+
+
+def _series(name: str, labels: Tuple[Tuple[str, str], ...]) -> str:
+    return f"{name}{{{_label_str(labels)}}}" if labels else name
+
+
+def render_prometheus() -> str:
+    """All process metrics in the Prometheus text exposition format."""
+    with _lock:
+        counters = dict(_counters)
+        summaries = {k: tuple(v) for k, v in _summaries.items()}
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        full = PREFIX + name
+        if kind == "counter":
+            series = [(labels, v) for (n, labels), v in counters.items() if n == name]
+            lines += [f"# HELP {full}_total {help_text}", f"# TYPE {full}_total counter"]
+            lines += [f"{_series(full + '_total', labels)} {v:g}" for labels, v in sorted(series)]
+        else:
+            series = [(labels, v) for (n, labels), v in summaries.items() if n == name]
+            lines += [f"# HELP {full} {help_text}", f"# TYPE {full} summary"]
+            for labels, (count, total) in sorted(series):
+                lines.append(f"{_series(full + '_count', labels)} {count}")
+                lines.append(f"{_series(full + '_sum', labels)} {total:.6f}")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    """Drop every recorded value (tests and benchmarks)."""
+    with _lock:
+        _counters.clear()
+        _summaries.clear()
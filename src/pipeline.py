@@ -1,184 +1,28 @@
 
-import os, json, sqlite3, hashlib, datetime
-from typing import List, Dict, Any
+import os, json, datetime, functools, threading, time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Iterator, Iterable, Callable
+
+from src.config import MOCK_MODE, GEO, REPORTS_DIR, STREAM_CHUNK_SIZE, ARCHIVE_AFTER_INGEST
+from src.db import (SCHEMA, TREND_COLUMNS, init_db, bulk_upsert, upsert_records, query_last_days, query_trends,
+                    query_key, load_cursors, save_cursor, rollup_summary, count_unique_topics, top_stories,
+                    window_start, change_counter)
+from src.bursts import detect_bursts
+from src import metrics
+from src.batch import RecordBatch, record_id
+from src.keywords import KeywordIndex, get_keyword_index
+from src.sentiment import score_texts
+from src.sources import (fetch_x_recent, fetch_reddit, fetch_google_trends, extract_all,
+                         extract_all_with_status, source_pagers, stream_pages)
 
-from src.config import DB_PATH, load_keywords, MOCK_MODE, GEO, REPORTS_DIR
-import pandas as pd
-import matplotlib.pyplot as plt
-from jinja2 import Environment, FileSystemLoader, select_autoescape
-
-
-def _ensure_dirs():
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    os.makedirs(os.path.join(REPORTS_DIR, "assets"), exist_ok=True)
-    os.makedirs(os.path.join(REPORTS_DIR, "templates"), exist_ok=True)
-
-
-def fetch_x_recent(keywords: List[str], days: int = 7, max_results: int = 100) -> List[Dict[str, Any]]:
-    """Fetch X (Twitter) posts — returns [] when credentials/libraries are missing"""
-    try:
-        import tweepy
-    except Exception:
-        return []
-
-    token = os.getenv("X_BEARER_TOKEN")
-    if not token:
-        return []
-
-    client = tweepy.Client(bearer_token=token, wait_on_rate_limit=True)
-    q = " OR ".join([f'"{k}"' if " " in k else k for k in keywords])
-    query = f"({q}) -is:retweet lang:en"
-    end = datetime.datetime.utcnow()
-    start = end - datetime.timedelta(days=days)
-    tweets = []
-    try:
-        paginator = tweepy.Paginator(
-            client.search_recent_tweets,
-            query=query,
-            start_time=start.isoformat("T")+"Z",
-            end_time=end.isoformat("T")+"Z",
-            max_results=100,
-            tweet_fields=["created_at","public_metrics","lang","text"],
-            expansions=["author_id"],
-            user_fields=["username"],
-        )
-        users = {}
-        for page in paginator:
-            if page.includes and 'users' in page.includes:
-                for u in page.includes['users']:
-                    users[u.id] = u
-            if page.data:
-                for t in page.data:
-                    author = users.get(t.author_id).username if t.author_id in users else None
-                    metrics = t.public_metrics or {}
-                    tweets.append({
-                        "id": str(t.id),
-                        "platform": "x",
-                        "created_at": t.created_at.isoformat() if hasattr(t, "created_at") else None,
-                        "title": t.text[:120],
-                        "text": t.text,
-                        "author": author,
-                        "url": f"https://x.com/{author}/status/{t.id}" if author else None,
-                        "lang": t.lang,
-                        "engagement": int(metrics.get("like_count",0)) + int(metrics.get("retweet_count",0)) + int(metrics.get("reply_count",0)),
-                        "raw_metrics": metrics,
-                    })
-    except Exception:
-        pass
-    return tweets
-
-def fetch_reddit(keywords: List[str], days: int = 7, limit: int = 200) -> List[Dict[str, Any]]:
-    try:
-        import praw
-    except Exception:
-        return []
-
-    client_id = os.getenv("REDDIT_CLIENT_ID")
-    client_secret = os.getenv("REDDIT_CLIENT_SECRET")
-    user_agent = os.getenv("REDDIT_USER_AGENT")
-    if not (client_id and client_secret and user_agent):
-        return []
-
-    reddit = praw.Reddit(client_id=client_id, client_secret=client_secret, user_agent=user_agent)
-    subs = ["marketing","SEO","socialmedia","advertising","content_marketing","PPC","bigseo"]
-    items = []
-    since = datetime.datetime.utcnow() - datetime.timedelta(days=days)
-    q = " OR ".join([f'"{k}"' if " " in k else k for k in keywords]) if keywords else None
-    try:
-        for sr in subs:
-            for s in reddit.subreddit(sr).search(q, sort="new", time_filter="week", limit=limit):
-                created = datetime.datetime.utcfromtimestamp(s.created_utc)
-                if created < since:
-                    continue
-                text = (s.title or "") + " " + (s.selftext or "")
-                items.append({
-                    "id": s.id,
-                    "platform": "reddit",
-                    "created_at": created.isoformat(),
-                    "title": s.title or "",
-                    "text": text,
-                    "author": str(s.author) if s.author else None,
-                    "url": f"https://www.reddit.com{s.permalink}",
-                    "lang": "en",
-                    "engagement": int(s.score or 0) + int(s.num_comments or 0),
-                    "raw_metrics": {"score": int(s.score or 0), "num_comments": int(s.num_comments or 0)}
-                })
-    except Exception:
-        pass
-    return items
-
-def fetch_google_trends(keywords: List[str], top_n: int = 20, pytrends=None) -> List[Dict[str, Any]]:
-    try:
-        from pytrends.request import TrendReq
-    except Exception:
-        return []
-
-    py = TrendReq(hl="en-US", tz=330)
-    results = []
-    try:
-        daily = py.trending_searches(pn=GEO if len(GEO)==2 else "india")
-        if not daily.empty:
-            for i, row in daily.head(top_n).iterrows():
-                term = row[0]
-                results.append({
-                    "id": f"gtrends-daily-{term}",
-                    "platform": "gtrends",
-                    "created_at": None,
-                    "title": term,
-                    "text": term,
-                    "author": None,
-                    "url": f"https://trends.google.com/trends/explore?q={term}",
-                    "lang": "en",
-                    "engagement": 0,
-                    "raw_metrics": {"type": "daily_trending"},
-                })
-        
-        seed = keywords[:5] if keywords else ["marketing"]
-        py.build_payload(seed, timeframe="now 7-d", geo=GEO if len(GEO)==2 else "")
-        iot = py.interest_over_time()
-        if iot is not None and not iot.empty:
-            for col in iot.columns:
-                if col == 'isPartial':
-                    continue
-                results.append({
-                    "id": f"gtrends-iot-{col}",
-                    "platform": "gtrends",
-                    "created_at": None,
-                    "title": col,
-                    "text": col,
-                    "author": None,
-                    "url": f"https://trends.google.com/trends/explore?q={col}",
-                    "lang": "en",
-                    "engagement": int(iot[col].iloc[-1]),
-                    "raw_metrics": {"type": "interest_over_time", "latest": int(iot[col].iloc[-1])},
-                })
-    except Exception:
-        pass
-    return results
-
-
-def extract_all(keywords: List[str], days:int=7) -> List[Dict[str,Any]]:
-    out = []
-    out.extend(fetch_x_recent(keywords, days=days))
-    out.extend(fetch_reddit(keywords, days=days))
-    out.extend(fetch_google_trends(keywords))
-    return out
 
 def build_keyword_list() -> List[str]:
-    keys = load_keywords()
-    flat = []
-    for v in keys.get("categories", {}).values():
-        flat.extend(v)
-    return list(set(flat))
+    return list(get_keyword_index().keywords)
 
 def normalize_record(r: Dict[str, Any]) -> Dict[str, Any]:
-   
-    rid = r.get("id")
-    if not rid:
-        raw = (r.get("platform","") + (r.get("title") or "") + (r.get("created_at") or ""))
-        rid = hashlib.md5(raw.encode()).hexdigest()
     return {
-        "id": rid,
+        "id": record_id(r),
         "platform": r.get("platform"),
         "created_at": r.get("created_at"),
         "title": (r.get("title") or "")[:400],
@@ -194,203 +38,320 @@ def normalize_record(r: Dict[str, Any]) -> Dict[str, Any]:
         "sentiment_compound": float(r.get("sentiment_compound") or 0.0),
     }
 
-import re
-def filter_marketing(records: List[Dict[str, Any]], keywords: List[str]) -> List[Dict[str, Any]]:
-    if not keywords:
-        return records
-    escaped = [re.escape(k) for k in keywords if k]
-    if not escaped:
-        return records
-    pattern = r"\b(?:" + "|".join(escaped) + r")\b"
-    rx = re.compile(pattern, flags=re.IGNORECASE)
-    out = []
-    for r in records:
-        text = (r.get("title","") or "") + " " + (r.get("text","") or "")
-        m = rx.search(text)
-        if m:
-            r['marketing_relevant'] = True
-            r['matched_keyword'] = m.group(0).lower()
-            out.append(r)
-    return out
-
-
-def add_sentiment(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+
+def _batch_stage(fn):
+    """Stages work on a ``RecordBatch`` in place; a list of record dicts is
+    converted on the way in and returned as normalized dicts."""
+    @functools.wraps(fn)
+    def stage(records, *args, **kwargs):
+        if isinstance(records, RecordBatch):
+            return fn(records, *args, **kwargs)
+        return fn(RecordBatch.from_records(records), *args, **kwargs).to_records()
+    return stage
+
+
+@_batch_stage
+def filter_marketing(batch: RecordBatch, keywords: Optional[List[str]] = None) -> RecordBatch:
+    """Keep records mentioning a keyword; also stamps the category from the same scan."""
+    index = get_keyword_index()
+    if keywords is not None:
+        wanted = {k.strip().lower() for k in keywords if k}
+        if not wanted:
+            return batch
+        if wanted != set(index.keywords):
+            index = KeywordIndex({None: sorted(wanted)})
+    keep = []
+    relevant, matched, category = batch.marketing_relevant, batch.matched_keyword, batch.category
+    for i, text in enumerate(batch.lowered):
+        kw, cat = index.scan(text, lowered=True)
+        if kw:
+            relevant[i] = 1
+            matched[i] = kw
+            if cat and not category[i]:
+                category[i] = cat
+            keep.append(i)
+    return batch.take(keep) if len(keep) < len(batch) else batch
+
+
+@_batch_stage
+def add_sentiment(batch: RecordBatch) -> RecordBatch:
+    scores = score_texts(batch.combined) if len(batch) else []
+    if scores is None:
+        # fallback: naive polarity 0.0, or whatever score the source sent
+        return batch
+    batch.sentiment_compound = array("d", scores)
+    return batch
+
+
+@_batch_stage
+def categorize(batch: RecordBatch) -> RecordBatch:
+    """Assign each record the first config category with a keyword match.
+
+    Records already categorized (e.g. by ``filter_marketing``) are left as is.
+    """
+    index = get_keyword_index()
+    category, lowered = batch.category, batch.lowered
+    for i, cat in enumerate(category):
+        if cat:
+            continue
+        _, cat = index.scan(lowered[i], lowered=True)
+        category[i] = cat or "uncategorized"
+    return batch
+
+
+_REPORT_CACHE_FILE = ".render_cache.json"
+_render_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=1)
+def _template_env() -> "jinja2.Environment":
+    from jinja2 import Environment, FileSystemLoader, select_autoescape
+    templates_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "reports", "templates")
+    return Environment(loader=FileSystemLoader(templates_dir), autoescape=select_autoescape(['html','xml']))
+
+
+def _bar_chart(path: str, series: "pd.Series", title: str):
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    # Figure + Agg canvas instead of pyplot: no global state, safe to draw on several threads
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.subplots()
+    ax.bar([str(i) for i in series.index], series.values)
+    ax.tick_params(axis='x', labelrotation=90)
+    ax.set_title(title)
+    fig.tight_layout()
+    fig.savefig(path)
+
+
+def _placeholder_chart(path: str):
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure(figsize=(2,1))
+    FigureCanvasAgg(fig)
+    fig.text(0.5, 0.5, "No data", ha="center")
+    fig.savefig(path)
+
+
+def _read_render_cache() -> Dict[str, Any]:
     try:
-        import nltk
-        from nltk.sentiment import SentimentIntensityAnalyzer
-        try:
-            nltk.data.find("sentiment/vader_lexicon.zip")
-        except Exception:
-            nltk.download("vader_lexicon")
-        sia = SentimentIntensityAnalyzer()
-    except Exception:
-        # fallback: naive polarity 0.0
-        for r in records:
-            r['sentiment_compound'] = float(r.get("sentiment_compound", 0.0))
-        return records
-
-    for r in records:
-        text = (r.get("title","") or "") + " " + (r.get("text","") or "")
-        s = sia.polarity_scores(text)
-        r['sentiment_compound'] = float(s.get("compound", 0.0))
-    return records
-
-def categorize(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    keys = load_keywords()
-    mapping = keys.get("categories", {})
-    for r in records:
-        text = ((r.get("title","") or "") + " " + (r.get("text","") or "")).lower()
-        chosen = None
-        for cat, kws in mapping.items():
-            if any(k in text for k in kws):
-                chosen = cat
-                break
-        r['category'] = chosen or "uncategorized"
-    return records
-
-
-SCHEMA = """
-CREATE TABLE IF NOT EXISTS trends (
-    id TEXT PRIMARY KEY,
-    platform TEXT,
-    created_at TEXT,
-    title TEXT,
-    text TEXT,
-    author TEXT,
-    url TEXT,
-    lang TEXT,
-    engagement INTEGER,
-    raw_metrics TEXT,
-    marketing_relevant INTEGER,
-    category TEXT,
-    matched_keyword TEXT,
-    sentiment_compound REAL,
-    inserted_at TEXT DEFAULT (datetime('now'))
-);
-"""
-
-def init_db():
-    _ensure_dirs()
-    with sqlite3.connect(DB_PATH) as con:
-        con.executescript(SCHEMA)
-
-def upsert_records(records: List[Dict[str, Any]]) -> int:
-    if not records:
-        return 0
-    init_db()
-    cnt = 0
-    with sqlite3.connect(DB_PATH) as con:
-        cur = con.cursor()
-        for r in records:
-            cur.execute("""
-            INSERT INTO trends (id, platform, created_at, title, text, author, url, lang,
-                                engagement, raw_metrics, marketing_relevant, category,
-                                matched_keyword, sentiment_compound)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(id) DO UPDATE SET
-                platform=excluded.platform,
-                created_at=excluded.created_at,
-                title=excluded.title,
-                text=excluded.text,
-                author=excluded.author,
-                url=excluded.url,
-                lang=excluded.lang,
-                engagement=excluded.engagement,
-                raw_metrics=excluded.raw_metrics,
-                marketing_relevant=excluded.marketing_relevant,
-                category=excluded.category,
-                matched_keyword=excluded.matched_keyword,
-                sentiment_compound=excluded.sentiment_compound
-            """, (
-                r["id"], r["platform"], r["created_at"], r["title"], r["text"], r["author"], r["url"],
-                r["lang"], int(r["engagement"]), json.dumps(r.get("raw_metrics") or {}), 1 if r.get("marketing_relevant") else 0,
-                r.get("category"), r.get("matched_keyword"), float(r.get("sentiment_compound") or 0.0)
-            ))
-            cnt += 1
-        con.commit()
-    return cnt
-
-
-def query_last_days(days: int=7) -> pd.DataFrame:
-    init_db()
-    since = (datetime.datetime.utcnow() - datetime.timedelta(days=days)).isoformat()
-    with sqlite3.connect(DB_PATH) as con:
-        df = pd.read_sql_query("SELECT * FROM trends WHERE created_at IS NULL OR created_at >= ? ORDER BY engagement DESC", con, params=(since,))
-    return df
+        with open(os.path.join(REPORTS_DIR, _REPORT_CACHE_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
 
-def generate_report(days:int=7, out_html: str=None, make_pdf: bool=False) -> str:
-    df = query_last_days(days)
-    os.makedirs(REPORTS_DIR, exist_ok=True)
-    assets_dir = os.path.join(REPORTS_DIR, "assets")
 
-    
-    if not df.empty:
-        cat_counts = df['category'].value_counts()
-        plt.figure()
-        cat_counts.plot(kind='bar')
-        plt.title('Records per Category')
-        plt.tight_layout()
-        cat_counts_png = os.path.join(assets_dir, "category_counts.png")
-        plt.savefig(cat_counts_png)
-        plt.close()
-
-        s = df.groupby('category')['sentiment_compound'].mean().sort_values(ascending=False)
-        plt.figure()
-        s.plot(kind='bar')
-        plt.title('Average Sentiment by Category')
-        plt.tight_layout()
-        cat_sent_png = os.path.join(assets_dir, "category_sentiment.png")
-        plt.savefig(cat_sent_png)
-        plt.close()
-    else:
-        
-        cat_counts_png = os.path.join(assets_dir, "category_counts.png")
-        cat_sent_png = os.path.join(assets_dir, "category_sentiment.png")
-        
-        for p in (cat_counts_png, cat_sent_png):
-            plt.figure(figsize=(2,1)); plt.text(0.5,0.5,"No data",ha="center"); plt.axis('off'); plt.savefig(p); plt.close()
-
-    stats = {'total_records': int(df.shape[0]), 'unique_topics': int(df['title'].nunique()) if not df.empty else 0}
-    top_category = df['category'].value_counts().idxmax() if not df.empty else "n/a"
-    pos_cat = df.groupby('category')['sentiment_compound'].mean().idxmax() if not df.empty else "n/a"
-    cols = ['platform','title','category','engagement','sentiment_compound','created_at','url']
-    top_trends = df[cols].head(20).to_dict(orient='records') if not df.empty else []
-
-    period_label = f"Last {days} days"
-    generated_at = datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC")
-
-    
-    templates_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "reports", "templates")
-    env = Environment(loader=FileSystemLoader(templates_dir), autoescape=select_autoescape(['html','xml']))
-    tpl = env.get_template("weekly_report.html.j2")
-    html = tpl.render(period_label=period_label, geo=GEO, stats=stats,
-                      highlights={'top_category': top_category, 'positive_category': pos_cat, 'top_trend': top_trends[0] if top_trends else {'title':'n/a','platform':'n/a'}},
-                      top_trends=top_trends, generated_at=generated_at)
+def _write_render_cache(state: Dict[str, Any]):
+    path = os.path.join(REPORTS_DIR, _REPORT_CACHE_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def report_fingerprint(days: int) -> str:
+    """Identifies the data a report would show: DB change counter, window, region and UTC hour.
 
+    The hour is there because the rising-now section is scored per hour.
+    """
+    hour = datetime.datetime.utcnow().strftime("%Y-%m-%dT%H")
+    return f"{change_counter()}:{days}:{GEO}:{hour}"
+
+
+def generate_report(days:int=7, out_html: str=None, make_pdf: bool=False) -> str:
+    """Render the HTML (and optionally PDF) report for the last ``days``.
+
+    If nothing was written to the DB since the same report was last
+    rendered, the existing files are returned untouched. Charts are shared
+    by every report, so the cache also checks that they were last drawn for
+    this fingerprint. A PDF is reused only if it was made from this
+    fingerprint, not merely because an older one is on disk.
+    """
+    assets_dir = os.path.join(REPORTS_DIR, "assets")
+    os.makedirs(assets_dir, exist_ok=True)
     out_html = out_html or os.path.join(REPORTS_DIR, "weekly_report.html")
-    with open(out_html, "w", encoding="utf-8") as f:
-        f.write(html)
+    pdf_path = out_html.replace(".html", ".pdf")
+    cat_counts_png = os.path.join(assets_dir, "category_counts.png")
+    cat_sent_png = os.path.join(assets_dir, "category_sentiment.png")
+
+    t0 = time.perf_counter()
+    with _render_lock:
+        fp = report_fingerprint(days)
+        state = _read_render_cache()
+        key = os.path.abspath(out_html)
+        if (state.get("assets") == fp and state.get("html", {}).get(key) == fp
+                and all(os.path.exists(p) for p in (out_html, cat_counts_png, cat_sent_png))
+                and (not make_pdf or (state.get("pdf", {}).get(os.path.abspath(pdf_path)) == fp
+                                      and os.path.exists(pdf_path)))):
+            metrics.observe("report_render_seconds", time.perf_counter() - t0, cached="true")
+            return out_html
+
+        import pandas as pd
+        summary = [r for r in rollup_summary(days, by="category") if r["category"]]
+        if summary:
+            cat_counts = pd.Series({r["category"]: r["count"] for r in summary})
+            s = pd.Series({r["category"]: r["avg_sentiment"] or 0.0 for r in summary}).sort_values(ascending=False)
+            charts = [(_bar_chart, cat_counts_png, cat_counts, 'Records per Category'),
+                      (_bar_chart, cat_sent_png, s, 'Average Sentiment by Category')]
+        else:
+            charts = [(_placeholder_chart, cat_counts_png), (_placeholder_chart, cat_sent_png)]
+        with ThreadPoolExecutor(max_workers=len(charts)) as pool:
+            drawn = [pool.submit(fn, *args) for fn, *args in charts]
+
+            total = sum(r["count"] for r in rollup_summary(days, by="platform"))
+            stats = {'total_records': int(total), 'unique_topics': count_unique_topics(days) if total else 0}
+            top_category = cat_counts.idxmax() if summary else "n/a"
+            pos_cat = s.idxmax() if summary else "n/a"
+            # the same whole-day window as the rollup stats above
+            top_trends = top_stories(since=window_start(days), limit=20)
+            rising = {"keywords": detect_bursts("keyword", limit=10),
+                      "categories": detect_bursts("category", limit=5)}
+
+            period_label = f"Last {days} days"
+            generated_at = datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC")
+
+            tpl = _template_env().get_template("weekly_report.html.j2")
+            html = tpl.render(period_label=period_label, geo=GEO, stats=stats,
+                              highlights={'top_category': top_category, 'positive_category': pos_cat, 'top_trend': top_trends[0] if top_trends else {'title':'n/a','platform':'n/a'}},
+                              top_trends=top_trends, rising=rising, generated_at=generated_at)
+            for f in drawn:
+                f.result()
+
+        with open(out_html, "w", encoding="utf-8") as f:
+            f.write(html)
+
+        if make_pdf:
+            try:
+                import pdfkit
+                pdfkit.from_file(out_html, pdf_path)
+                state.setdefault("pdf", {})[os.path.abspath(pdf_path)] = fp
+            except Exception:
+                pass
+
+        state["assets"] = fp
+        state.setdefault("html", {})[key] = fp
+        _write_render_cache(state)
+    metrics.observe("report_render_seconds", time.perf_counter() - t0, cached="false")
+    return out_html
+
 
-    if make_pdf:
+def enrich(records: List[Dict[str, Any]], keys: List[str]) -> RecordBatch:
+    """Normalize raw records into a ``RecordBatch``, then filter, categorize and score it in place."""
+    with metrics.timer("stage_seconds", stage="normalize"):
+        batch = RecordBatch.from_records(records)
+    metrics.inc("stage_records", len(batch), stage="filter")
+    with metrics.timer("stage_seconds", stage="filter"):
+        filter_marketing(batch, keys)
+    with metrics.timer("stage_seconds", stage="categorize"):
+        categorize(batch)
+    # the keyword stages are done with the lowercased text; only one text copy is alive at a time
+    batch.release_text(keep_combined=True)
+    metrics.inc("stage_records", len(batch), stage="sentiment")
+    with metrics.timer("stage_seconds", stage="sentiment"):
+        add_sentiment(batch)
+    batch.release_text()
+    return batch
+
+
+def _chunks(pages: Iterable[List[Dict[str, Any]]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    buf = []
+    for page in pages:
+        buf.extend(page)
+        while len(buf) >= size:
+            yield buf[:size]
+            buf = buf[size:]
+    if buf:
+        yield buf
+
+
+def run_ingest(days:int=7, chunk_size: int = STREAM_CHUNK_SIZE, full: bool = False,
+               on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+               profile: bool = False) -> Dict[str, Any]:
+    """Extract, enrich and store one ingest window; returns a run summary.
+
+    Pages stream from the fetchers through the enrichment stages and are
+    written in ``chunk_size`` batches, so memory stays flat however many
+    posts the sources return and rows land in the DB as soon as the first
+    chunk fills.
+
+    Each source resumes from the cursor saved by the last run for the same
+    keyword set; ``full=True`` ignores the cursors and re-fetches the whole
+    ``days`` window (e.g. to fill a gap). X and Reddit only advance theirs
+    once every shard has finished; Google Trends also keeps the payload a
+    timed-out or rate-limited run stopped at, so the next run picks up there.
+
+    ``on_progress`` is called after every written chunk with the running
+    counts and per-stage timings (seconds spent waiting on sources,
+    enriching and writing). With ``profile``, the summary also carries the
+    run's own metrics (``metrics.Profile.as_dict``): per-source pages,
+    records, bytes and page timings, and per-stage and per-write timings.
+    With ARCHIVE_AFTER_INGEST, rows past the hot window are then moved to
+    the Parquet archive (``archived``, see ``archive.archive_old_rows``).
+    """
+    with metrics.profile(profile) as prof:
         try:
-            import pdfkit
-            pdf_path = out_html.replace(".html", ".pdf")
-            pdfkit.from_file(out_html, pdf_path)
+            result = _run_ingest(days, chunk_size, full, on_progress)
         except Exception:
-            pass
-
-    return out_html
+            metrics.inc("ingest_runs", status="failed")
+            raise
+        metrics.inc("ingest_runs", status="succeeded")
+    if prof is not None:
+        result["profile"] = prof.as_dict()
+    return result
 
 
-def ingest_and_store(days:int=7) -> int:
+def _run_ingest(days: int, chunk_size: int, full: bool,
+                on_progress: Optional[Callable[[Dict[str, Any]], None]]) -> Dict[str, Any]:
     keys = build_keyword_list()
+    written = {"inserted": 0, "updated": 0, "skipped": 0}
+    timings = {"extract": 0.0, "enrich": 0.0, "write": 0.0}
+    fetched = 0
     if MOCK_MODE:
         from samples.make_sample_data import generate_mock_records
         records = generate_mock_records(80)
+        sources = {"mock": {"status": "ok", "error": None, "records": len(records), "elapsed": 0.0}}
+        chunks = _chunks([records], chunk_size)
+        process = lambda chunk: chunk
     else:
-        records = extract_all(keys, days=days)
-        records = filter_marketing(records, keys)
-        records = add_sentiment(records)
-        records = categorize(records)
-        records = [normalize_record(r) for r in records]
-    return upsert_records(records)
+        sources = {}
+        key = query_key(keys)
+        stored = {} if full else load_cursors(key)
+        cursors = {name: dict(stored.get(name, {})) for name in ("x", "reddit", "gtrends")}
+        pages = (page for _, page in stream_pages(source_pagers(keys, days, cursors, refresh=full), status=sources))
+        chunks = _chunks(pages, chunk_size)
+        process = lambda chunk: enrich(chunk, keys)
+    while True:
+        t0 = time.perf_counter()
+        chunk = next(chunks, None)
+        t1 = time.perf_counter()
+        timings["extract"] += t1 - t0
+        if chunk is None:
+            break
+        fetched += len(chunk)
+        rows = process(chunk)
+        t2 = time.perf_counter()
+        timings["enrich"] += t2 - t1
+        metrics.observe("stage_seconds", t1 - t0, stage="extract")
+        metrics.observe("stage_seconds", t2 - t1, stage="enrich")
+        for k, v in bulk_upsert(rows).items():
+            written[k] += v
+        timings["write"] += time.perf_counter() - t2
+        if on_progress:
+            on_progress({"fetched": fetched, "written": dict(written), "timings": dict(timings)})
+    if not MOCK_MODE:
+        for name, st in sources.items():
+            # a source that stopped early leaves only the positions it completed on its cursor
+            if st["status"] in ("ok", "timeout", "rate_limited") and cursors.get(name):
+                save_cursor(name, key, cursors[name])
+    result = {"upserted": sum(written.values()), "written": written, "fetched": fetched,
+              "sources": sources, "timings": {k: round(v, 3) for k, v in timings.items()}, "full": full}
+    if ARCHIVE_AFTER_INGEST:
+        from src.archive import archive_old_rows
+        t0 = time.perf_counter()
+        result["archived"] = archive_old_rows()
+        result["timings"]["archive"] = round(time.perf_counter() - t0, 3)
+    return result
+
+
+def ingest_and_store(days:int=7, full: bool = False) -> int:
+    return run_ingest(days=days, full=full)["upserted"]
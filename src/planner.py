@@ -0,0 +1,67 @@
+from typing import List, Dict, Optional, Tuple
+
+from src.config import X_QUERY_MAX_LEN, REDDIT_QUERY_MAX_LEN, GTRENDS_PAYLOAD_TERMS, load_subreddits
+
+X_QUERY_SUFFIX = " -is:retweet lang:en"
+
+
+def quote(keyword: str) -> str:
+    return f'"{keyword}"' if " " in keyword else keyword
+
+
+def or_query(keywords: List[str]) -> str:
+    return " OR ".join(quote(k) for k in keywords)
+
+
+def x_query(keywords: List[str]) -> str:
+    return f"({or_query(keywords)}){X_QUERY_SUFFIX}"
+
+
+def pack(keywords: List[str], max_len: Optional[int] = None, max_terms: Optional[int] = None,
+         overhead: int = 0) -> List[List[str]]:
+    """Split ``keywords`` into as few shards as fit the limits.
+
+    Each shard's ``or_query`` plus ``overhead`` characters stays within
+    ``max_len``, and holds at most ``max_terms`` keywords. First-fit
+    decreasing by quoted length, so the same keyword set always gives the
+    same shards (and the same response-cache keys). A keyword too long for
+    any shard gets one to itself.
+    """
+    seen, terms = set(), []
+    for k in keywords:
+        k = str(k).strip().lower()
+        if k and k not in seen:
+            seen.add(k)
+            terms.append(k)
+    terms.sort(key=lambda k: (-len(quote(k)), k))
+    shards: List[Tuple[List[str], int]] = []  # (terms, query length so far)
+    for k in terms:
+        size = len(quote(k))
+        for i, (shard, used) in enumerate(shards):
+            if max_terms is not None and len(shard) >= max_terms:
+                continue
+            if max_len is not None and used + len(" OR ") + size + overhead > max_len:
+                continue
+            shard.append(k)
+            shards[i] = (shard, used + len(" OR ") + size)
+            break
+        else:
+            shards.append(([k], size))
+    return [shard for shard, _ in shards]
+
+
+def plan_queries(keywords: List[str], subreddits: Optional[List[str]] = None) -> Dict[str, list]:
+    """Shards per source: ``{"x": [terms, ...], "reddit": [(subreddit, terms), ...], "gtrends": [terms, ...]}``.
+
+    X shards fit the recent-search query length, Reddit shards the search
+    query length for every configured subreddit, and Google Trends shards
+    the five-term ``build_payload`` limit.
+    """
+    subreddits = subreddits if subreddits is not None else load_subreddits()
+    x = pack(keywords, max_len=X_QUERY_MAX_LEN, overhead=len("()" + X_QUERY_SUFFIX))
+    reddit = pack(keywords, max_len=REDDIT_QUERY_MAX_LEN)
+    return {
+        "x": x,
+        "reddit": [(sr, terms) for sr in subreddits for terms in reddit],
+        "gtrends": pack(keywords, max_terms=GTRENDS_PAYLOAD_TERMS),
+    }
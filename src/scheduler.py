@@ -0,0 +1,207 @@
+import os, json, time, sqlite3, hashlib, threading, contextlib, contextvars
+from typing import Dict, Any, Callable, Optional, Tuple
+
+from src.config import (SOURCE_RATES, RATE_LIMIT_MAX_WAIT, RATE_LIMIT_RETRIES,
+                        RESPONSE_CACHE_PATH, RESPONSE_CACHE_TTL)
+from src import metrics
+
+
+# set by sources.stream_pages on each fetch thread: ``pause(source)`` is a context manager that
+# holds the source's deadline while a call sleeps on its token bucket or a 429 reset
+throttle_pause: contextvars.ContextVar = contextvars.ContextVar("throttle_pause", default=None)
+
+
+class RateLimited(Exception):
+    """A source asked us to wait longer than RATE_LIMIT_MAX_WAIT; the caller should give up for now."""
+
+    def __init__(self, source: str, wait: float):
+        super().__init__(f"{source} rate limited for another {wait:.0f}s")
+        self.source, self.wait = source, wait
+
+
+class TokenBucket:
+    """``rate`` tokens per second, bursting to ``capacity``; ``pause_until`` blocks it after a 429."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate, self.capacity = rate, max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token; returns how long the caller must sleep before using it."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.paused_until - now)
+
+    def pause_until(self, when: float):
+        with self.lock:
+            self.paused_until = max(self.paused_until, when)
+            self.tokens = min(self.tokens, 0.0)
+
+
+class ResponseCache:
+    """On-disk JSON response cache with a per-entry expiry, keyed by source + normalized request."""
+
+    def __init__(self, path: str = RESPONSE_CACHE_PATH):
+        self.path = path
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        con = sqlite3.connect(self.path, timeout=30)
+        con.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, source TEXT NOT NULL, "
+                    "value TEXT NOT NULL, expires_at REAL NOT NULL)")
+        return con
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        with self._connect() as con:
+            row = con.execute("SELECT value FROM responses WHERE key = ? AND expires_at > ?",
+                              (key, time.time())).fetchone()
+        return (True, json.loads(row[0])) if row else (False, None)
+
+    def put(self, key: str, source: str, value: Any, ttl: float):
+        now = time.time()
+        with self._connect() as con:
+            con.execute("INSERT OR REPLACE INTO responses (key, source, value, expires_at) VALUES (?, ?, ?, ?)",
+                        (key, source, json.dumps(value), now + ttl))
+            con.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+
+
+def request_key(source: str, params: Dict[str, Any]) -> str:
+    """Cache key for a request: ``keywords`` are lowercased, de-duplicated and sorted, so the
+    same query in any order shares an entry."""
+    norm = dict(params)
+    if "keywords" in norm:
+        norm["keywords"] = sorted({str(k).strip().lower() for k in norm["keywords"] if k})
+    raw = json.dumps([source, norm], sort_keys=True, default=str)
+    return f"{source}:{hashlib.sha1(raw.encode('utf-8')).hexdigest()}"
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    """Seconds to wait if ``exc`` is an HTTP 429 from any source client, else None.
+
+    Reads X's ``x-rate-limit-reset`` (epoch), Reddit's ``x-ratelimit-reset``
+    (seconds) or ``retry-after``; a 429 without usable headers gives 0.0,
+    meaning "back off exponentially".
+    """
+    resp = getattr(exc, "response", None)
+    status = getattr(resp, "status_code", None) or getattr(resp, "status", None)
+    if status != 429 and "TooManyRequests" not in type(exc).__name__:
+        return None
+    headers = getattr(resp, "headers", None) or {}
+    try:
+        if headers.get("x-rate-limit-reset"):
+            return max(0.0, float(headers["x-rate-limit-reset"]) - time.time())
+        if headers.get("x-ratelimit-reset"):
+            return float(headers["x-ratelimit-reset"])
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return 0.0
+
+
+class Scheduler:
+    """Shared gate in front of every source API call.
+
+    ``call`` serves a fresh cached response when there is one; otherwise it
+    waits for the source's token bucket, runs the request, and on a 429
+    pauses the whole source until the reset the server gave (or backs off
+    exponentially) and retries. A wait beyond ``max_wait`` raises
+    ``RateLimited`` instead of stalling the ingest.
+    """
+
+    def __init__(self, rates: Dict[str, Tuple[float, float]] = None, cache: Optional[ResponseCache] = None,
+                 ttl: float = RESPONSE_CACHE_TTL, max_wait: float = RATE_LIMIT_MAX_WAIT,
+                 retries: int = RATE_LIMIT_RETRIES):
+        self.rates = rates if rates is not None else SOURCE_RATES
+        self.cache = cache if cache is not None else ResponseCache()
+        self.ttl, self.max_wait, self.retries = ttl, max_wait, retries
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def _bucket(self, source: str) -> TokenBucket:
+        with self._lock:
+            if source not in self._buckets:
+                per_minute, burst = self.rates.get(source, (60.0, 5))
+                self._buckets[source] = TokenBucket(per_minute / 60.0, burst)
+            return self._buckets[source]
+
+    def _count(self, source: str, stat: str, value: float = 1):
+        with self._lock:
+            s = self._stats.setdefault(source, {"hits": 0, "misses": 0, "requests": 0, "throttled": 0,
+                                                "rate_limited": 0, "waited_s": 0.0})
+            s[stat] += value
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {src: {k: round(v, 3) if isinstance(v, float) else v for k, v in s.items()}
+                    for src, s in self._stats.items()}
+
+    def _wait(self, source: str, seconds: float):
+        if seconds > self.max_wait:
+            self._count(source, "rate_limited")
+            metrics.inc("source_throttled", source=source, outcome="gave_up")
+            raise RateLimited(source, seconds)
+        if seconds > 0:
+            self._count(source, "waited_s", seconds)
+            pause = throttle_pause.get()
+            with pause(source) if pause is not None else contextlib.nullcontext():
+                time.sleep(seconds)
+
+    def call(self, source: str, params: Dict[str, Any], fn: Callable[[], Any], ttl: float = None,
+             refresh: bool = False) -> Any:
+        """Result of ``fn()`` (JSON-serializable) for the request described by ``params``.
+
+        ``refresh`` skips the cache lookup but still stores the new response.
+        """
+        key = request_key(source, params)
+        if not refresh:
+            hit, value = self.cache.get(key)
+            if hit:
+                self._count(source, "hits")
+                metrics.inc("source_cache", source=source, result="hit")
+                return value
+            self._count(source, "misses")
+            metrics.inc("source_cache", source=source, result="miss")
+        bucket = self._bucket(source)
+        attempt = 0
+        while True:
+            self._wait(source, bucket.reserve())
+            self._count(source, "requests")
+            try:
+                value = fn()
+                break
+            except Exception as e:
+                wait = _retry_after(e)
+                if wait is None:
+                    raise
+                self._count(source, "throttled")
+                metrics.inc("source_throttled", source=source, outcome="retried")
+                attempt += 1
+                if attempt > self.retries:
+                    raise
+                wait = wait or min(self.max_wait, 2.0 ** attempt)
+                bucket.pause_until(time.monotonic() + wait)
+        if ttl != 0:
+            self.cache.put(key, source, value, self.ttl if ttl is None else ttl)
+        return value
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> Scheduler:
+    """Process-wide scheduler shared by every fetcher."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler()
+        return _scheduler
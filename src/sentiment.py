@@ -0,0 +1,158 @@
+import os, sqlite3, hashlib, threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Optional
+
+from src.config import SENTIMENT_WORKERS, SENTIMENT_BATCH_SIZE, SENTIMENT_CACHE_PATH, SENTIMENT_PARALLEL_MIN
+from src import metrics
+
+# below this many uncached texts, scoring in-process beats shipping them to a pool
+PARALLEL_MIN_TEXTS = SENTIMENT_PARALLEL_MIN
+
+_sia = None
+_sia_lock = threading.Lock()
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def ensure_lexicon(download: bool = False) -> bool:
+    """True when the VADER lexicon is installed; optionally download it first.
+
+    Downloads only happen here (setup/CLI), never while scoring a request.
+    """
+    try:
+        import nltk
+    except Exception:
+        return False
+    try:
+        nltk.data.find("sentiment/vader_lexicon.zip")
+        return True
+    except LookupError:
+        if not download:
+            return False
+    return bool(nltk.download("vader_lexicon", quiet=True))
+
+
+def _load_analyzer():
+    from nltk.sentiment import SentimentIntensityAnalyzer
+    return SentimentIntensityAnalyzer()
+
+
+def get_analyzer():
+    """Process-wide VADER analyzer, or None when nltk/the lexicon is unavailable."""
+    global _sia
+    if _sia is None:
+        with _sia_lock:
+            if _sia is None:
+                if not ensure_lexicon():
+                    return None
+                try:
+                    _sia = _load_analyzer()
+                except Exception:
+                    return None
+    return _sia
+
+
+def _score(sia, texts: List[str]) -> List[float]:
+    return [float(sia.polarity_scores(t).get("compound", 0.0)) for t in texts]
+
+
+# -- worker side: the analyzer is loaded once per pool process --
+
+_worker_sia = None
+
+def _init_worker():
+    global _worker_sia
+    _worker_sia = _load_analyzer()
+
+def _score_batch(texts: List[str]) -> List[float]:
+    return _score(_worker_sia, texts)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            workers = SENTIMENT_WORKERS or os.cpu_count() or 1
+            # spawn: the API server is threaded, forking it is not safe
+            _pool = ProcessPoolExecutor(max_workers=workers,
+                                        mp_context=multiprocessing.get_context("spawn"),
+                                        initializer=_init_worker)
+        return _pool
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+class ScoreCache:
+    """Persistent compound-score cache keyed by the SHA-1 of the scored text."""
+
+    def __init__(self, path: str = SENTIMENT_CACHE_PATH):
+        self.path = path
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        con = sqlite3.connect(self.path, timeout=30)
+        con.execute("CREATE TABLE IF NOT EXISTS sentiment_cache (text_hash TEXT PRIMARY KEY, compound REAL NOT NULL)")
+        return con
+
+    def get_many(self, hashes: List[str]) -> Dict[str, float]:
+        found = {}
+        unique = list(set(hashes))
+        with self._connect() as con:
+            for i in range(0, len(unique), 500):
+                chunk = unique[i:i+500]
+                marks = ",".join("?" * len(chunk))
+                for h, c in con.execute(f"SELECT text_hash, compound FROM sentiment_cache WHERE text_hash IN ({marks})", chunk):
+                    found[h] = c
+        return found
+
+    def put_many(self, scores: Dict[str, float]) -> None:
+        if not scores:
+            return
+        with self._connect() as con:
+            con.executemany("INSERT OR REPLACE INTO sentiment_cache (text_hash, compound) VALUES (?, ?)", scores.items())
+
+
+def score_texts(texts: List[str], cache: Optional[ScoreCache] = None) -> Optional[List[float]]:
+    """Compound scores for ``texts``, in input order.
+
+    Cached scores are reused; the rest are de-duplicated and scored in-process
+    or, for large runs, in batches on a process pool. Returns None when VADER
+    is unavailable.
+    """
+    cache = cache or ScoreCache()
+    hashes = [text_hash(t) for t in texts]
+    try:
+        known = cache.get_many(hashes)
+    except sqlite3.Error:
+        known = {}
+
+    todo = {}
+    for h, t in zip(hashes, texts):
+        if h not in known and h not in todo:
+            todo[h] = t
+    if todo:
+        sia = get_analyzer()
+        if sia is None:
+            return None
+        pending = list(todo.values())
+        workers = SENTIMENT_WORKERS or os.cpu_count() or 1
+        if len(pending) >= PARALLEL_MIN_TEXTS and workers > 1:
+            # at least one batch per worker, so a single ingest chunk still spreads over the pool
+            size = max(1, min(SENTIMENT_BATCH_SIZE, -(-len(pending) // workers)))
+            batches = [pending[i:i+size] for i in range(0, len(pending), size)]
+            scores = [s for batch in _get_pool().map(_score_batch, batches) for s in batch]
+            metrics.inc("sentiment_texts", len(pending), mode="pool")
+        else:
+            scores = _score(sia, pending)
+            metrics.inc("sentiment_texts", len(pending), mode="inline")
+        fresh = dict(zip(todo.keys(), scores))
+        try:
+            cache.put_many(fresh)
+        except sqlite3.Error:
+            pass
+        known.update(fresh)
+    metrics.inc("sentiment_texts", len(texts) - len(todo), mode="cached")
+    return [known[h] for h in hashes]
@@ -1,22 +1,51 @@
 
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
+import asyncio
 import datetime
+import hashlib
 import os
 
+from src.jobs import submit_ingest, get_job, list_jobs, job_future
+from src import metrics
+from src.scheduler import get_scheduler
+
 
 try:
-    from src.pipeline import ingest_and_store, generate_report, query_last_days
+    from src.pipeline import ingest_and_store, run_ingest, generate_report, query_last_days
+    from src.db import (query_trends, top_stories, search_trends, search_scope, days_ago, rollup_summary,
+                        change_counter, encode_page_cursor, decode_page_cursor, TREND_COLUMNS)
+    from src.export import export_trends, FORMATS as EXPORT_FORMATS
+    from src.bursts import detect_bursts
+    from src.timeseries import trend_timeseries
 except ImportError:
     ingest_and_store = None
+    run_ingest = None
     generate_report = None
     query_last_days = None
+    query_trends = None
+    top_stories = None
+    search_trends = None
+    search_scope = None
+    days_ago = None
+    rollup_summary = None
+    change_counter = None
+    encode_page_cursor = None
+    decode_page_cursor = None
+    TREND_COLUMNS = None
+    export_trends = None
+    EXPORT_FORMATS = None
+    detect_bursts = None
+    trend_timeseries = None
 
 app = FastAPI(title="Trend Extraction API")
 
 class IngestBody(BaseModel):
     days: int = 7
+    full: bool = False  # ignore stored cursors and re-fetch the whole window
+    wait: bool = False  # block until the job finishes (without holding a worker thread)
+    profile: bool = False  # attach the run's per-source/stage/write metrics to the result
 
 class ReportBody(BaseModel):
     days: int = 7
@@ -32,6 +61,18 @@ def health():
     return {"status": "ok"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    """Process metrics in Prometheus text format."""
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/sources/stats")
+def source_stats():
+    """Per-source response-cache hits/misses, API requests, 429s and time spent waiting on rate limits."""
+    return get_scheduler().stats()
+
+
 @app.get("/mock")
 def mock_data():
     return {
@@ -44,35 +85,57 @@ def mock_data():
     }
 
 
-@app.post("/ingest")
-def ingest(body: IngestBody):
-    if ingest_and_store is None:
+@app.post("/ingest", status_code=202)
+async def ingest(body: IngestBody, response: Response):
+    """Start an ingest job; poll GET /jobs/{id}, or pass ``wait`` to get the result inline."""
+    if run_ingest is None:
         return {"message": "⚠️ Mock mode: ingestion not implemented"}
-    try:
-        inserted = ingest_and_store(days=body.days)
-        return {"inserted": inserted}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    job = submit_ingest(days=body.days, full=body.full, profile=body.profile)
+    if not body.wait:
+        return job
+    future = job_future(job["id"])
+    if future is not None:
+        try:
+            await asyncio.wrap_future(future)
+        except Exception:
+            pass  # the job's own failure; its record carries the error, checked below
+    job = get_job(job["id"])
+    if job is None:
+        # finished and already dropped from the job history
+        raise HTTPException(status_code=404, detail="Unknown job id.")
+    if job["status"] not in ("succeeded", "failed"):
+        raise HTTPException(status_code=500, detail=f"Job {job['id']} is still {job['status']}.")
+    if job["status"] == "failed":
+        raise HTTPException(status_code=500, detail=job["error"])
+    response.status_code = 200
+    return job
+
+
+@app.get("/jobs")
+def jobs():
+    return list_jobs()
 
 
-from fastapi.responses import FileResponse
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job id.")
+    return job
+
 
 
 @app.post("/report")
 def report(body: ReportBody):
+    if top_stories is None or days_ago is None:
+        raise HTTPException(status_code=503, detail="Reports unavailable in mock mode.")
     report_dir = "reports"
     os.makedirs(report_dir, exist_ok=True)
 
-    
-    df = query_last_days(body.days)
-    if df is None or df.empty:
+    trends = top_stories(since=days_ago(body.days), limit=20)
+    if not trends:
         raise HTTPException(status_code=404, detail="No trends available to generate report.")
 
-    cols = ['platform','title','category','engagement','sentiment_compound','created_at','url']
-    trends = df[cols].head(20).to_dict(orient='records')
-
     if body.format.lower() == "html":
         file_path = os.path.join(report_dir, f"weekly_report_{datetime.date.today()}.html")
         with open(file_path, "w", encoding="utf-8") as f:
@@ -81,12 +144,14 @@ def report(body: ReportBody):
             f.write("<ul>")
             for t in trends:
                 f.write(f"<li><b>{t['title']}</b> ({t['platform']}, {t['category']}) - "
-                        f"Engagement: {t['engagement']}, Sentiment: {t['sentiment_compound']:.2f}, "
+                        f"Engagement: {t['cluster_engagement']} ({t['posts']} posts), Sentiment: {t['sentiment_compound']:.2f}, "
                         f"<a href='{t['url']}'>Link</a></li>")
             f.write("</ul>")
         return FileResponse(file_path, media_type="text/html")
 
     elif body.format.lower() == "pdf":
+        from reportlab.lib.pagesizes import letter
+        from reportlab.pdfgen import canvas
         file_path = os.path.join(report_dir, f"weekly_report_{datetime.date.today()}.pdf")
         c = canvas.Canvas(file_path, pagesize=letter)
         width, height = letter
@@ -99,7 +164,7 @@ def report(body: ReportBody):
 
         y = height - 100
         for i, t in enumerate(trends, start=1):
-            text = f"{i}. {t['title']} ({t['platform']}, {t['category']}) | Engagement: {t['engagement']} | Sentiment: {t['sentiment_compound']:.2f}"
+            text = f"{i}. {t['title']} ({t['platform']}, {t['category']}) | Engagement: {t['cluster_engagement']} ({t['posts']} posts) | Sentiment: {t['sentiment_compound']:.2f}"
             c.drawString(50, y, text[:110])  
             y -= 20
             if y < 50:  
@@ -114,17 +179,156 @@ def report(body: ReportBody):
     else:
         raise HTTPException(status_code=400, detail="Invalid format. Use 'html' or 'pdf'.")
 
+MAX_PAGE_SIZE = 500
+
+
+def _default_since(since: str = None) -> str:
+    # a day-aligned default window (the last 30 days) keeps the ETag stable between ingests
+    return since or (datetime.datetime.utcnow() - datetime.timedelta(days=30)).date().isoformat()
+
+
+def _etag(request: Request, response: Response, params: list):
+    """Tag ``response`` for a read of ``params`` at the current DB change counter.
+
+    Sets ``ETag`` and ``Cache-Control: no-cache``; when the request's
+    ``If-None-Match`` already holds the tag, returns the ``304`` response
+    to send instead (otherwise None). Without a database there is nothing
+    to tag.
+    """
+    if change_counter is None:
+        return None
+    etag = 'W/"%d-%s"' % (change_counter(), hashlib.sha1(repr(params).encode("utf-8")).hexdigest()[:16])
+    if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return None
+
+
 @app.get("/trends")
-def trends(limit: int = 20):
-    if query_last_days is None:
+def trends(request: Request, response: Response, limit: int = 20, category: str = None,
+           platform: str = None, since: str = None, until: str = None,
+           min_engagement: int = None, cursor: str = None):
+    """Trends by engagement, newest window first.
+
+    Filters: ``category``, ``platform``, ``since``/``until`` (ISO dates,
+    default the last 30 days) and ``min_engagement``. When more rows exist,
+    the ``X-Next-Cursor`` header carries the ``cursor`` for the next page.
+    Responses carry an ETag tied to the DB change counter; a matching
+    ``If-None-Match`` gets ``304 Not Modified``.
+    """
+    if query_trends is None:
         
         return [
             {"platform": "Reddit", "title": "AI in Marketing", "category": "content marketing", "engagement": 1500, "sentiment_compound": 0.9, "created_at": str(datetime.date.today()), "url": "http://example.com"},
             {"platform": "X", "title": "TikTok Ads", "category": "social media marketing", "engagement": 1200, "sentiment_compound": 0.2, "created_at": str(datetime.date.today()), "url": "http://example.com"},
         ][:limit]
 
-    df = query_last_days(30)
-    if df is None or df.empty:
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    since = _default_since(since)
+    not_modified = _etag(request, response, [limit, category, platform, since, until, min_engagement, cursor])
+    if not_modified is not None:
+        return not_modified
+    try:
+        after = decode_page_cursor(cursor) if cursor else None
+        rows = query_trends(TREND_COLUMNS + ["id"], since=since, until=until, category=category,
+                            platform=platform, min_engagement=min_engagement,
+                            limit=limit + 1, after=after)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = encode_page_cursor(rows[-1])
+    return rows
+
+
+@app.get("/trends/summary")
+def trends_summary(days: int = 7, by: str = "category"):
+    if rollup_summary is None:
+        return []
+    try:
+        return rollup_summary(days, by=by)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/trends/timeseries")
+def trends_timeseries(request: Request, response: Response, bucket: str = "day", by: str = "category",
+                      since: str = None, until: str = None, category: str = None, platform: str = None):
+    """Counts, engagement and average sentiment per ``bucket`` (hour, day or week) and ``by`` key.
+
+    ``by`` is ``category``, ``platform`` or ``keyword``; ``since`` defaults to
+    30 days ago. Aggregated in SQLite (archived days in Arrow) and cached
+    until the next ingest; the ETag works as on ``/trends``.
+    """
+    if trend_timeseries is None:
+        return []
+    since = _default_since(since)
+    not_modified = _etag(request, response, [bucket, by, since, until, category, platform])
+    if not_modified is not None:
+        return not_modified
+    try:
+        return trend_timeseries(bucket, by, since=since, until=until, category=category, platform=platform)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/search")
+def search(response: Response, q: str, limit: int = 20, category: str = None, platform: str = None,
+           since: str = None, until: str = None, min_engagement: int = None, syntax: str = "plain"):
+    """Full-text search over titles and text, ranked by BM25, with highlighted snippets.
+
+    ``syntax=fts`` passes ``q`` through as an FTS5 query (phrases, OR, NEAR, ...).
+    Plain queries also match archived days, after the hot rows; FTS5
+    queries cover hot rows only. ``X-Search-Scope`` says which (``all``
+    or ``hot``).
+    """
+    if search_trends is None:
+        return []
+    if syntax not in ("plain", "fts"):
+        raise HTTPException(status_code=400, detail="syntax must be 'plain' or 'fts'")
+    response.headers["X-Search-Scope"] = search_scope(since, until, raw=syntax == "fts")
+    try:
+        return search_trends(q, limit=max(1, min(limit, MAX_PAGE_SIZE)), since=since, until=until,
+                             category=category, platform=platform, min_engagement=min_engagement,
+                             raw=syntax == "fts")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+
+
+@app.get("/trends/bursts")
+def trends_bursts(by: str = "keyword", hours: int = None, min_count: int = None,
+                  threshold: float = None, limit: int = 20):
+    """Keywords or categories rising fastest this hour, by EWMA z-score of hourly counts."""
+    if detect_bursts is None:
         return []
-    cols = ['platform', 'title', 'category', 'engagement', 'sentiment_compound', 'created_at', 'url']
-    return df[cols].head(limit).to_dict(orient='records')
+    opts = {k: v for k, v in {"hours": hours, "min_count": min_count, "threshold": threshold}.items()
+            if v is not None}
+    try:
+        return detect_bursts(by, limit=max(1, min(limit, MAX_PAGE_SIZE)), **opts)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/export")
+def export(format: str = "ndjson", columns: str = None, category: str = None, platform: str = None,
+           since: str = None, until: str = None, min_engagement: int = None):
+    """Stream every matching row as NDJSON, CSV or Parquet.
+
+    ``columns`` is a comma-separated projection (default: all); filters are
+    those of ``/trends`` but with no default window and no row cap. Rows are
+    read off a cursor in batches, so the download starts immediately.
+    """
+    if export_trends is None:
+        raise HTTPException(status_code=503, detail="Export unavailable in mock mode.")
+    cols = [c.strip() for c in columns.split(",") if c.strip()] if columns else None
+    try:
+        body = export_trends(format, cols, since=since, until=until, category=category,
+                             platform=platform, min_engagement=min_engagement)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    filename = f"trends_{datetime.date.today()}.{format}"
+    return StreamingResponse(body, media_type=EXPORT_FORMATS[format],
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
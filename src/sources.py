@@ -0,0 +1,582 @@
+import os, datetime, time, queue, threading, contextlib, contextvars
+from typing import List, Dict, Any, Optional, Tuple, Iterator, Callable
+
+from src.config import GEO, SOURCE_TIMEOUTS, STREAM_QUEUE_PAGES, GTRENDS_REFRESH_MINUTES, SHARD_WORKERS
+from src import metrics
+from src.planner import plan_queries, or_query, x_query
+from src.scheduler import RateLimited, get_scheduler, throttle_pause
+
+Page = List[Dict[str, Any]]
+
+# records per page for sources whose client iterates item by item
+PAGE_SIZE = 100
+
+
+class _Failed:
+    __slots__ = ("error",)
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def fan_out(factories: List[Callable[[], Iterator[Page]]], workers: int,
+            max_pages: int = STREAM_QUEUE_PAGES) -> Iterator[Page]:
+    """Run shard page generators on up to ``workers`` threads and yield their pages as they arrive.
+
+    Records already yielded by another shard (same ``id``) are dropped. The
+    first shard error stops the rest and is re-raised here, after the pages
+    that arrived before it.
+    """
+    seen = set()
+
+    def fresh(page: Page) -> Page:
+        out = [r for r in page if r["id"] not in seen]
+        seen.update(r["id"] for r in out)
+        return out
+
+    if len(factories) <= 1 or workers <= 1:
+        for factory in factories:
+            for page in factory():
+                page = fresh(page)
+                if page:
+                    yield page
+        return
+
+    q = queue.Queue(maxsize=max(1, max_pages))
+    stop = threading.Event()
+    pending = iter(factories)
+    lock = threading.Lock()
+    done = object()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def work():
+        while not stop.is_set():
+            with lock:
+                factory = next(pending, None)
+            if factory is None:
+                break
+            try:
+                for page in factory():
+                    if not put(page):
+                        return
+            except Exception as e:
+                put(_Failed(e))
+                return
+        put(done)
+
+    n = min(workers, len(factories))
+    for i in range(n):
+        threading.Thread(target=contextvars.copy_context().run, args=(work,),
+                         name=f"shard-{i}", daemon=True).start()
+    try:
+        finished = 0
+        while finished < n:
+            item = q.get()
+            if item is done:
+                finished += 1
+            elif isinstance(item, _Failed):
+                raise item.error
+            else:
+                page = fresh(item)
+                if page:
+                    yield page
+    finally:
+        stop.set()
+
+
+def _tweet_page(resp) -> Dict[str, Any]:
+    users = {u.id: u for u in (resp.includes or {}).get("users", [])}
+    tweets = []
+    for t in resp.data or []:
+        author = users[t.author_id].username if t.author_id in users else None
+        metrics_ = t.public_metrics or {}
+        tweets.append({
+            "id": str(t.id),
+            "platform": "x",
+            "created_at": t.created_at.isoformat() if getattr(t, "created_at", None) else None,
+            "title": t.text[:120],
+            "text": t.text,
+            "author": author,
+            "url": f"https://x.com/{author}/status/{t.id}" if author else None,
+            "lang": t.lang,
+            "engagement": int(metrics_.get("like_count",0)) + int(metrics_.get("retweet_count",0)) + int(metrics_.get("reply_count",0)),
+            "raw_metrics": metrics_,
+        })
+    return {"records": tweets, "next_token": (resp.meta or {}).get("next_token")}
+
+
+def _x_shard_pages(client, keywords: List[str], days: int, max_results: int, since_id: Optional[str],
+                  newest: List[int], refresh: bool) -> Iterator[Page]:
+    sched = get_scheduler()
+    top = 0
+    query = x_query(keywords)
+    end = datetime.datetime.utcnow()
+    start = end - datetime.timedelta(days=days)
+    next_token = None
+    while True:
+        def fetch(next_token=next_token):
+            extra = {"since_id": since_id} if since_id else {}
+            if next_token:
+                extra["next_token"] = next_token
+            return _tweet_page(client.search_recent_tweets(
+                query=query,
+                start_time=start.isoformat("T")+"Z",
+                end_time=end.isoformat("T")+"Z",
+                max_results=max(10, min(max_results, 100)),
+                tweet_fields=["created_at","public_metrics","lang","text"],
+                expansions=["author_id"],
+                user_fields=["username"],
+                **extra,
+            ))
+        # since_id stays out of the key: a cached page from an earlier run in the window is a superset
+        page = sched.call("x", {"keywords": keywords, "days": days, "max_results": max_results,
+                                "next_token": next_token}, fetch, refresh=refresh)
+        for t in page["records"]:
+            top = max(top, int(t["id"]))
+        if page["records"]:
+            yield page["records"]
+        next_token = page["next_token"]
+        if not next_token:
+            break
+    newest.append(top)
+
+
+def iter_x_pages(keywords: List[str], days: int = 7, max_results: int = 100,
+                 cursor: Optional[Dict[str, Any]] = None, refresh: bool = False, client=None) -> Iterator[Page]:
+    """Yield X (Twitter) posts one API page at a time; nothing when credentials/libraries are missing.
+
+    ``keywords`` are split into query shards that fit the recent-search query
+    length (``planner.plan_queries``), searched up to SHARD_WORKERS["x"] at a
+    time and merged by tweet id. With a ``cursor``, only tweets newer than
+    ``cursor["since_id"]`` are requested; once every shard has finished, the
+    newest id seen is written back to it. Every page goes through the shared
+    scheduler: served from the response cache when an equal query was
+    answered within RESPONSE_CACHE_TTL (``refresh`` skips the lookup),
+    otherwise rate-limited and retried on 429. ``client`` replaces the
+    ``tweepy.Client`` built from X_BEARER_TOKEN.
+    """
+    cursor = cursor if cursor is not None else {}
+    if client is None:
+        try:
+            import tweepy
+        except Exception:
+            metrics.inc("source_skipped", source="x", reason="library")
+            return
+
+        token = os.getenv("X_BEARER_TOKEN")
+        if not token:
+            metrics.inc("source_skipped", source="x", reason="credentials")
+            return
+
+        # 429s are handled by the scheduler, which gives up instead of sleeping out a 15-minute window
+        client = tweepy.Client(bearer_token=token, wait_on_rate_limit=False)
+    since_id = cursor.get("since_id")
+    newest = [int(since_id or 0)]  # one entry per finished shard
+    shards = plan_queries(keywords, subreddits=[])["x"]
+    yield from fan_out([lambda terms=terms: _x_shard_pages(client, terms, days, max_results, since_id, newest, refresh)
+                        for terms in shards], SHARD_WORKERS["x"])
+    if max(newest):
+        cursor["since_id"] = str(max(newest))
+
+
+def _reddit_record(s) -> Dict[str, Any]:
+    text = (s.title or "") + " " + (s.selftext or "")
+    return {
+        "id": s.id,
+        "platform": "reddit",
+        "created_at": datetime.datetime.utcfromtimestamp(s.created_utc).isoformat(),
+        "title": s.title or "",
+        "text": text,
+        "author": str(s.author) if s.author else None,
+        "url": f"https://www.reddit.com{s.permalink}",
+        "lang": "en",
+        "engagement": int(s.score or 0) + int(s.num_comments or 0),
+        "raw_metrics": {"score": int(s.score or 0), "num_comments": int(s.num_comments or 0)}
+    }
+
+
+def _reddit_shard_pages(reddit, sr: str, keywords: List[str], days: int, limit: int, last: float,
+                       newest: List[Tuple[str, float]], refresh: bool) -> Iterator[Page]:
+    sched = get_scheduler()
+    since = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+    q = or_query(keywords) if keywords else None
+    # a recent cursor only needs the last day of results
+    window = "day" if last and time.time() - last < 86400 else "week"
+    after, seen, top = None, 0, last
+    while seen < limit:
+        def fetch(after=after):
+            listing = reddit().subreddit(sr).search(q, sort="new", time_filter=window, limit=PAGE_SIZE,
+                                                    params={"after": after} if after else {})
+            subs_ = list(listing)
+            return {"records": [_reddit_record(s) for s in subs_],
+                    "created": [float(s.created_utc) for s in subs_],
+                    "after": subs_[-1].fullname if len(subs_) >= PAGE_SIZE else None}
+        page = sched.call("reddit", {"subreddit": sr, "keywords": keywords, "window": window,
+                                     "after": after}, fetch, refresh=refresh)
+        items, done = [], False
+        for rec, created_utc in zip(page["records"], page["created"]):
+            seen += 1
+            if created_utc <= last or seen > limit:
+                done = True
+                break
+            top = max(top, created_utc)
+            if datetime.datetime.utcfromtimestamp(created_utc) < since:
+                continue
+            items.append(rec)
+        if items:
+            yield items
+        after = page["after"]
+        if done or not after:
+            break
+    newest.append((sr, top))
+
+
+def iter_reddit_pages(keywords: List[str], days: int = 7, limit: int = 200,
+                      cursor: Optional[Dict[str, Any]] = None, refresh: bool = False, reddit=None) -> Iterator[Page]:
+    """Yield Reddit search results, newest first, one listing page at a time.
+
+    Every configured subreddit (``config.load_subreddits``) is searched with
+    each keyword shard that fits the search query length; up to
+    SHARD_WORKERS["reddit"] (subreddit, shard) pairs run at once and results
+    are merged by post id. ``cursor`` maps subreddit to the newest
+    ``created_utc`` already stored; each search stops there, and once all
+    shards have finished the cursor is advanced to the newest post seen.
+    ``limit`` caps posts per (subreddit, shard). Listing pages go through the
+    shared scheduler and response cache, like ``iter_x_pages``. ``reddit``
+    replaces the ``praw.Reddit`` clients built from the REDDIT_* settings;
+    it is shared by all shard threads.
+    """
+    cursor = cursor if cursor is not None else {}
+    if reddit is not None:
+        def clients():
+            return reddit
+    else:
+        try:
+            import praw
+        except Exception:
+            metrics.inc("source_skipped", source="reddit", reason="library")
+            return
+
+        client_id = os.getenv("REDDIT_CLIENT_ID")
+        client_secret = os.getenv("REDDIT_CLIENT_SECRET")
+        user_agent = os.getenv("REDDIT_USER_AGENT")
+        if not (client_id and client_secret and user_agent):
+            metrics.inc("source_skipped", source="reddit", reason="credentials")
+            return
+
+        # praw instances are not thread-safe: one per worker thread
+        local = threading.local()
+
+        def clients():
+            if not hasattr(local, "client"):
+                local.client = praw.Reddit(client_id=client_id, client_secret=client_secret, user_agent=user_agent)
+            return local.client
+
+    newest: List[Tuple[str, float]] = []  # (subreddit, newest created_utc) per finished shard
+    shards = plan_queries(keywords)["reddit"]
+    yield from fan_out([lambda sr=sr, terms=terms: _reddit_shard_pages(clients, sr, terms, days, limit,
+                                                                       float(cursor.get(sr) or 0), newest, refresh)
+                        for sr, terms in shards], SHARD_WORKERS["reddit"])
+    for sr, created_utc in newest:
+        if created_utc > float(cursor.get(sr) or 0):
+            cursor[sr] = created_utc
+
+
+_trendreq = None
+_trendreq_lock = threading.Lock()
+
+
+def _shared_trendreq():
+    """One pytrends session per process (it carries Google's cookies); calls on it are serialized."""
+    global _trendreq
+    if _trendreq is None:
+        from pytrends.request import TrendReq
+        _trendreq = TrendReq(hl="en-US", tz=330)
+    return _trendreq
+
+
+def _gtrends_record(term: str, engagement: int, raw_metrics: Dict[str, Any], kind: str) -> Dict[str, Any]:
+    return {
+        "id": f"gtrends-{kind}-{term}",
+        "platform": "gtrends",
+        "created_at": None,
+        "title": term,
+        "text": term,
+        "author": None,
+        "url": f"https://trends.google.com/trends/explore?q={term}",
+        "lang": "en",
+        "engagement": engagement,
+        "raw_metrics": raw_metrics,
+    }
+
+
+def iter_google_trends_pages(keywords: List[str], top_n: int = 20, pytrends=None,
+                             cursor: Optional[Dict[str, Any]] = None, refresh: bool = False) -> Iterator[Page]:
+    """Yield the daily trending searches, then interest over time for every keyword.
+
+    Keywords go five to a ``build_payload`` (its limit), so each payload's
+    values are relative to the other keywords in it. Skipped entirely when
+    ``cursor["pulled_at"]`` is more recent than GTRENDS_REFRESH_MINUTES; the
+    pull time is recorded on the cursor once every payload is in. Until
+    then ``cursor["next_payload"]`` holds the first payload not yet pulled,
+    and the next run starts there, so a run cut short by its deadline still
+    moves through the keywords. All requests go through the shared
+    scheduler and response cache.
+    """
+    cursor = cursor if cursor is not None else {}
+    try:
+        from pytrends.request import TrendReq  # noqa: F401
+    except Exception:
+        metrics.inc("source_skipped", source="gtrends", reason="library")
+        return
+
+    if cursor.get("pulled_at") and time.time() - float(cursor["pulled_at"]) < GTRENDS_REFRESH_MINUTES * 60:
+        return
+    pulled_at = time.time()
+    sched = get_scheduler()
+    pn = GEO if len(GEO)==2 else "india"
+    geo = GEO if len(GEO)==2 else ""
+
+    def daily_terms():
+        with _trendreq_lock:
+            daily = (pytrends or _shared_trendreq()).trending_searches(pn=pn)
+        return [] if daily.empty else [str(row[0]) for _, row in daily.head(top_n).iterrows()]
+
+    terms = sched.call("gtrends", {"op": "trending_searches", "pn": pn, "top_n": top_n}, daily_terms,
+                       refresh=refresh)
+    if terms:
+        yield [_gtrends_record(term, 0, {"type": "daily_trending"}, "daily") for term in terms]
+
+    shards = plan_queries(keywords or ["marketing"], subreddits=[])["gtrends"]
+    start = int(cursor.get("next_payload") or 0) % len(shards)
+    order = list(range(start, len(shards))) + list(range(start))
+    pulled = set()
+
+    def interest_pages(i: int) -> Iterator[Page]:
+        seed = shards[i]
+
+        def latest_interest():
+            with _trendreq_lock:
+                py = pytrends or _shared_trendreq()
+                py.build_payload(seed, timeframe="now 7-d", geo=geo)
+                iot = py.interest_over_time()
+            if iot is None or iot.empty:
+                return {}
+            return {col: int(iot[col].iloc[-1]) for col in iot.columns if col != 'isPartial'}
+
+        latest = sched.call("gtrends", {"op": "interest_over_time", "keywords": seed, "geo": geo,
+                                        "timeframe": "now 7-d"}, latest_interest, refresh=refresh)
+        if latest:
+            yield [_gtrends_record(col, value, {"type": "interest_over_time", "latest": value}, "iot")
+                   for col, value in latest.items()]
+        pulled.add(i)
+        cursor["next_payload"] = next((j for j in order if j not in pulled), start)
+
+    yield from fan_out([lambda i=i: interest_pages(i) for i in order], SHARD_WORKERS["gtrends"])
+    cursor.pop("next_payload", None)
+    cursor["pulled_at"] = pulled_at
+
+
+def _collect(pages: Iterator[Page], out: Optional[Page]) -> Page:
+    out = out if out is not None else []
+    for page in pages:
+        out.extend(page)
+    return out
+
+
+def fetch_x_recent(keywords: List[str], days: int = 7, max_results: int = 100,
+                   out: Optional[Page] = None) -> Page:
+    """Fetch X (Twitter) posts — returns [] when credentials/libraries are missing.
+
+    Records are appended to ``out`` as they arrive, so a caller that gives up
+    waiting still sees the pages fetched so far. API errors are raised."""
+    return _collect(iter_x_pages(keywords, days=days, max_results=max_results), out)
+
+def fetch_reddit(keywords: List[str], days: int = 7, limit: int = 200,
+                 out: Optional[Page] = None) -> Page:
+    return _collect(iter_reddit_pages(keywords, days=days, limit=limit), out)
+
+def fetch_google_trends(keywords: List[str], top_n: int = 20, pytrends=None,
+                        out: Optional[Page] = None) -> Page:
+    return _collect(iter_google_trends_pages(keywords, top_n=top_n, pytrends=pytrends), out)
+
+
+def source_pagers(keywords: List[str], days: int = 7,
+                  cursors: Optional[Dict[str, Dict[str, Any]]] = None,
+                  refresh: bool = False) -> Dict[str, Callable[[], Iterator[Page]]]:
+    """Page generator factory per source, in the order results are merged.
+
+    ``cursors`` holds one mutable cursor dict per source; without it every
+    source fetches the full ``days`` window. ``refresh`` bypasses the
+    response cache.
+    """
+    cursors = cursors if cursors is not None else {}
+    return {
+        "x": lambda: iter_x_pages(keywords, days=days, cursor=cursors.get("x"), refresh=refresh),
+        "reddit": lambda: iter_reddit_pages(keywords, days=days, cursor=cursors.get("reddit"), refresh=refresh),
+        "gtrends": lambda: iter_google_trends_pages(keywords, cursor=cursors.get("gtrends"), refresh=refresh),
+    }
+
+
+def stream_pages(pagers: Dict[str, Callable[[], Iterator[Page]]],
+                 timeouts: Optional[Dict[str, float]] = None,
+                 status: Optional[Dict[str, Dict[str, Any]]] = None,
+                 max_pages: int = STREAM_QUEUE_PAGES) -> Iterator[Tuple[str, Page]]:
+    """Run every pager on its own thread and yield ``(source, page)`` as pages arrive.
+
+    At most ``max_pages`` pages are buffered, so a slow consumer throttles the
+    fetchers instead of letting memory grow. Each source stops at its own
+    deadline, which counts fetch time only: time spent blocked on a full
+    buffer, or sleeping on the source's rate limit in the scheduler, pushes
+    it back. Pages it produced before that are still yielded. ``status`` is
+    filled with ``{"status": "ok"|"timeout"|"rate_limited"|"error", "records",
+    "elapsed", "error"}`` per source.
+    """
+    deadlines = {**SOURCE_TIMEOUTS, **(timeouts or {})}
+    status = status if status is not None else {}
+    q = queue.Queue(maxsize=max(1, max_pages))
+    stop = threading.Event()
+    started = time.monotonic()
+    for name in pagers:
+        status[name] = {"status": "running", "error": None, "records": 0, "elapsed": 0.0}
+    due = {name: started + deadlines.get(name, 60.0) for name in pagers}
+    # threads of each source waiting on the consumer or on its rate limit; the deadline holds meanwhile
+    paused, paused_at = {name: 0 for name in pagers}, {}
+    lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def pause(name):
+        if name not in paused:
+            yield
+            return
+        with lock:
+            if not paused[name]:
+                paused_at[name] = time.monotonic()
+            paused[name] += 1
+        try:
+            yield
+        finally:
+            with lock:
+                paused[name] -= 1
+                if not paused[name]:
+                    due[name] += time.monotonic() - paused_at[name]
+
+    def put(name, item) -> bool:
+        with pause(name):
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+    def run(name):
+        outcome = ("ok", None)
+        throttle_pause.set(pause)  # inherited by the source's shard threads
+        pages = None
+        try:
+            pages = iter(pagers[name]())
+            while True:
+                with metrics.timer("source_page_seconds", source=name):
+                    page = next(pages, None)
+                if page is None:
+                    break
+                metrics.inc("source_pages", source=name)
+                if page:
+                    metrics.inc("source_records", len(page), source=name)
+                    if metrics.METRICS_ENABLED:
+                        metrics.inc("source_bytes", sum(len(r.get("title") or "") + len(r.get("text") or "")
+                                                        for r in page), source=name)
+                if page and not put(name, (name, page)):
+                    return
+                if time.monotonic() > due[name]:
+                    outcome = ("timeout", None)
+                    break
+        except RateLimited as e:
+            outcome = ("rate_limited", str(e))
+        except Exception as e:
+            outcome = ("error", f"{type(e).__name__}: {e}")
+        finally:
+            # stops the pager's shard threads (fan_out) instead of letting them fetch on unread
+            close = getattr(pages, "close", None)
+            if close is not None:
+                try:
+                    close()
+                except Exception:
+                    pass
+        if outcome[0] != "ok":
+            metrics.inc("source_errors", source=name, kind=outcome[0])
+        put(name, (name, outcome))
+
+    # each thread runs in a copy of the caller's context, so a per-run metrics profile follows it
+    threads = [threading.Thread(target=contextvars.copy_context().run, args=(run, name),
+                                name=f"extract-{name}", daemon=True)
+               for name in pagers]
+    for t in threads:
+        t.start()
+
+    pending = set(pagers)
+    try:
+        while pending:
+            now = time.monotonic()
+            for name in [n for n in pending if now > due[n] and not paused[n]]:
+                # the fetcher is stuck inside a call; stop listening to it
+                status[name].update(status="timeout", elapsed=round(now - started, 3))
+                metrics.inc("source_errors", source=name, kind="timeout")
+                pending.discard(name)
+            if not pending:
+                break
+            try:
+                name, item = q.get(timeout=max(0.0, min(min(due[n] for n in pending) - now, 0.5)))
+            except queue.Empty:
+                continue
+            if isinstance(item, tuple):
+                if name in pending:
+                    state, error = item
+                    status[name].update(status=state, error=error, elapsed=round(time.monotonic() - started, 3))
+                    pending.discard(name)
+                continue
+            # pages queued before a source timed out still count
+            status[name]["records"] += len(item)
+            yield name, item
+        # a source given up on may have left pages in the buffer
+        while True:
+            try:
+                name, item = q.get_nowait()
+            except queue.Empty:
+                break
+            if not isinstance(item, tuple):
+                status[name]["records"] += len(item)
+                yield name, item
+    finally:
+        stop.set()
+
+
+def extract_all_with_status(keywords: List[str], days: int = 7,
+                            timeouts: Optional[Dict[str, float]] = None
+                            ) -> Tuple[Page, Dict[str, Dict[str, Any]]]:
+    """Run every source fetcher concurrently, each against its own deadline.
+
+    Returns ``(records, status)``. ``status`` maps each source to
+    ``{"status": "ok"|"timeout"|"error", "records", "elapsed", "error"}``.
+    A source that times out or fails still contributes what it fetched so far.
+    """
+    status = {}
+    by_source = {name: [] for name in source_pagers(keywords, days)}
+    for name, page in stream_pages(source_pagers(keywords, days), timeouts, status):
+        by_source[name].extend(page)
+    records = [r for name in by_source for r in by_source[name]]
+    return records, status
+
+def extract_all(keywords: List[str], days:int=7) -> Page:
+    records, _ = extract_all_with_status(keywords, days=days)
+    return records
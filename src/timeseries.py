@@ -0,0 +1,28 @@
+import threading
+from typing import List, Dict, Any
+
+from src.db import query_timeseries, change_counter
+
+_cache: Dict[tuple, List[Dict[str, Any]]] = {}
+_cache_lock = threading.Lock()
+_CACHE_ENTRIES = 64
+
+
+def trend_timeseries(bucket: str = "day", by: str = "category", since: str = None, until: str = None,
+                     category: str = None, platform: str = None) -> List[Dict[str, Any]]:
+    """``db.query_timeseries``, cached per (range, bucket, grouping, filters) until the next write.
+
+    Dashboards poll the same few charts; between ingests each is aggregated
+    once. The cache key includes the DB change counter, so an ingest (or an
+    archive run) makes every entry stale.
+    """
+    key = (bucket, by, since, until, category, platform, change_counter())
+    with _cache_lock:
+        series = _cache.get(key)
+    if series is None:
+        series = query_timeseries(bucket, by, since=since, until=until, category=category, platform=platform)
+        with _cache_lock:
+            if len(_cache) >= _CACHE_ENTRIES:
+                _cache.clear()
+            _cache[key] = series
+    return series
@@ -0,0 +1,113 @@
+"""Google Trends pulls under the default plan, rate and deadline, driven through the real scheduler.
+
+A virtual clock stands in for ``time.monotonic``/``time.sleep``, so the
+two-minute token-bucket schedule runs in well under a second.
+"""
+import threading
+
+import pandas as pd
+import pytest
+
+from src import sources
+from src.pipeline import build_keyword_list
+from src.planner import plan_queries
+from src.scheduler import Scheduler, ResponseCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+        self.lock = threading.Lock()
+
+    def monotonic(self) -> float:
+        with self.lock:
+            return self.now
+
+    def advance(self, seconds: float):
+        with self.lock:
+            self.now += max(0.0, seconds)
+
+
+class FakeTrendReq:
+    """pytrends stand-in; each API call can take ``latency`` seconds of (virtual) fetch time."""
+
+    def __init__(self, clock: Clock, latency: float = 0.0):
+        self.clock, self.latency = clock, latency
+        self.calls, self.payloads = 0, []
+        self._kw = []
+
+    def trending_searches(self, pn):
+        self.calls += 1
+        self.clock.advance(self.latency)
+        return pd.DataFrame({0: ["daily one", "daily two"]})
+
+    def build_payload(self, kw_list, timeframe=None, geo=None):
+        self._kw = list(kw_list)
+        self.payloads.append(self._kw)
+
+    def interest_over_time(self):
+        self.calls += 1
+        self.clock.advance(self.latency)
+        return pd.DataFrame({**{k: [50] for k in self._kw}, "isPartial": [False]})
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(sources.time, "monotonic", clock.monotonic)
+    # sleeping only moves the clock; a real zero sleep lets other threads run
+    real_sleep = sources.time.sleep
+    monkeypatch.setattr(sources.time, "sleep", lambda s: (clock.advance(s), real_sleep(0)))
+    return clock
+
+
+@pytest.fixture
+def scheduler(monkeypatch, tmp_path):
+    # default SOURCE_RATES, RATE_LIMIT_MAX_WAIT and retries; only the response cache is private
+    sched = Scheduler(cache=ResponseCache(str(tmp_path / "responses.sqlite3")))
+    monkeypatch.setattr(sources, "get_scheduler", lambda: sched)
+    return sched
+
+
+def _pull(keywords, client, cursor):
+    status = {}
+    pages = sources.stream_pages({"gtrends": lambda: sources.iter_google_trends_pages(
+        keywords, pytrends=client, cursor=cursor)}, status=status)
+    terms = {r["title"] for _, page in pages for r in page if r["raw_metrics"]["type"] == "interest_over_time"}
+    return status["gtrends"], terms
+
+
+def test_default_plan_finishes_within_deadline(clock, scheduler):
+    keywords = build_keyword_list()
+    payloads = plan_queries(keywords, subreddits=[])["gtrends"]
+    client, cursor = FakeTrendReq(clock), {}
+
+    status, terms = _pull(keywords, client, cursor)
+
+    assert status["status"] == "ok", status
+    assert client.calls == len(payloads) + 1
+    assert terms == {k for p in payloads for k in p}
+    # the bucket, not the fetches, took the time: far past GTRENDS_TIMEOUT
+    assert scheduler.stats()["gtrends"]["waited_s"] > sources.SOURCE_TIMEOUTS["gtrends"]
+    assert "next_payload" not in cursor and cursor["pulled_at"]
+
+
+def test_slow_pulls_rotate_through_payloads(clock, scheduler):
+    keywords = build_keyword_list()
+    payloads = plan_queries(keywords, subreddits=[])["gtrends"]
+    # 12 s of fetch time per call: a 30 s deadline covers a few payloads per run
+    client, cursor = FakeTrendReq(clock, latency=12.0), {}
+
+    seen, runs, timeouts, starts = set(), 0, 0, set()
+    while "pulled_at" not in cursor and runs < 2 * len(payloads):
+        starts.add(cursor.get("next_payload", 0))
+        status, terms = _pull(keywords, client, cursor)
+        runs += 1
+        seen |= terms
+        timeouts += status["status"] == "timeout"
+
+    assert timeouts and runs > 1
+    # each run picked up where the previous one stopped, not at payload 0
+    assert len(starts) > 1
+    assert cursor.get("pulled_at")
+    assert seen == {k for p in payloads for k in p}